@@ -0,0 +1,213 @@
+"""Турнир между конфигурациями ботов с рейтингом Эло.
+
+Каждый дебют (несколько случайных полуходов от начальной позиции) играется
+парой партий со сменой цветов. Партии идут в пуле процессов.
+
+    python Arena.py new=q_learning:new.json old=q_learning:q_table.json --games 2000 --workers 8
+    python Arena.py q=q_learning mcts=mcts,move_time=0.05 rnd=q_learning,epsilon=1 --games 200
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from BotClass import QLearningBot, QTableModel, Move, initial_board
+from BotRegistry import BOT_ENGINES
+from Trajectory import HeadlessGame
+
+ARENA_OPENING_PLIES = 4
+ARENA_MAX_PLIES = 200
+ARENA_CHUNK = 16  # партий в одной задаче пула
+ELO_Z = 1.96      # 95% доверительный интервал
+
+# Конфигурация: {"name", "engine", "q_table" (или None), "params": {параметр: значение}}
+BotConfig = Dict[str, object]
+Opening = List[Move]
+
+
+def parse_config(spec: str) -> BotConfig:
+    """"имя=движок[:q_table.json][,параметр=значение...]" -> конфигурация"""
+    name, _, rest = spec.partition('=')
+    engine, *options = rest.split(',')
+    engine, _, q_table = engine.partition(':')
+    if engine not in BOT_ENGINES:
+        raise ValueError(f"Неизвестный движок {engine!r} в {spec!r}")
+    params = {"epsilon": 0.0}  # в турнире играем без исследования
+    for option in options:
+        key, _, value = option.partition('=')
+        try:
+            params[key] = float(value) if '.' in value or 'e' in value else int(value)
+        except ValueError:
+            params[key] = value
+    return {"name": name, "engine": engine, "q_table": q_table or None, "params": params}
+
+
+def make_openings(count: int, plies: int, seed: int) -> List[Opening]:
+    """count различных дебютов из plies случайных полуходов"""
+    rng = random.Random(seed)
+    rules = QLearningBot(model=QTableModel())
+    openings, seen = [], set()
+    for _ in range(count * 20):
+        if len(openings) >= count:
+            break
+        board, color, moves = initial_board(), "WHITE", []
+        for _ in range(plies):
+            legal = rules._get_all_moves_for_board(board, color)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            board = rules._simulate_move_on_board(board, *move)
+            moves.append(move)
+            color = "RED" if color == "WHITE" else "WHITE"
+        key = tuple(moves)
+        if key not in seen:
+            seen.add(key)
+            openings.append(moves)
+    return openings
+
+
+_worker_bots: Dict[Tuple[str, str], QLearningBot] = {}
+_worker_models: Dict[str, QTableModel] = {}
+
+
+def _worker_bot(config: BotConfig, color: str) -> QLearningBot:
+    """Бот конфигурации в процессе пула; Q-таблица каждого файла загружается один раз"""
+    key = (config["name"], color)
+    bot = _worker_bots.get(key)
+    if bot is None:
+        path = config["q_table"]
+        model = _worker_models.get(path)
+        if model is None:
+            model = _worker_models[path] = QTableModel(path)
+            if path:
+                model.load()
+        params = dict(config["params"])
+        engine = BOT_ENGINES[config["engine"]]
+        epsilon = params.pop("epsilon")
+        bot = _worker_bots[key] = engine(model=model, epsilon=epsilon)
+        for name, value in params.items():
+            setattr(bot, name, value)
+    return bot
+
+
+def _play_chunk(games: List[Tuple[int, BotConfig, BotConfig, Opening, int]]) -> List[Tuple[int, Optional[str]]]:
+    """Играет пачку партий: (номер, белые, красные, дебют, seed) -> (номер, победивший цвет)"""
+    results = []
+    for index, white, red, opening, seed in games:
+        random.seed(seed)
+        red_bot, white_bot = _worker_bot(red, "RED"), _worker_bot(white, "WHITE")
+        game = HeadlessGame()
+        for move in opening:
+            game.board = red_bot._simulate_move_on_board(game.board, *move)
+            game.current_turn = "RED" if game.current_turn == "WHITE" else "WHITE"
+        _, winner = game.play(red_bot, white_bot, ARENA_MAX_PLIES)
+        results.append((index, winner))
+    return results
+
+
+def elo_from_score(score: float) -> float:
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def elo_interval(wins: int, draws: int, losses: int) -> Tuple[float, float, float]:
+    """Разница Эло и 95% интервал по результатам одной конфигурации против другой"""
+    games = wins + draws + losses
+    if not games:
+        return 0.0, -math.inf, math.inf
+    score = (wins + 0.5 * draws) / games
+    variance = (wins + 0.25 * draws) / games - score * score
+    margin = ELO_Z * math.sqrt(max(variance, 0.0) / games)
+    return elo_from_score(score), elo_from_score(score - margin), elo_from_score(score + margin)
+
+
+def run_arena(configs: List[BotConfig], games: int, workers: int = 1,
+              opening_plies: int = ARENA_OPENING_PLIES, seed: Optional[int] = None) -> Dict[str, object]:
+    """Круговой турнир: по games партий на каждую пару конфигураций (парами со сменой цветов)"""
+    seed = int(time.time()) if seed is None else seed
+    pairs = list(itertools.combinations(range(len(configs)), 2))
+    openings = make_openings((games + 1) // 2, opening_plies, seed)
+    schedule = []
+    for a, b in pairs:
+        for i in range(games):
+            opening = openings[(i // 2) % len(openings)]
+            white, red = (a, b) if i % 2 == 0 else (b, a)
+            schedule.append((len(schedule), configs[white], configs[red], opening, seed + len(schedule)))
+    chunks = [schedule[i:i + ARENA_CHUNK] for i in range(0, len(schedule), ARENA_CHUNK)]
+
+    started = time.monotonic()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for chunk_results in pool.map(_play_chunk, chunks):
+            results.update(chunk_results)
+    elapsed = time.monotonic() - started
+
+    # Счёт каждой пары с точки зрения первой конфигурации
+    table = {pair: [0, 0, 0] for pair in pairs}
+    index = 0
+    for a, b in pairs:
+        for i in range(games):
+            winner = results[index]
+            white_is_a = i % 2 == 0
+            if winner is None:
+                table[(a, b)][1] += 1
+            elif (winner == "WHITE") == white_is_a:
+                table[(a, b)][0] += 1
+            else:
+                table[(a, b)][2] += 1
+            index += 1
+    return {"configs": configs, "pairs": table, "games": len(schedule), "seconds": elapsed,
+            "games_per_second": len(schedule) / max(elapsed, 1e-9),
+            "ratings": bradley_terry(len(configs), table)}
+
+
+def bradley_terry(count: int, table: Dict[Tuple[int, int], List[int]], iterations: int = 200) -> List[float]:
+    """Общие рейтинги Эло по всем парам (первая конфигурация - 0); ничья - пол-очка"""
+    strength = [1.0] * count
+    for _ in range(iterations):
+        for i in range(count):
+            wins = denominator = 0.0
+            for (a, b), (w, d, l) in table.items():
+                if i not in (a, b):
+                    continue
+                j = b if i == a else a
+                score = w + 0.5 * d if i == a else l + 0.5 * d
+                wins += score
+                denominator += (w + d + l) / (strength[i] + strength[j])
+            if denominator and wins:
+                strength[i] = wins / denominator
+    base = strength[0]
+    return [400.0 * math.log10(s / base) if s > 0 else -math.inf for s in strength]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Турнир ботов с рейтингом Эло")
+    parser.add_argument("bots", nargs="+", help="имя=движок[:q_table.json][,параметр=значение]")
+    parser.add_argument("--games", type=int, default=200, help="партий на каждую пару")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--opening-plies", type=int, default=ARENA_OPENING_PLIES)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    configs = [parse_config(spec) for spec in args.bots]
+    if len(configs) < 2:
+        parser.error("нужны хотя бы две конфигурации")
+    report = run_arena(configs, args.games, args.workers, args.opening_plies, args.seed)
+
+    for (a, b), (wins, draws, losses) in report["pairs"].items():
+        elo, low, high = elo_interval(wins, draws, losses)
+        print(f"{configs[a]['name']} - {configs[b]['name']}: +{wins} ={draws} -{losses}, "
+              f"Эло {elo:+.0f} [{low:+.0f}, {high:+.0f}]")
+    if len(configs) > 2:
+        for config, rating in sorted(zip(configs, report["ratings"]), key=lambda item: -item[1]):
+            print(f"  {config['name']:>12}: {rating:+.0f}")
+    print(f"{report['games']} партий за {report['seconds']:.1f} с ({report['games_per_second']:.1f} партий/с)")
+
+
+if __name__ == "__main__":
+    main()
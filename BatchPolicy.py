@@ -0,0 +1,78 @@
+"""Пакетный выбор ходов по Q-таблице: много позиций за один вызов, без объекта игры.
+
+Позиция - компактная доска из 64 кодов клеток (MCTSBot.encode_board) и сторона,
+которая ходит. Hash состояний считается для всей пачки сразу через таблицу
+токенов numpy, Q-значения ходов позиции читаются одним сравнением массивов
+кодов. Сервер собирает ожидающие партии в пачку и платит накладные расходы
+вызова (пул процессов, сериализация) один раз на пачку.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import random
+
+import numpy as np
+
+from BotClass import QTableModel, Move
+from MCTSBot import WHITE, RED, decode_move, generate_moves
+from QStorage import action_code, row_lookup
+
+# Код клетки компактной доски -> токен get_state_hash ("0" - пустая клетка, 0 - пропуск)
+TOKEN_BYTES = np.array([list(token.ljust(2, "\0").encode()) for token in ("0", "WP", "WK", "RP", "RK")],
+                       dtype=np.uint8)
+SIDES = {"WHITE": WHITE, "RED": RED}
+
+# Доска в компактном виде и сторона, которая ходит
+Position = Tuple[bytes, str]
+
+
+def state_hashes(boards: np.ndarray) -> List[str]:
+    """(N, 64) кодов клеток -> hash состояний в формате get_state_hash()"""
+    tokens = TOKEN_BYTES[boards]  # (N, 64, 2)
+    return [row.tobytes().replace(b'\0', b'').decode('ascii') for row in tokens]
+
+
+class BatchPolicy:
+    """Жадная (или epsilon-жадная) политика по Q-таблице модели для пачек позиций"""
+    def __init__(self, model: QTableModel, double_q: bool = False, epsilon: float = 0.0):
+        self.model = model
+        self.double_q = double_q
+        self.epsilon = epsilon
+        self._actions: Dict[int, Tuple[int, Move]] = {}  # компактный ход -> (код хода, ход)
+
+    def _decode(self, compact: int) -> Tuple[int, Move]:
+        action = self._actions.get(compact)
+        if action is None:
+            move = decode_move(compact)
+            action = self._actions[compact] = (action_code(*move), move)
+        return action
+
+    def choose_moves(self, positions: Sequence[Position]) -> List[Optional[Move]]:
+        """Ход для каждой позиции пачки (None - ходов нет).
+        Неизученный ход имеет Q=0; при равенстве берётся первый ход генератора"""
+        if not positions:
+            return []
+        boards = np.frombuffer(b''.join(bytes(board) for board, _ in positions), dtype=np.uint8).reshape(-1, 64)
+        hashes = state_hashes(boards)
+        q_table = self.model.q_table
+        q_table_b = self.model.q_table_b if self.double_q else None
+        chosen = []
+        compact_moves = []
+        for (board, side), state_hash in zip(positions, hashes):
+            generate_moves(bytearray(board), SIDES[side], compact_moves)
+            if not compact_moves:
+                chosen.append(None)
+                continue
+            actions = [self._decode(compact) for compact in compact_moves]
+            if self.epsilon and random.random() < self.epsilon:
+                chosen.append(random.choice(actions)[1])
+                continue
+            row = q_table.get(state_hash)
+            row_b = q_table_b.get(state_hash) if q_table_b is not None else None
+            if not row and not row_b:
+                chosen.append(actions[0][1])
+                continue
+            codes = np.fromiter((code for code, _ in actions), dtype=np.uint16, count=len(actions))
+            values = row_lookup(row, codes) if row else np.zeros(len(actions))
+            if row_b:
+                values = values + row_lookup(row_b, codes)
+            chosen.append(actions[int(values.argmax())][1])
+        return chosen
@@ -1,19 +1,472 @@
 from typing import List, Tuple, Optional
 import copy
-from tkinter import messagebox
 import random
 import json
+import logging
 import os
+import tempfile
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
 import numpy as np
 
+from Schedules import Schedule
+from QStorage import make_q_table, action_code, action_move, encode_actions, decode_actions, row_best, row_max
+from SharedQTable import SNAPSHOT_SUFFIX, FrozenQTable, OverlayQTable, delta_path
+
+# Печать каждого хода (get_move) - на уровне DEBUG; окно игры включает её в __main__
+logger = logging.getLogger(__name__)
+
 PIECE_VALUE = 1
 KING_VALUE = 3
 
 RED_PIECE_COLOR = "#FF0000"
 WHITE_PIECE_COLOR = "#FFFFFF"
 
+# Ничья: троекратное повторение позиции или долгая игра без взятий и ходов простыми
+REPETITION_LIMIT = 3
+NO_PROGRESS_LIMIT = 50  # полуходов
+WIN_REWARD = 100.0
+LOSS_REWARD = -50.0
+DRAW_REWARD = -10.0
+
+# Досрочное присуждение победы в самоигре
+ADJUDICATION_MARGIN = 4  # перевес в материале (простая = PIECE_VALUE, дамка = KING_VALUE)
+ADJUDICATION_PLIES = 10  # сколько полуходов подряд перевес должен держаться
+
+# Анализ ходов корня: вес оценки минимакса относительно Q-значения
+ANALYSIS_WEIGHT = 1.0
+
+# Следы приемлемости Q(λ): следы меньше TRACE_CUTOFF отбрасываются
+TRACE_CUTOFF = 0.01
+
+# Ход: (откуда, куда) или цепочка взятий (откуда, ..., куда) - составной ход
+Move = Tuple[Tuple[int, int], ...]
+
+# Граф прыжков простой шашки: MAN_JUMPS[цвет][(r, c)] -> ((через клетку, куда), ...).
+# Шашка бьёт только вперёд, поэтому цепочка не длиннее трёх прыжков
+# и обрывается на последней горизонтали (шашка становится дамкой)
+MAN_FORWARD = {WHITE_PIECE_COLOR: -1, RED_PIECE_COLOR: 1}
+PROMOTION_ROW = {WHITE_PIECE_COLOR: 0, RED_PIECE_COLOR: 7}
+MAN_JUMPS = {
+    color: {
+        (row, col): tuple(((row + dr, col + dc), (row + 2 * dr, col + 2 * dc))
+                          for dc in (-1, 1)
+                          if 0 <= row + 2 * dr < 8 and 0 <= col + 2 * dc < 8)
+        for row in range(8) for col in range(8) if (row + col) % 2 == 1
+    }
+    for color, dr in MAN_FORWARD.items()
+}
+
+CHECKPOINT_FILE = "train_checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+
+def atomic_write_json(path: str, data, indent: Optional[int] = None) -> None:
+    """Записывает JSON во временный файл и атомарно подменяет им исходный"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def visits_path(q_table_file: str) -> str:
+    """Файл счётчиков посещений рядом с Q-таблицей: q_table.json -> q_table.visits.json"""
+    root, ext = os.path.splitext(q_table_file)
+    return f"{root}.visits{ext or '.json'}"
+
+
+def double_path(q_table_file: str) -> str:
+    """Вторая таблица Double Q-learning рядом с основной: q_table.json -> q_table.b.json"""
+    root, ext = os.path.splitext(q_table_file)
+    return f"{root}.b{ext or '.json'}"
+
+
+def compact_state(actions: dict, counts: Optional[dict], drop_zeros: bool = True,
+                  decimals: Optional[int] = None, quantum: Optional[float] = None) -> dict:
+    """Сжимает строку Q-таблицы: убирает нетронутые нули (0.0 без обновлений),
+    округляет до decimals знаков или квантует с шагом quantum"""
+    compacted = {}
+    for action_hash, q_value in actions.items():
+        if drop_zeros and q_value == 0.0 and not (counts and counts.get(action_hash)):
+            continue
+        if quantum:
+            q_value = round(q_value / quantum) * quantum
+        if decimals is not None:
+            q_value = round(q_value, decimals)
+        compacted[action_hash] = q_value
+    return compacted
+
+
+def initial_board():
+    """Начальная расстановка в формате get_board_state()"""
+    board = [[None for _ in range(8)] for _ in range(8)]
+    for row in list(range(2)) + list(range(6, 8)):
+        for col in range(8):
+            if (row + col) % 2 == 1:
+                color = RED_PIECE_COLOR if row < 2 else WHITE_PIECE_COLOR
+                board[row][col] = {"color": color, "is_king": False}
+    return board
+
+
+def board_from_state_hash(state_hash: str):
+    """Восстанавливает доску в формате get_board_state() из hash состояния"""
+    board = [[None for _ in range(8)] for _ in range(8)]
+    i = 0
+    for square in range(64):
+        if state_hash[i] == '0':
+            i += 1
+            continue
+        color = WHITE_PIECE_COLOR if state_hash[i] == 'W' else RED_PIECE_COLOR
+        board[square // 8][square % 8] = {"color": color, "is_king": state_hash[i + 1] == 'K'}
+        i += 2
+    return board
+
+
+class DrawTracker:
+    """История позиций партии для определения ничьей по повторению и по отсутствию прогресса"""
+    def __init__(self, repetition_limit: int = REPETITION_LIMIT,
+                 no_progress_limit: int = NO_PROGRESS_LIMIT):
+        self.repetition_limit = repetition_limit
+        self.no_progress_limit = no_progress_limit
+        self.reset()
+
+    def reset(self) -> None:
+        self.history = {}  # сторона + hash состояния -> сколько раз встречалась
+        self.quiet_plies = 0
+        self._signature = None
+
+    @staticmethod
+    def _progress_signature(state_hash: str) -> Tuple[int, str]:
+        # Взятие или ход простой шашкой необратимы: меняется число фигур
+        # или расположение простых шашек
+        men = state_hash.replace('WK', '0').replace('RK', '0')
+        pieces = state_hash.count('W') + state_hash.count('R')
+        return pieces, men
+
+    def record(self, state_hash: str, side: str) -> Optional[str]:
+        """Добавляет позицию (после хода, side - кто ходит). Возвращает причину ничьей или None"""
+        signature = self._progress_signature(state_hash)
+        if signature != self._signature:
+            # После необратимого хода прежние позиции повториться не могут
+            self._signature = signature
+            self.history.clear()
+            self.quiet_plies = 0
+        else:
+            self.quiet_plies += 1
+
+        key = side + state_hash
+        self.history[key] = self.history.get(key, 0) + 1
+
+        if self.history[key] >= self.repetition_limit:
+            return "repetition"
+        if self.quiet_plies >= self.no_progress_limit:
+            return "no_progress"
+        return None
+
+
+def material_counts(board) -> dict:
+    """Число простых шашек и дамок каждой стороны: {цвет: [простые, дамки]}"""
+    counts = {RED_PIECE_COLOR: [0, 0], WHITE_PIECE_COLOR: [0, 0]}
+    for row in board:
+        for piece in row:
+            if piece:
+                counts[piece["color"]][1 if piece["is_king"] else 0] += 1
+    return counts
+
+
+def material_balance(counts: dict) -> int:
+    """Материал RED минус материал WHITE по material_counts; без позиционных бонусов
+    _evaluate_position, поэтому стороны в равных условиях"""
+    red_men, red_kings = counts[RED_PIECE_COLOR]
+    white_men, white_kings = counts[WHITE_PIECE_COLOR]
+    return (red_men - white_men) * PIECE_VALUE + (red_kings - white_kings) * KING_VALUE
+
+
+class Adjudicator:
+    """Досрочно завершает самоигру в позициях, исход которых уже ясен"""
+    def __init__(self, margin: Optional[int] = ADJUDICATION_MARGIN,
+                 hold_plies: int = ADJUDICATION_PLIES, simple_wins: bool = True):
+        self.margin = margin            # None - не присуждать по материалу
+        self.hold_plies = hold_plies
+        self.simple_wins = simple_wins  # дамки против одиноких простых шашек
+        self.reset()
+
+    def reset(self) -> None:
+        self.leader = None
+        self.held = 0
+
+    def check(self, board) -> Optional[str]:
+        """Возвращает "RED"/"WHITE", если победу можно присудить; вызывается после каждого полухода"""
+        counts = material_counts(board)
+        if self.simple_wins:
+            winner = self._simple_win(counts)
+            if winner:
+                return winner
+
+        if self.margin is None:
+            return None
+
+        score = material_balance(counts)
+        if abs(score) >= self.margin:
+            leader = "RED" if score > 0 else "WHITE"
+            if leader == self.leader:
+                self.held += 1
+            else:
+                self.leader = leader
+                self.held = 1
+            if self.held >= self.hold_plies:
+                return leader
+        else:
+            self.reset()
+        return None
+
+    @staticmethod
+    def _simple_win(counts) -> Optional[str]:
+        # Дамка легко ловит простые шашки: у соперника нет дамок,
+        # а простых шашек не больше, чем наших дамок
+        for color, name, other in ((RED_PIECE_COLOR, "RED", WHITE_PIECE_COLOR),
+                                   (WHITE_PIECE_COLOR, "WHITE", RED_PIECE_COLOR)):
+            men, kings = counts[color]
+            other_men, other_kings = counts[other]
+            if kings and not other_kings and 0 < other_men <= kings and men + kings > other_men:
+                return name
+        return None
+
+
+class BackgroundWriter:
+    """Фоновый поток записи на диск: задачи с одинаковым ключом схлопываются"""
+    def __init__(self):
+        self._pending = {}  # ключ (обычно путь к файлу) -> функция записи
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, task) -> None:
+        """Ставит запись в очередь, заменяя ещё не выполненную запись с тем же ключом"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BackgroundWriter уже закрыт")
+            self._pending[key] = task
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Ждёт, пока все поставленные записи будут выполнены"""
+        with self._cond:
+            while self._pending or self._busy:
+                self._cond.wait()
+
+    def close(self) -> None:
+        """Дописывает очередь и останавливает поток"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                key = next(iter(self._pending))
+                task = self._pending.pop(key)
+                self._busy = True
+            try:
+                task()
+            except Exception as e:
+                print(f"[Writer] Ошибка записи {key}: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+class QTableModel:
+    """Q-таблица, общая для всех ботов процесса: загружается один раз, живёт по счётчику ссылок"""
+    _registry = {}  # путь к файлу -> модель
+    _registry_lock = threading.Lock()
+    
+    def __init__(self, path: Optional[str] = None, storage: str = "dict"):
+        self.path = path
+        # Снимок .qsnap отображается в память общим для процессов, изменения процесса
+        # копятся в дельте и пишутся в свой файл (SharedQTable)
+        self.shared = bool(path) and path.endswith(SNAPSHOT_SUFFIX)
+        self.save_path = delta_path(path) if self.shared else path
+        # Q-таблица: ключ - hash состояния, значение - строка {код хода: Q_value} (QStorage);
+        # storage="float16"/"int16" - квантованные значения
+        self.storage = storage
+        self.q_table = make_q_table(storage)
+        # Вторая таблица Double Q-learning (пуста, пока режим не использовался)
+        self.q_table_b = make_q_table(storage)
+        # Сколько раз обновлялось каждое Q-значение: {hash состояния: {код хода: N}}
+        self.visits = {}
+        self.refs = 0
+        self.progress = 0.0
+        self._loaded = threading.Event()
+        self._loader = None
+        self._lock = threading.Lock()
+        if path is None:
+            # Модель в памяти без файла (воркеры, тесты) - загружать нечего
+            self.progress = 1.0
+            self._loaded.set()
+    
+    @classmethod
+    def acquire(cls, path: str, storage: str = "dict") -> "QTableModel":
+        """Возвращает общую модель для файла, увеличивая счётчик ссылок"""
+        with cls._registry_lock:
+            model = cls._registry.get(path)
+            if model is None:
+                model = cls._registry[path] = cls(path, storage)
+            model.refs += 1
+            return model
+    
+    def retain(self) -> "QTableModel":
+        with QTableModel._registry_lock:
+            self.refs += 1
+        return self
+    
+    def release(self) -> None:
+        """Уменьшает счётчик ссылок; последняя ссылка выгружает модель из реестра"""
+        with QTableModel._registry_lock:
+            self.refs -= 1
+            if self.refs <= 0 and QTableModel._registry.get(self.path) is self:
+                del QTableModel._registry[self.path]
+    
+    @property
+    def ready(self) -> bool:
+        return self._loaded.is_set()
+    
+    def snapshot(self) -> Tuple[dict, dict, dict]:
+        """Копия (Q-таблица, посещения, таблица B) в формате файла, с текстовыми именами ходов.
+        Строится из атомарных копий строк, поэтому её можно делать в фоновом потоке"""
+        # До конца загрузки q_table - пустая таблица, а не наложение на снимок
+        self.load()
+        # Со снимком в файл идёт только дельта процесса
+        rows = self.q_table.delta if self.shared else self.q_table
+        q_table = {state_hash: decode_actions(dict(actions.items()))
+                   for state_hash, actions in list(rows.items())}
+        visits = {state_hash: decode_actions(dict(counts))
+                  for state_hash, counts in list(self.visits.items())}
+        q_table_b = {state_hash: decode_actions(dict(actions.items()))
+                     for state_hash, actions in list(self.q_table_b.items())}
+        return q_table, visits, q_table_b
+    
+    def restore(self, q_table: dict, visits: dict, q_table_b: Optional[dict] = None) -> None:
+        """Заменяет содержимое модели таблицами в формате файла"""
+        self.q_table.clear()
+        for state_hash, actions in q_table.items():
+            self.q_table[state_hash] = encode_actions(actions)
+        self.visits.clear()
+        for state_hash, counts in visits.items():
+            self.visits[state_hash] = encode_actions(counts)
+        self.q_table_b.clear()
+        for state_hash, actions in (q_table_b or {}).items():
+            self.q_table_b[state_hash] = encode_actions(actions)
+    
+    def compact(self, min_visits: int = 0, drop_zeros: bool = True,
+                decimals: Optional[int] = None, quantum: Optional[float] = None) -> dict:
+        """Сжимает таблицу на месте; состояния с суммой N(s,a) меньше min_visits удаляются.
+        Возвращает отчёт о размерах до и после"""
+        if self.shared:
+            raise ValueError("Снимок Q-таблицы только для чтения: сожмите исходный файл и опубликуйте заново")
+        report = {"states_before": len(self.q_table),
+                  "entries_before": sum(len(actions) for actions in self.q_table.values())}
+        for table in (self.q_table_b, self.q_table):
+            for state_hash in list(table):
+                counts = self.visits.get(state_hash)
+                if min_visits and sum(counts.values() if counts else ()) < min_visits:
+                    compacted = {}
+                else:
+                    compacted = compact_state(table[state_hash], counts, drop_zeros, decimals, quantum)
+                if compacted:
+                    table[state_hash] = compacted
+                else:
+                    del table[state_hash]
+                    if table is self.q_table:
+                        self.visits.pop(state_hash, None)
+        report["states_after"] = len(self.q_table)
+        report["entries_after"] = sum(len(actions) for actions in self.q_table.values())
+        return report
+    
+    def load_async(self) -> None:
+        """Начинает загрузку в фоновом потоке (прогресс - в self.progress)"""
+        with self._lock:
+            if self.ready or self._loader:
+                return
+            self._loader = threading.Thread(target=self._load, name="QTableLoader", daemon=True)
+            self._loader.start()
+    
+    def load(self) -> None:
+        """Загружает таблицу синхронно или дожидается уже начатой фоновой загрузки"""
+        with self._lock:
+            if not self.ready and not self._loader:
+                self._loader = threading.current_thread()
+                loading_here = True
+            else:
+                loading_here = False
+        if loading_here:
+            self._load()
+        else:
+            self._loaded.wait()
+    
+    def _load(self) -> None:
+        try:
+            if self.shared:
+                self.q_table = OverlayQTable(FrozenQTable(self.path), make_q_table(self.storage))
+            elif os.path.exists(self.path):
+                total = os.path.getsize(self.path) or 1
+                chunks = []
+                read = 0
+                with open(self.path, 'r') as f:
+                    while True:
+                        chunk = f.read(1 << 20)
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                        read += len(chunk)
+                        # Разбор JSON занимает оставшиеся 10%
+                        self.progress = min(read / total, 1.0) * 0.9
+                serializable_q_table = json.loads(''.join(chunks))
+                serializable_visits = {}
+                if os.path.exists(visits_path(self.path)):
+                    with open(visits_path(self.path), 'r') as f:
+                        serializable_visits = json.load(f)
+                serializable_q_table_b = {}
+                if os.path.exists(double_path(self.path)):
+                    with open(double_path(self.path), 'r') as f:
+                        serializable_q_table_b = json.load(f)
+                
+                # Восстанавливаем структуру
+                self.restore(serializable_q_table, serializable_visits, serializable_q_table_b)
+        except (OSError, ValueError, KeyError) as e:
+            # KeyError - неизвестное имя хода в файле (encode_actions)
+            print(f"[RL Bot] Не удалось загрузить {self.path}: {e!r}")
+            self.q_table.clear()
+            self.q_table_b.clear()
+            self.visits.clear()
+        finally:
+            self.progress = 1.0
+            self._loaded.set()
+
+
 class QLearningBot:
-    def __init__(self, game_instance=None, epsilon=0.1, alpha=0.1, gamma=0.9):
+    def __init__(self, game_instance=None, epsilon=0.1, alpha=0.1, gamma=0.9,
+                 model: Optional[QTableModel] = None, lazy: bool = False, storage: str = "dict",
+                 analysis_depth: int = 0, workers: int = 1,
+                 trace_lambda: float = 0.0, trace_cutoff: float = TRACE_CUTOFF, double_q: bool = False):
         self.color = "RED"
         self.game = game_instance
         self.nodes_evaluated = 0
@@ -21,14 +474,42 @@ class QLearningBot:
         # Параметры Q-learning
         self.epsilon = epsilon  # exploration rate
         self.alpha = alpha      # learning rate
+        
+        # Графики epsilon и alpha по номеру игры тренера (None - постоянные значения)
+        self.epsilon_schedule: Optional[Schedule] = None
+        self.alpha_schedule: Optional[Schedule] = None
         self.gamma = gamma      # discount factor
         
-        # Q-таблица: ключ - hash состояния, значение - словарь {hash_хода: Q_value}
-        self.q_table = {}
+        # Watkins Q(λ): награда распространяется по всей траектории партии (0 - одношаговый Q-learning)
+        self.trace_lambda = trace_lambda
+        self.trace_cutoff = trace_cutoff
+        self.traces = {}  # (hash состояния, код хода) -> след
+        self.explored = False  # последний ход выбран исследованием
+        
+        # Double Q-learning: одна таблица выбирает ход в s', другая его оценивает
+        self.double_q = double_q
+        
+        # Анализ ходов перебором на analysis_depth полуходов (0 - только Q-таблица);
+        # при workers > 1 ходы корня анализируются параллельно в пуле процессов
+        self.analysis_depth = analysis_depth
+        self.analysis_weight = ANALYSIS_WEIGHT
+        self.workers = workers
+        self._pool = None
+        self.stop_search = False  # выставляется из другого потока: закончить анализ досрочно
         
         # Файл для сохранения Q-таблицы
         self.q_table_file = "q_table.json"
-        self.load_q_table()
+        
+        # Q-таблица хранится в общей модели: несколько ботов не парсят файл повторно
+        if model is None:
+            self.model = QTableModel.acquire(self.q_table_file, storage)
+        else:
+            self.model = model.retain()
+            self.q_table_file = model.save_path or self.q_table_file
+        if lazy:
+            self.model.load_async()
+        else:
+            self.model.load()
         
         # Отслеживание последнего состояния и действия для обучения
         self.last_state = None
@@ -36,32 +517,76 @@ class QLearningBot:
         
         self.stalemate_warning_shown = False
         
+        # Фоновая запись (BackgroundWriter); None - писать синхронно
+        self.writer = None
+        
     def save_q_table(self):
-        """Сохраняет Q-таблицу в файл"""
-        # Конвертируем tuple ключи в строки для JSON
-        serializable_q_table = {}
-        for state_hash, actions in self.q_table.items():
-            serializable_q_table[state_hash] = {}
-            for action_hash, q_value in actions.items():
-                serializable_q_table[state_hash][action_hash] = q_value
+        """Сохраняет Q-таблицу в файл (в фоне, если задан writer)"""
+        if self.writer:
+            self.writer.submit(self.q_table_file, self._write_q_table)
+        else:
+            self._write_q_table()
+    
+    def _write_q_table(self):
+        # Снимок можно делать в фоновом потоке, пока игра продолжает менять таблицу
+        serializable_q_table, serializable_visits, serializable_q_table_b = self.model.snapshot()
         
-        with open(self.q_table_file, 'w') as f:
-            json.dump(serializable_q_table, f, indent=2)
+        atomic_write_json(self.q_table_file, serializable_q_table, indent=2)
+        atomic_write_json(visits_path(self.q_table_file), serializable_visits)
+        if serializable_q_table_b:
+            atomic_write_json(double_path(self.q_table_file), serializable_q_table_b, indent=2)
+    
+    @property
+    def q_table(self) -> dict:
+        return self.model.q_table
+    
+    @property
+    def visits(self) -> dict:
+        return self.model.visits
+    
+    @property
+    def q_table_b(self) -> dict:
+        return self.model.q_table_b
+    
+    @q_table.setter
+    def q_table(self, value: dict):
+        self.model.q_table = value
     
     def load_q_table(self):
-        """Загружает Q-таблицу из файла"""
-        if os.path.exists(self.q_table_file):
-            try:
-                with open(self.q_table_file, 'r') as f:
-                    serializable_q_table = json.load(f)
-                
-                # Восстанавливаем структуру
-                for state_hash, actions in serializable_q_table.items():
-                    self.q_table[state_hash] = {}
-                    for action_hash, q_value in actions.items():
-                        self.q_table[state_hash][action_hash] = q_value
-            except:
-                self.q_table = {}
+        """Загружает Q-таблицу из файла (если она ещё не загружена)"""
+        self.model.load()
+    
+    def release(self):
+        """Отпускает общую модель"""
+        self.model.release()
+
+    def save_checkpoint(self, cursor: dict, path: str = CHECKPOINT_FILE):
+        """Сохраняет контрольную точку обучения: Q-таблицу и позицию тренера"""
+        q_table, visits, q_table_b = self.model.snapshot()
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "cursor": cursor,
+            "q_table": q_table,
+            "visits": visits,
+            "q_table_b": q_table_b,
+        }
+        atomic_write_json(path, checkpoint)
+
+    def load_checkpoint(self, path: str = CHECKPOINT_FILE) -> Optional[dict]:
+        """Загружает контрольную точку, возвращает позицию тренера или None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[RL Bot] Повреждённая контрольная точка {path}: {e}")
+            return None
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            return None
+
+        self.model.restore(checkpoint["q_table"], checkpoint.get("visits", {}), checkpoint.get("q_table_b"))
+        return checkpoint["cursor"]
     
     def get_state_hash(self, board) -> str:
         """Создает хеш состояния доски для Q-таблицы"""
@@ -77,36 +602,146 @@ class QLearningBot:
                     state_repr.append('R' + ('K' if piece["is_king"] else 'P'))
         return ''.join(state_repr)
     
-    def get_action_hash(self, start: Tuple[int, int], end: Tuple[int, int]) -> str:
-        """Создает хеш действия"""
-        return f"{start[0]},{start[1]}->{end[0]},{end[1]}"
+    def get_action_hash(self, start: Tuple[int, int], *path: Tuple[int, int]) -> int:
+        """Создает код действия для хода или цепочки взятий (см. QStorage.action_code)"""
+        return action_code(start, *path)
     
-    def get_q_value(self, state_hash: str, action_hash: str) -> float:
-        """Получает Q-значение для пары состояние-действие"""
-        if state_hash not in self.q_table:
-            self.q_table[state_hash] = {}
-        if action_hash not in self.q_table[state_hash]:
-            self.q_table[state_hash][action_hash] = 0.0
-        return self.q_table[state_hash][action_hash]
+    def get_q_value(self, state_hash: str, action_hash: int, table=None) -> float:
+        """Получает Q-значение для пары состояние-действие (table - по умолчанию основная таблица).
+        Неизученная пара - 0.0 без записи: в таблицу пишет только обучение"""
+        if table is None:
+            table = self.q_table
+        actions = table.get(state_hash)
+        if actions is None:
+            return 0.0
+        return actions.get(action_hash, 0.0)
     
-    def set_q_value(self, state_hash: str, action_hash: str, value: float):
+    def set_q_value(self, state_hash: str, action_hash: int, value: float, table=None):
         """Устанавливает Q-значение для пары состояние-действие"""
-        if state_hash not in self.q_table:
-            self.q_table[state_hash] = {}
-        self.q_table[state_hash][action_hash] = value
+        if table is None:
+            table = self.q_table
+        if state_hash not in table:
+            table[state_hash] = {}
+        table[state_hash][action_hash] = value
+    
+    def _update_tables(self):
+        """(обновляемая таблица, оценивающая таблица) для очередного обновления"""
+        table = self.model.q_table
+        if not self.double_q:
+            return table, table
+        if random.random() < 0.5:
+            return self.model.q_table_b, table
+        return table, self.model.q_table_b
     
-    def update_q_value(self, state_hash: str, action_hash: str, reward: float, next_state_hash: str):
-        """Обновляет Q-значение по формуле Q-learning"""
-        current_q = self.get_q_value(state_hash, action_hash)
+    def update_q_value(self, state_hash: str, action_hash: int, reward: float, next_state_hash: str):
+        """Обновляет Q-значение по формуле Q-learning (или Double Q-learning)"""
+        if self.double_q:
+            table, evaluator = self._update_tables()
+        else:
+            table = evaluator = self.model.q_table
+        actions = table.get(state_hash)
+        current_q = actions.get(action_hash, 0.0) if actions else 0.0
         
-        # Находим максимальное Q для следующего состояния
+        # Находим максимальное Q для следующего состояния; в Double Q-learning
+        # ход выбирает обновляемая таблица, а оценивает другая
         max_next_q = 0.0
-        if next_state_hash in self.q_table and self.q_table[next_state_hash]:
-            max_next_q = max(self.q_table[next_state_hash].values())
+        next_actions = table.get(next_state_hash)
+        if next_actions:
+            if evaluator is not table:
+                evaluator_actions = evaluator.get(next_state_hash)
+                if evaluator_actions:
+                    max_next_q = evaluator_actions.get(row_best(next_actions), 0.0)
+            elif type(next_actions) is dict:
+                max_next_q = max(next_actions.values())
+            else:
+                max_next_q = row_max(next_actions)
         
         # Формула Q-learning: Q(s,a) = Q(s,a) + α * [r + γ * max Q(s',a') - Q(s,a)]
-        new_q = current_q + self.alpha * (reward + self.gamma * max_next_q - current_q)
-        self.set_q_value(state_hash, action_hash, new_q)
+        delta = reward + self.gamma * max_next_q - current_q
+        if self.trace_lambda > 0.0 or self.alpha_schedule is not None:
+            self._td_update(state_hash, action_hash, delta, table)
+        else:
+            # Частый случай самоигры: одна пара, постоянная alpha - без лишних вызовов
+            if actions is None:
+                table[state_hash] = {}
+                actions = table[state_hash]
+            actions[action_hash] = current_q + self.alpha * delta
+        # count_visit без вызова метода: обновление выполняется на каждом ходе самоигры
+        counts = self.model.visits.get(state_hash)
+        if counts is None:
+            counts = self.model.visits[state_hash] = {}
+        counts[action_hash] = counts.get(action_hash, 0) + 1
+    
+    def _td_update(self, state_hash: str, action_hash: int, delta: float, table=None):
+        """Применяет ошибку TD delta к паре (s,a), а в режиме Q(λ) - ко всем парам со следом"""
+        if self.trace_lambda <= 0.0:
+            current_q = self.get_q_value(state_hash, action_hash, table)
+            self.set_q_value(state_hash, action_hash,
+                             current_q + self._alpha(state_hash, action_hash) * delta, table)
+            return
+        
+        # Watkins: после исследовательского хода прошлые пары не получают кредит
+        if self.explored:
+            self.traces.clear()
+        self.traces[(state_hash, action_hash)] = 1.0  # замещающий след
+        decay = self.gamma * self.trace_lambda
+        for key, trace in list(self.traces.items()):
+            self.set_q_value(*key, self.get_q_value(*key, table) + self._alpha(*key) * delta * trace, table)
+            trace *= decay
+            if trace < self.trace_cutoff:
+                del self.traces[key]
+            else:
+                self.traces[key] = trace
+    
+    def _alpha(self, state_hash: str, action_hash: int) -> float:
+        """Скорость обучения для пары: alpha или график по N(s,a)"""
+        if self.alpha_schedule is not None and self.alpha_schedule.per_visit:
+            visits = self.visits.get(state_hash, {}).get(action_hash, 0)
+            return self.alpha_schedule.for_visits(visits + 1)
+        return self.alpha
+    
+    def apply_schedules(self, game: int):
+        """Выставляет epsilon и alpha по графикам для игры номер game (с нуля)"""
+        if self.epsilon_schedule is not None:
+            self.epsilon = self.epsilon_schedule.value(game)
+        if self.alpha_schedule is not None:
+            self.alpha = self.alpha_schedule.value(game)
+    
+    def reset_episode(self):
+        """Начало новой партии: сбрасывает последний ход и следы"""
+        self.last_state = None
+        self.last_action = None
+        self.traces.clear()
+        self.explored = False
+    
+    def count_visit(self, state_hash: str, action_hash: int) -> int:
+        """Увеличивает счётчик обновлений N(s,a), возвращает новое значение"""
+        counts = self.visits.get(state_hash)
+        if counts is None:
+            counts = self.visits[state_hash] = {}
+        counts[action_hash] = counts.get(action_hash, 0) + 1
+        return counts[action_hash]
+    
+    def best_action(self, state_hash: str) -> Optional[int]:
+        """Лучший известный ход в состоянии по Q-таблице (None - состояние не изучено)"""
+        actions = self.q_table.get(state_hash)
+        if actions is None:
+            return None
+        return row_best(actions)
+    
+    def _greedy_move(self, state_hash: str, moves):
+        """Ход с максимальным Q по строке таблицы или None, если нужен полный перебор ходов"""
+        actions = self.q_table.get(state_hash)
+        if actions is None:
+            return None
+        move = action_move(row_best(actions))
+        # В той же позиции могли учиться ходы другой стороны
+        if move not in moves:
+            return None
+        # Неизученный ход (Q=0) лучше отрицательного максимума
+        if row_max(actions) < 0.0 and any(self.get_action_hash(*m) not in actions for m in moves):
+            return None
+        return move
     
     def get_reward(self, board, move_made: bool, is_capture: bool, 
                    piece_captured: bool, became_king: bool) -> float:
@@ -158,14 +793,14 @@ class QLearningBot:
         
         return score
     
-    def get_move(self) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
-        """Выбирает ход, используя epsilon-greedy стратегию"""
+    def get_move(self, time_limit: Optional[float] = None) -> Optional[Move]:
+        """Выбирает ход, используя epsilon-greedy стратегию (time_limit - бюджет анализа в секундах)"""
         if not self.game or (hasattr(self.game, 'game_ended') and self.game.game_ended):
             return None
         
         all_moves = self._get_all_moves_for_color(self.color)
         
-        print(f"[DEBUG] all_moves count: {len(all_moves)}")
+        logger.debug("[DEBUG] all_moves count: %d", len(all_moves))
         
         if not all_moves:
             return None
@@ -177,60 +812,158 @@ class QLearningBot:
         state_hash = self.get_state_hash(board)
         
         # Сортируем ходы: сначала взятия (они обычно лучше)
-        capture_moves = [m for m in all_moves if self._is_capture_move(m[0], m[1])]
-        normal_moves = [m for m in all_moves if not self._is_capture_move(m[0], m[1])]
+        capture_moves = [m for m in all_moves if self._is_capture_move(board, m)]
+        normal_moves = [m for m in all_moves if not self._is_capture_move(board, m)]
         sorted_moves = capture_moves + normal_moves
         
         # Epsilon-greedy выбор
         if random.random() < self.epsilon:
             # Исследование: выбираем случайный ход
             chosen_move = random.choice(sorted_moves) if sorted_moves else None
-            print(f"[RL Bot] Exploration: random move")
+            self.explored = True
+            logger.debug("[RL Bot] Exploration: random move")
         else:
             # Эксплуатация: выбираем лучший ход по Q-таблице
             best_move = None
             best_q = -float('inf')
             
-            for move in sorted_moves:
-                action_hash = self.get_action_hash(move[0], move[1])
-                q_value = self.get_q_value(state_hash, action_hash)
-                
-                if q_value > best_q:
-                    best_q = q_value
-                    best_move = move
+            analysis = {}
+            if self.analysis_depth > 0:
+                deadline = time.monotonic() + time_limit if time_limit else None
+                analysis = self._analyse_moves(board, sorted_moves, deadline)
+            elif not self.double_q:
+                best_move = self._greedy_move(state_hash, sorted_moves)
+                if best_move is not None:
+                    best_q = row_max(self.q_table[state_hash])
+            
+            if best_move is None:
+                for move in sorted_moves:
+                    action_hash = self.get_action_hash(*move)
+                    q_value = self.get_q_value(state_hash, action_hash)
+                    if self.double_q:
+                        # Ход выбирается по сумме обеих таблиц
+                        q_value += self.get_q_value(state_hash, action_hash, self.q_table_b)
+                    if analysis:
+                        q_value += self.analysis_weight * analysis[move]
+                    
+                    if q_value > best_q:
+                        best_q = q_value
+                        best_move = move
             
             chosen_move = best_move
-            print(f"[RL Bot] Exploitation: best Q={best_q:.3f}")
+            self.explored = False
+            logger.debug("[RL Bot] Exploitation: best Q=%.3f", best_q)
         
         # Сохраняем состояние и действие для последующего обучения
         if chosen_move:
             self.last_state = state_hash
-            self.last_action = self.get_action_hash(chosen_move[0], chosen_move[1])
+            self.last_action = self.get_action_hash(*chosen_move)
         
-        print(f"Q-table size: {len(self.q_table)} states")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Q-table size: %d states", len(self.q_table))
         return chosen_move
     
-    def learn_from_outcome(self, final_board, winner_color: str):
-        """Обучение после завершения игры"""
+    def analyse_move(self, board, move, depth: int) -> float:
+        """Оценка хода минимаксом на depth полуходов с точки зрения self.color"""
+        new_board = self._simulate_move_on_board(board, *move)
+        opponent = "WHITE" if self.color == "RED" else "RED"
+        score = self._minimax(new_board, opponent, depth - 1)
+        return score if self.color == "RED" else -score
+    
+    def _minimax(self, board, color: str, depth: int) -> float:
+        # Оценка всегда с точки зрения RED: RED максимизирует, WHITE минимизирует
+        self.nodes_evaluated += 1
+        if depth <= 0:
+            return self._evaluate_position(board)
+        
+        moves = self._get_all_moves_for_board(board, color)
+        if not moves:
+            # Нет ходов - проигрыш стороны, которая должна ходить
+            return -WIN_REWARD if color == "RED" else WIN_REWARD
+        
+        opponent = "WHITE" if color == "RED" else "RED"
+        scores = [self._minimax(self._simulate_move_on_board(board, *move), opponent, depth - 1)
+                  for move in moves]
+        return max(scores) if color == "RED" else min(scores)
+    
+    def _analyse_moves(self, board, moves, deadline: Optional[float]) -> dict:
+        """Анализирует ходы корня до общего дедлайна; не успевшие - статической оценкой"""
+        analysis = {}
+        if self.workers > 1:
+            if self._pool is None:
+                # spawn: процессы-воркеры не наследуют состояние Tk
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            futures = {self._pool.submit(_analyse_move_worker, self.color, board, move, self.analysis_depth): move
+                       for move in moves}
+            timeout = max(deadline - time.monotonic(), 0.0) if deadline else None
+            done, not_done = wait(futures, timeout=timeout)
+            for future in done:
+                analysis[futures[future]] = future.result()
+            for future in not_done:
+                future.cancel()
+        else:
+            for move in moves:
+                if (deadline and time.monotonic() >= deadline) or self.stop_search:
+                    break
+                analysis[move] = self.analyse_move(board, move, self.analysis_depth)
+        
+        for move in moves:
+            if move not in analysis:
+                analysis[move] = self.analyse_move(board, move, 1)
+        return analysis
+    
+    def close_pool(self):
+        """Останавливает пул процессов анализа"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def random_position(self, target_pieces: int, max_plies: int = 200, attempts: int = 10):
+        """Случайная партия от начальной позиции, пока на доске не останется target_pieces фигур.
+        Возвращает (доска, чей ход) или None"""
+        for _ in range(attempts):
+            board = initial_board()
+            color = "WHITE"
+            for _ in range(max_plies):
+                pieces = sum(1 for row in board for piece in row if piece)
+                if pieces <= target_pieces:
+                    return board, color
+                moves = self._get_all_moves_for_board(board, color)
+                if not moves:
+                    break
+                board = self._simulate_move_on_board(board, *random.choice(moves))
+                color = "WHITE" if color == "RED" else "RED"
+        return None
+    
+    def learn_from_outcome(self, final_board, winner_color: Optional[str]):
+        """Обучение после завершения игры (winner_color=None - ничья)"""
         if hasattr(self, '_last_learned_outcome') and self._last_learned_outcome:
             return
 
-        if self.last_state and self.last_action:
-            # Финальная награда
-            if winner_color == self.color:
-                final_reward = 100.0  # Победа
-            else:
-                final_reward = -50.0  # Поражение
-            
-            # Обновляем Q-значение для последнего действия
-            current_q = self.get_q_value(self.last_state, self.last_action)
-            new_q = current_q + self.alpha * (final_reward - current_q)
-            self.set_q_value(self.last_state, self.last_action, new_q)
-            
+        if self.last_state and self.last_action is not None:
+            final_reward = self.update_outcome(winner_color)
             print(f"[RL Bot] Learned from outcome: reward={final_reward}")
             self.save_q_table()
     
-    def learn_from_move(self, before_state_hash: str, action_hash: str, 
+    def update_outcome(self, winner_color: Optional[str]) -> float:
+        """Финальная награда за последний ход партии без сохранения таблицы; возвращает награду"""
+        if winner_color is None:
+            final_reward = DRAW_REWARD  # Ничья
+        elif winner_color == self.color:
+            final_reward = WIN_REWARD  # Победа
+        else:
+            final_reward = LOSS_REWARD  # Поражение
+        
+        # Обновляем Q-значение для последнего действия (и траектории в режиме Q(λ))
+        table, _ = self._update_tables()
+        current_q = self.get_q_value(self.last_state, self.last_action, table)
+        self._td_update(self.last_state, self.last_action, final_reward - current_q, table)
+        self.count_visit(self.last_state, self.last_action)
+        self.traces.clear()
+        return final_reward
+    
+    def learn_from_move(self, before_state_hash: str, action_hash: int, 
                         after_board, reward: float):
         """Обучение после каждого хода"""
         after_state_hash = self.get_state_hash(after_board)
@@ -265,12 +998,14 @@ class QLearningBot:
         """Показывает предупреждение о патовой ситуации"""
         if not self.stalemate_warning_shown and self.game and hasattr(self.game, 'root'):
             self.stalemate_warning_shown = True
+            # Tk нужен только окну игры: Engine, GameServer и самоигра его не грузят
+            from tkinter import messagebox
             self.game.root.after(0, lambda: messagebox.showinfo(
                 "Патовая ситуация", 
                 "Бот считает, что ситуация патовая!"
             ))
     
-    def _get_all_moves_for_color(self, color: str) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    def _get_all_moves_for_color(self, color: str) -> List[Move]:
         if not self.game:
             return []
         
@@ -280,7 +1015,7 @@ class QLearningBot:
             
         return self._get_all_moves_for_board(board, color)
     
-    def _get_all_moves_for_board(self, board, color: str) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    def _get_all_moves_for_board(self, board, color: str) -> List[Move]:
         moves = []
         target_color = RED_PIECE_COLOR if color == "RED" else WHITE_PIECE_COLOR
         
@@ -293,7 +1028,7 @@ class QLearningBot:
                 if piece and piece["color"] == target_color:
                     piece_moves = self._get_moves_for_piece(board, row, col)
                     for move in piece_moves:
-                        if self._is_capture_move(move[0], move[1]):
+                        if self._is_capture_move(board, move):
                             capture_moves.append(move)
                         else:
                             normal_moves.append(move)
@@ -302,7 +1037,7 @@ class QLearningBot:
             return capture_moves
         return normal_moves
     
-    def _get_moves_for_piece(self, board, row: int, col: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    def _get_moves_for_piece(self, board, row: int, col: int) -> List[Move]:
         piece = board[row][col]
         if not piece:
             return []
@@ -318,25 +1053,13 @@ class QLearningBot:
         else:
             if color == WHITE_PIECE_COLOR:
                 move_dirs = [(-1, -1), (-1, 1)]
-                capture_dirs = [(-2, -2), (-2, 2)]
             else:
                 move_dirs = [(1, -1), (1, 1)]
-                capture_dirs = [(2, -2), (2, 2)]
             
-            has_captures_for_this_piece = False
-
-            for dr, dc in capture_dirs:
-                new_r, new_c = row + dr, col + dc
-                mid_r, mid_c = row + dr//2, col + dc//2
-                
-                if 0 <= new_r < 8 and 0 <= new_c < 8:
-                    if (board[mid_r][mid_c] and 
-                        board[mid_r][mid_c]["color"] != color and 
-                        not board[new_r][new_c]):
-                        moves.append(((row, col), (new_r, new_c)))
-                        has_captures_for_this_piece = True
+            # Взятия - целыми цепочками одним составным ходом
+            self._add_capture_chains(board, ((row, col),), color, moves)
             
-            if not has_captures_for_this_piece:
+            if not moves:
                 for dr, dc in move_dirs:
                     new_r, new_c = row + dr, col + dc
                     if 0 <= new_r < 8 and 0 <= new_c < 8 and not board[new_r][new_c]:
@@ -344,6 +1067,24 @@ class QLearningBot:
         
         return moves
     
+    def _add_capture_chains(self, board, path: Tuple[Tuple[int, int], ...], color: str,
+                            moves: List) -> None:
+        """Дописывает в moves все полные цепочки взятий простой шашки, продолжающие path.
+        Цепочка идёт, пока есть прыжок, и обрывается превращением в дамку"""
+        row, col = path[-1]
+        if len(path) > 1 and row == PROMOTION_ROW[color]:
+            moves.append(path)
+            return
+        extended = False
+        for (mid_r, mid_c), (new_r, new_c) in MAN_JUMPS[color][(row, col)]:
+            # Шашка бьёт только вперёд: снятые фигуры и пройденные клетки не повторяются
+            middle = board[mid_r][mid_c]
+            if middle and middle["color"] != color and not board[new_r][new_c]:
+                self._add_capture_chains(board, path + ((new_r, new_c),), color, moves)
+                extended = True
+        if not extended and len(path) > 1:
+            moves.append(path)
+    
     def _add_king_moves(self, board, row: int, col: int, dr: int, dc: int, 
                         color: str, moves: List) -> None:
         curr_r, curr_c = row + dr, col + dc
@@ -427,23 +1168,34 @@ class QLearningBot:
         
         return False
     
-    def _is_capture_move(self, start: Tuple[int, int], end: Tuple[int, int]) -> bool:
-        return abs(end[0] - start[0]) == 2 and abs(end[1] - start[1]) == 2
+    def _captured_square(self, board, start: Tuple[int, int], end: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Клетка фигуры, снятой прыжком start -> end (первая фигура на пути), или None"""
+        dr = 1 if end[0] > start[0] else -1
+        dc = 1 if end[1] > start[1] else -1
+        curr_r, curr_c = start[0] + dr, start[1] + dc
+        while (curr_r, curr_c) != end:
+            if board[curr_r][curr_c]:
+                return curr_r, curr_c
+            curr_r += dr
+            curr_c += dc
+        return None
+    
+    def _is_capture_move(self, board, move) -> bool:
+        """Взятие: цепочка прыжков или ход через фигуру (для дамки - на любую дальность)"""
+        return len(move) > 2 or self._captured_square(board, move[0], move[1]) is not None
     
-    def _simulate_move_on_board(self, board, start: Tuple[int, int], end: Tuple[int, int]):
+    def _simulate_move_on_board(self, board, start: Tuple[int, int], *path: Tuple[int, int]):
+        """Новая доска после хода start -> ... -> end (все прыжки цепочки сразу)"""
         new_board = copy.deepcopy(board)
         
-        start_r, start_c = start
-        end_r, end_c = end
-        
-        new_board[end_r][end_c] = new_board[start_r][start_c]
-        new_board[start_r][start_c] = None
-        
-        if self._is_capture_move(start, end):
-            mid_r = (start_r + end_r) // 2
-            mid_c = (start_c + end_c) // 2
-            new_board[mid_r][mid_c] = None
+        for hop_start, hop_end in zip((start,) + path, path):
+            captured = self._captured_square(new_board, hop_start, hop_end)
+            if captured:
+                new_board[captured[0]][captured[1]] = None
+            new_board[hop_end[0]][hop_end[1]] = new_board[hop_start[0]][hop_start[1]]
+            new_board[hop_start[0]][hop_start[1]] = None
         
+        end_r, end_c = path[-1]
         piece = new_board[end_r][end_c]
         if piece and not piece["is_king"]:
             if (end_r == 0 and piece["color"] == WHITE_PIECE_COLOR) or \
@@ -453,5 +1205,18 @@ class QLearningBot:
         return new_board
 
 
+_analysis_bot = None
+
+
+def _analyse_move_worker(color: str, board, move, depth: int) -> float:
+    """Анализ одного хода корня в процессе пула"""
+    global _analysis_bot
+    if _analysis_bot is None:
+        # Q-таблица для перебора не нужна: бот без файла
+        _analysis_bot = QLearningBot(model=QTableModel())
+    _analysis_bot.color = color
+    return _analysis_bot.analyse_move(board, move, depth)
+
+
 # Для обратной совместимости сохраняем старое имя класса
 BotPlayer = QLearningBot
\ No newline at end of file
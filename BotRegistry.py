@@ -0,0 +1,10 @@
+"""Движки ботов по имени - общий список для окна игры, турнира (Arena) и текстового движка (Engine)"""
+from typing import Dict, Type
+
+from BotClass import QLearningBot
+from MCTSBot import MCTSBot
+
+BOT_ENGINES: Dict[str, Type[QLearningBot]] = {
+    "q_learning": QLearningBot,
+    "mcts": MCTSBot,
+}
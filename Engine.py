@@ -0,0 +1,192 @@
+"""Текстовый протокол движка (в духе UCI) через stdin/stdout, без Tk.
+
+Команды - по одной в строке, их можно отправлять пачкой не дожидаясь ответов:
+
+    engine                                -> id name ... / engineok
+    isready                               -> readyok
+    newgame                               новая партия (следы и дерево поиска сбрасываются)
+    position startpos [moves 22-18 ...]   позиция от начальной расстановки
+    position fen W:W21,K22:B1,2 [moves ...]
+    go [movetime <мс>]                    -> info ... / bestmove 11-15 (или bestmove none)
+    stop                                  закончить поиск досрочно
+    setoption name epsilon value 0.05
+    quit
+
+Ходы пишутся как в PDN (см. GameRecord), цепочка взятий - целиком: "9x18x27".
+Модель загружается один раз на процесс и используется во всех партиях.
+Отладочный вывод бота уходит в stderr, в stdout - только ответы протокола.
+
+    python Engine.py --q-table q_table.json
+    python Engine.py --engine mcts --movetime 200
+"""
+from typing import List, Optional, TextIO
+import argparse
+import contextlib
+import sys
+import threading
+import time
+
+from BotClass import QLearningBot, QTableModel, initial_board
+from BotRegistry import BOT_ENGINES
+from GameRecord import board_from_fen, format_move, parse_move
+from Trajectory import HeadlessGame
+
+ENGINE_NAME = "MakYek Q-learning"
+ENGINE_MOVETIME = 1000  # мс на ход, если go без movetime
+# Параметры бота, которые можно менять через setoption
+ENGINE_OPTIONS = {"epsilon": float, "analysis_depth": int, "analysis_weight": float,
+                  "move_time": float, "exploration": float}
+
+
+class Engine:
+    """Разбирает команды протокола; поиск идёт в отдельном потоке, чтобы принимать stop"""
+    def __init__(self, bot: QLearningBot, out: TextIO = sys.stdout, movetime: int = ENGINE_MOVETIME):
+        self.bot = bot
+        self.out = out
+        self.movetime = movetime
+        self.game = HeadlessGame()
+        self._search: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def send(self, line: str) -> None:
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, stream: TextIO) -> None:
+        for line in stream:
+            try:
+                if not self.handle(line):
+                    break
+            except Exception as e:
+                # Ошибка одной команды не останавливает движок
+                self.send(f"info string ошибка: {e!r}")
+        self._wait()
+
+    def handle(self, line: str) -> bool:
+        """Выполняет одну команду; False - команда quit"""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "quit":
+            self.bot.stop_search = True
+            return False
+        if command == "stop":
+            self.bot.stop_search = True
+            return True
+        if command == "isready":
+            self.send("readyok")
+            return True
+        # Остальные команды меняют позицию или бота - дожидаемся конца поиска
+        self._wait()
+        if command == "newgame":
+            self.new_game()
+        elif command == "position":
+            self.set_position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "engine":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send("engineok")
+        else:
+            self.send(f"info string неизвестная команда {command}")
+        return True
+
+    def new_game(self) -> None:
+        self.game = HeadlessGame()
+        self.bot.reset_episode()
+        if hasattr(self.bot, "_root"):
+            self.bot._root = None  # дерево MCTS прошлой партии не переиспользуем
+
+    def set_position(self, args: List[str]) -> None:
+        """position startpos|fen <FEN> [moves ...]; на недопустимом ходе позиция останавливается"""
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+        if setup[:1] == ["fen"] and len(setup) > 1:
+            try:
+                board, turn = board_from_fen(" ".join(setup[1:]))
+            except ValueError as e:
+                self.send(f"info string {e}")
+                return
+        elif setup[:1] == ["startpos"]:
+            board, turn = initial_board(), "WHITE"
+        else:
+            self.send("info string ожидается position startpos или position fen")
+            return
+        game = HeadlessGame(board, turn)
+        for text in moves:
+            move = parse_move(text)
+            if move is None or move not in self.bot._get_all_moves_for_board(game.board, game.current_turn):
+                self.send(f"info string недопустимый ход {text}")
+                break
+            game.board = self.bot._simulate_move_on_board(game.board, *move)
+            game.current_turn = "RED" if game.current_turn == "WHITE" else "WHITE"
+        self.game = game
+
+    def go(self, args: List[str]) -> None:
+        movetime = self.movetime
+        if "movetime" in args:
+            try:
+                movetime = int(args[args.index("movetime") + 1])
+            except (IndexError, ValueError):
+                self.send("info string movetime - целое число миллисекунд")
+                return
+        self.bot.stop_search = False
+        self._search = threading.Thread(target=self._think, args=(movetime / 1000.0,), daemon=True)
+        self._search.start()
+
+    def _think(self, time_limit: float) -> None:
+        bot, game = self.bot, self.game
+        bot.game = game
+        bot.color = game.current_turn
+        started = time.monotonic()
+        move = bot.get_move(time_limit=time_limit)
+        elapsed = int((time.monotonic() - started) * 1000)
+        nodes = getattr(bot, "simulations", bot.nodes_evaluated)
+        self.send(f"info time {elapsed} nodes {nodes}")
+        if move is None:
+            self.send("bestmove none")
+        else:
+            self.send(f"bestmove {format_move(move, bot._is_capture_move(game.board, move))}")
+
+    def set_option(self, args: List[str]) -> None:
+        """setoption name <параметр> value <значение>"""
+        if len(args) != 4 or args[0] != "name" or args[2] != "value" or args[1] not in ENGINE_OPTIONS:
+            self.send(f"info string параметры: {', '.join(ENGINE_OPTIONS)}")
+            return
+        try:
+            setattr(self.bot, args[1], ENGINE_OPTIONS[args[1]](args[3]))
+        except ValueError:
+            self.send(f"info string неверное значение {args[3]}")
+
+    def _wait(self) -> None:
+        if self._search is not None:
+            self._search.join()
+            self._search = None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Движок MakYek с текстовым протоколом")
+    parser.add_argument("--engine", choices=sorted(BOT_ENGINES), default="q_learning")
+    parser.add_argument("--q-table", default="q_table.json")
+    parser.add_argument("--epsilon", type=float, default=0.0)
+    parser.add_argument("--movetime", type=int, default=ENGINE_MOVETIME, help="мс на ход по умолчанию")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    # Сообщения бота (загрузка таблицы и т.п.) не должны попадать в протокол
+    with contextlib.redirect_stdout(sys.stderr):
+        model = QTableModel(args.q_table)
+        model.load()
+        bot = BOT_ENGINES[args.engine](model=model, epsilon=args.epsilon)
+        Engine(bot, out, args.movetime).run(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Записи партий в формате PDN и их потоковое воспроизведение.
+
+Клетки нумеруются 1..32 по тёмным полям сверху вниз, слева направо: красные
+стоят на 1..8, белые - на 25..32. Взятие пишется через "x" (цепочка - 9x18x27),
+тихий ход - через "-". Белые в PDN - [White], красные - [Black].
+
+    python GameRecord.py replay games.pdn archive/*.pdn --passes 2
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import datetime
+import re
+
+from BotClass import (QLearningBot, QTableModel, initial_board, board_from_state_hash,
+                      RED_PIECE_COLOR, WHITE_PIECE_COLOR)
+from Trajectory import Step, replay_game
+
+GAMES_FILE = "games.pdn"
+
+RESULTS = {"WHITE": "1-0", "RED": "0-1", None: "1/2-1/2"}
+WINNERS = {result: winner for winner, result in RESULTS.items()}
+UNFINISHED = "*"
+
+Position = Tuple[int, int]
+# Ход в записи: (сторона, откуда, куда, взятие) - прыжок цепочки взятий отдельной записью
+LoggedMove = Tuple[str, Position, Position, bool]
+
+_TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]$')
+_MOVE = re.compile(r'^\d+(?:[-x]\d+)+$')
+
+
+def square_number(position: Position) -> int:
+    row, col = position
+    return row * 4 + col // 2 + 1
+
+
+def square_position(number: int) -> Position:
+    row = (number - 1) // 4
+    return row, (number - 1) % 4 * 2 + (row + 1) % 2
+
+
+def format_move(move: Tuple[Position, ...], is_capture: bool) -> str:
+    """Ход бота (откуда, ..., куда) в записи PDN: "22-18" или "9x18x27" """
+    return ("x" if is_capture else "-").join(str(square_number(position)) for position in move)
+
+
+def parse_move(text: str) -> Optional[Tuple[Position, ...]]:
+    """Запись PDN -> ход бота (откуда, ..., куда); None - не ход"""
+    if not _MOVE.match(text):
+        return None
+    return tuple(square_position(int(n)) for n in re.split(r'[-x]', text))
+
+
+def fen_from_state(state_hash: str, turn: str) -> str:
+    """Позиция в виде PDN FEN: "W:W21,K22:B1,2" """
+    board = board_from_state_hash(state_hash)
+    squares = {WHITE_PIECE_COLOR: [], RED_PIECE_COLOR: []}
+    for number in range(1, 33):
+        row, col = square_position(number)
+        piece = board[row][col]
+        if piece:
+            squares[piece["color"]].append(("K" if piece["is_king"] else "") + str(number))
+    return (f"{'W' if turn == 'WHITE' else 'B'}:W{','.join(squares[WHITE_PIECE_COLOR])}"
+            f":B{','.join(squares[RED_PIECE_COLOR])}")
+
+
+def board_from_fen(fen: str) -> Tuple[list, str]:
+    """(доска в формате get_board_state(), чей ход) из PDN FEN; ValueError - FEN с ошибкой"""
+    board = [[None for _ in range(8)] for _ in range(8)]
+    turn, *sides = fen.strip().split(':')
+    if turn.upper() not in ('W', 'B') or not sides:
+        raise ValueError(f"неверный FEN {fen!r}")
+    for side in sides:
+        if side[:1] not in ('W', 'B'):
+            raise ValueError(f"неверный FEN {fen!r}")
+        color = WHITE_PIECE_COLOR if side[0] == 'W' else RED_PIECE_COLOR
+        for token in filter(None, side[1:].split(',')):
+            number = token[1:] if token.startswith('K') else token
+            if not number.isdigit() or not 1 <= int(number) <= 32:
+                raise ValueError(f"неверная клетка {token!r} в FEN")
+            row, col = square_position(int(number))
+            board[row][col] = {"color": color, "is_king": token.startswith('K')}
+    return board, "WHITE" if turn.upper() == 'W' else "RED"
+
+
+def format_moves(moves: List[LoggedMove]) -> List[Tuple[str, str]]:
+    """Склеивает прыжки одной цепочки взятий: [(сторона, "9x18x27"), ...]"""
+    tokens = []
+    for side, start, end, is_capture in moves:
+        if (is_capture and tokens and tokens[-1][0] == side and tokens[-1][2]
+                and tokens[-1][3] == start):
+            tokens[-1][1].append(square_number(end))
+            tokens[-1][3] = end
+        else:
+            tokens.append([side, [square_number(start), square_number(end)], is_capture, end])
+    return [(side, ("x" if is_capture else "-").join(map(str, squares)))
+            for side, squares, is_capture, _ in tokens]
+
+
+def format_game(tags: Dict[str, str], moves: List[LoggedMove], winner: Optional[str],
+                finished: bool = True) -> str:
+    """Текст партии PDN: теги, нумерованные ходы, результат"""
+    result = RESULTS[winner] if finished else UNFINISHED
+    lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+    lines.append(f'[Result "{result}"]')
+    words = []
+    number = 1
+    for i, (side, move) in enumerate(format_moves(moves)):
+        # Номер хода не отрывается от хода при переносе строки
+        if side == "WHITE":
+            move = f"{number}. {move}"
+        elif i == 0:
+            move = f"{number}... {move}"
+        words.append(move)
+        if side == "RED":
+            number += 1
+    words.append(result)
+    # Строки ходов не длиннее 80 символов
+    text, line = [], ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > 80:
+            text.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    text.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(text) + "\n\n"
+
+
+def game_tags(event: str, white: str, red: str, start: Optional[Tuple[str, str]] = None) -> Dict[str, str]:
+    """Стандартные теги; start - (hash состояния, чей ход), если партия не с начальной позиции"""
+    tags = {
+        "Event": event,
+        "Date": datetime.date.today().strftime("%Y.%m.%d"),
+        "White": white,
+        "Black": red,
+        "GameType": "MakYek",
+    }
+    if start is not None:
+        tags["SetUp"] = "1"
+        tags["FEN"] = fen_from_state(*start)
+    return tags
+
+
+class PDNWriter:
+    """Дописывает партии в конец файла PDN"""
+    def __init__(self, path: str = GAMES_FILE):
+        self.path = path
+
+    def write_game(self, tags: Dict[str, str], moves: List[LoggedMove], winner: Optional[str],
+                   finished: bool = True) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(format_game(tags, moves, winner, finished))
+
+
+class GameRecord:
+    """Прочитанная партия: теги, ходы (список прыжков на каждый ход) и результат"""
+    __slots__ = ("tags", "moves", "result")
+
+    def __init__(self, tags: Dict[str, str], moves: List[List[Position]], result: str):
+        self.tags = tags
+        self.moves = moves
+        self.result = result
+
+    @property
+    def finished(self) -> bool:
+        return self.result in WINNERS
+
+    @property
+    def winner(self) -> Optional[str]:
+        return WINNERS.get(self.result)
+
+    def start(self) -> Tuple[list, str]:
+        """Стартовая позиция: из тега FEN или начальная расстановка"""
+        if "FEN" in self.tags:
+            return board_from_fen(self.tags["FEN"])
+        return initial_board(), "WHITE"
+
+
+def read_games(path: str) -> Iterator[GameRecord]:
+    """Потоково читает партии PDN по одной; комментарии {...} и варианты (...) пропускаются"""
+    tags, moves, depth = {}, [], 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            match = _TAG.match(line)
+            if match and depth == 0:
+                if moves:
+                    # Партия без результата в конце - незавершённая
+                    yield GameRecord(tags, moves, UNFINISHED)
+                    tags, moves = {}, []
+                tags[match.group(1)] = match.group(2)
+                continue
+            for word in re.split(r'(\{|\}|\(|\)|\s+)', line):
+                if word in ('{', '('):
+                    depth += 1
+                elif word in ('}', ')'):
+                    depth -= 1
+                elif depth or not word.strip():
+                    continue
+                elif word in WINNERS or word == UNFINISHED:
+                    yield GameRecord(tags, moves, word)
+                    tags, moves = {}, []
+                else:
+                    move = parse_move(re.sub(r'^\d+\.+', '', word))
+                    if move:
+                        moves.append(list(move))
+    if moves:
+        yield GameRecord(tags, moves, UNFINISHED)
+
+
+def game_steps(record: GameRecord, bot: QLearningBot) -> Optional[Tuple[List[Step], str]]:
+    """Проверяет партию правилами бота и переводит её в шаги обучения.
+    Возвращает (шаги, финальная позиция) или None, если встретился недопустимый ход"""
+    board, turn = record.start()
+    steps = []
+    for squares in record.moves:
+        # Цепочка взятий "9x18x27" - один составной ход бота
+        move = tuple(squares)
+        if move not in bot._get_all_moves_for_board(board, turn):
+            return None
+        start, end = move[0], move[-1]
+        is_capture = bot._is_capture_move(board, move)
+        new_board = bot._simulate_move_on_board(board, *move)
+        became_king = not board[start[0]][start[1]]["is_king"] and new_board[end[0]][end[1]]["is_king"]
+        reward = bot.get_reward(new_board, True, is_capture, is_capture, became_king)
+        steps.append((bot.get_state_hash(board), turn, bot.get_action_hash(*move), reward, False))
+        board = new_board
+        turn = "RED" if turn == "WHITE" else "WHITE"
+    return steps, bot.get_state_hash(board)
+
+
+def replay_games(paths: List[str], bot: QLearningBot, passes: int = 1) -> Dict[str, int]:
+    """Обучает bot на партиях из файлов PDN, читая их по одной; сохраняет таблицу"""
+    white_bot = QLearningBot(model=bot.model, alpha=bot.alpha, gamma=bot.gamma,
+                             trace_lambda=bot.trace_lambda, trace_cutoff=bot.trace_cutoff,
+                             double_q=bot.double_q)
+    bots = {"RED": bot, "WHITE": white_bot}
+    bot.color, white_bot.color = "RED", "WHITE"
+    stats = {"games": 0, "moves": 0, "skipped": 0}
+    try:
+        for _ in range(passes):
+            for path in paths:
+                for record in read_games(path):
+                    replay = game_steps(record, bot) if record.finished else None
+                    if replay is None:
+                        stats["skipped"] += 1
+                        continue
+                    steps, final_state = replay
+                    replay_game(bots, steps, final_state, record.winner)
+                    stats["games"] += 1
+                    stats["moves"] += len(steps)
+    finally:
+        white_bot.release()
+    bot.save_q_table()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Обучение на партиях PDN")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay = commands.add_parser("replay", help="прогнать партии через обучение")
+    replay.add_argument("paths", nargs="+")
+    replay.add_argument("--q-table", default="q_table.json")
+    replay.add_argument("--passes", type=int, default=1)
+    replay.add_argument("--alpha", type=float, default=0.1)
+    replay.add_argument("--gamma", type=float, default=0.9)
+    replay.add_argument("--lambda", dest="trace_lambda", type=float, default=0.0)
+
+    args = parser.parse_args(argv)
+    if args.command == "replay":
+        model = QTableModel(args.q_table)
+        model.load()
+        bot = QLearningBot(model=model, alpha=args.alpha, gamma=args.gamma, trace_lambda=args.trace_lambda)
+        stats = replay_games(args.paths, bot, args.passes)
+        print(f"Обучено на {stats['games']} партиях ({stats['moves']} ходов), "
+              f"пропущено {stats['skipped']}")
+        print(f"Q-таблица: {len(bot.q_table)} состояний -> {bot.q_table_file}")
+
+
+if __name__ == "__main__":
+    main()
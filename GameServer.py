@@ -0,0 +1,412 @@
+"""Сервер партий против бота без Tk: сотни одновременных партий в одном процессе.
+
+Протокол - построчный JSON по TCP или Unix-сокету: одна строка - один запрос,
+на каждый запрос - одна строка ответа. Поле "id" запроса возвращается в ответе.
+
+    {"cmd": "login", "user": "admin", "password": "..."}
+    {"cmd": "new", "color": "WHITE"}             -> {"game": 1, "fen": ..., "legal": [...]}
+    {"cmd": "move", "game": 1, "move": "22-18"}  -> {"reply": "11-15", "fen": ..., "result": null}
+    {"cmd": "resign", "game": 1}
+    {"cmd": "quit"}
+
+Ходы пишутся как в PDN (см. GameRecord), цепочка взятий - целиком: "9x18x27".
+Пароли проверяются по users.json (sha256, как в окне входа). Ходы бота
+считаются в ограниченном пуле процессов, цикл событий не блокируется: позиции
+партий, ждущих ответа, собираются в пачки (BatchPolicy) по одной на вызов пула.
+
+    python GameServer.py serve --port 8765 --workers 4
+    python GameServer.py loadgen --port 8765 --clients 200 --games 5 --user admin --password ...
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from BatchPolicy import BatchPolicy, Position
+from BotClass import QLearningBot, QTableModel, DrawTracker, Move, initial_board
+from GameRecord import RESULTS, fen_from_state, format_move, parse_move
+from MCTSBot import encode_board
+
+USERS_FILE = "users.json"
+SERVER_PORT = 8765
+SERVER_MAX_GAMES = 1000      # одновременных партий на сервер
+SERVER_BATCH = 64            # позиций в одном вызове пула
+SERVER_LINE_LIMIT = 64 * 1024
+
+
+def load_users(path: str = USERS_FILE) -> Dict[str, str]:
+    """{логин: sha256 пароля}; нет файла - нет пользователей"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+class ProtocolError(Exception):
+    """Ошибка запроса клиента: уходит клиенту в поле "error" """
+
+
+def request_field(request: dict, name: str, kind: type, default=None):
+    """Поле запроса с проверкой типа (bool не считается числом); нет поля - default"""
+    value = request.get(name, default)
+    if value is default:
+        return value
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ProtocolError(f"поле {name!r} должно быть типа {kind.__name__}")
+    return value
+
+
+_worker_policy: Optional[BatchPolicy] = None
+
+
+def _init_worker(q_table_file: str, epsilon: float) -> None:
+    """Процесс пула: Q-таблица загружается один раз на процесс"""
+    global _worker_policy
+    model = QTableModel(q_table_file)
+    model.load()
+    _worker_policy = BatchPolicy(model, epsilon=epsilon)
+
+
+def _bot_moves(positions: List[Position]) -> List[Optional[Move]]:
+    """Ходы бота для пачки позиций (в процессе пула)"""
+    return _worker_policy.choose_moves(positions)
+
+
+class GameSession:
+    """Партия игрока против бота: позиция, чей ход, ничьи по повторению и без прогресса"""
+    def __init__(self, game_id: int, user: str, player_color: str, rules: QLearningBot):
+        self.id = game_id
+        self.user = user
+        self.player_color = player_color
+        self.bot_color = "RED" if player_color == "WHITE" else "WHITE"
+        self.rules = rules
+        self.board = initial_board()
+        self.turn = "WHITE"
+        self.result: Optional[str] = None
+        self.plies = 0
+        self.draw_tracker = DrawTracker()
+        self.draw_tracker.record(self.state_hash(), self.turn)
+
+    def state_hash(self) -> str:
+        return self.rules.get_state_hash(self.board)
+
+    def legal_moves(self) -> List[Move]:
+        return self.rules._get_all_moves_for_board(self.board, self.turn)
+
+    def play(self, move: Move) -> str:
+        """Выполняет ход стороны self.turn, подводит итог партии; возвращает запись хода"""
+        text = format_move(move, self.rules._is_capture_move(self.board, move))
+        self.board = self.rules._simulate_move_on_board(self.board, *move)
+        self.turn = "RED" if self.turn == "WHITE" else "WHITE"
+        self.plies += 1
+        if self.draw_tracker.record(self.state_hash(), self.turn):
+            self.result = RESULTS[None]
+        elif not self.legal_moves():
+            # Нет ходов - проигрыш стороны, которая должна ходить
+            self.result = RESULTS["RED" if self.turn == "WHITE" else "WHITE"]
+        return text
+
+    def describe(self) -> dict:
+        """Состояние партии для ответа клиенту"""
+        legal = []
+        if self.result is None and self.turn == self.player_color:
+            legal = [format_move(move, self.rules._is_capture_move(self.board, move))
+                     for move in self.legal_moves()]
+        return {"game": self.id, "fen": fen_from_state(self.state_hash(), self.turn),
+                "turn": self.turn, "legal": legal, "result": self.result}
+
+
+class GameServer:
+    """Асинхронный сервер партий; ходы бота - в пуле из workers процессов"""
+    def __init__(self, q_table_file: str = "q_table.json", users_file: str = USERS_FILE,
+                 workers: int = 1, epsilon: float = 0.0, max_games: int = SERVER_MAX_GAMES):
+        self.users = load_users(users_file)
+        self.rules = QLearningBot(model=QTableModel())  # правила и hash; Q-таблица - в пуле
+        self.max_games = max_games
+        self.games: Dict[int, GameSession] = {}
+        self._next_id = 1
+        self.workers = workers
+        self._pool_args = (q_table_file, epsilon)
+        self.pool = self._make_pool()
+        # Позиции, ждущие хода бота; в пуле одновременно не больше workers пачек
+        self._pending: List[Tuple[Position, asyncio.Future]] = []
+        self._ready: Optional[asyncio.Event] = None
+        self.stats = {"connections": 0, "games": 0, "moves": 0, "batches": 0}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = SERVER_PORT,
+                    unix_path: Optional[str] = None) -> None:
+        self._ready = asyncio.Event()
+        dispatchers = [asyncio.create_task(self._dispatch_batches()) for _ in range(self.workers)]
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle, unix_path, limit=SERVER_LINE_LIMIT)
+            print(f"Сервер слушает {unix_path}")
+        else:
+            server = await asyncio.start_server(self._handle, host, port, limit=SERVER_LINE_LIMIT)
+            print(f"Сервер слушает {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in dispatchers:
+                task.cancel()
+
+    def _make_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=self._pool_args)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def bot_move(self, session: GameSession) -> Optional[Move]:
+        """Ставит позицию в очередь и ждёт хода из ближайшей пачки"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((bytes(encode_board(session.board)), session.bot_color), future))
+        self._ready.set()
+        return await future
+
+    async def _dispatch_batches(self) -> None:
+        """Отправляет в пул пачки ожидающих позиций; пока пул занят, очередь копится в следующую пачку"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            batch = self._pending[:SERVER_BATCH]
+            del self._pending[:SERVER_BATCH]
+            if not self._pending:
+                self._ready.clear()
+            if not batch:
+                continue
+            self.stats["batches"] += 1
+            try:
+                moves = await loop.run_in_executor(self.pool, _bot_moves, [position for position, _ in batch])
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # Процесс пула упал: запросы пачки получат ошибку, следующие - новый пул
+                    print(f"[Server] Пул процессов сломан, перезапуск: {e!r}")
+                    self.pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._make_pool()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), move in zip(batch, moves):
+                if not future.done():
+                    future.set_result(move)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Соединение клиента: запросы обрабатываются по порядку. Ошибка запроса - ответ
+        {"ok": false, "error": ...}, соединение остаётся открытым"""
+        self.stats["connections"] += 1
+        connection = {"user": None, "games": set()}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ProtocolError("запрос должен быть объектом JSON")
+                    request = message
+                    response = await self._dispatch(request, connection)
+                    response["ok"] = True
+                except (ProtocolError, ValueError) as e:
+                    response = {"ok": False, "error": str(e)}
+                except Exception as e:
+                    # Сбой сервера (пул процессов и т.п.) не должен рвать соединение клиента
+                    print(f"[Server] Ошибка запроса {request.get('cmd')!r}: {e!r}")
+                    response = {"ok": False, "error": f"внутренняя ошибка сервера: {type(e).__name__}"}
+                if "id" in request:
+                    response["id"] = request["id"]
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+                if request.get("cmd") == "quit":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            for game_id in connection["games"]:
+                self.games.pop(game_id, None)
+            writer.close()
+
+    async def _dispatch(self, request: dict, connection: dict) -> dict:
+        command = request_field(request, "cmd", str)
+        if command == "login":
+            user, password = request.get("user"), request.get("password")
+            if not isinstance(user, str) or not isinstance(password, str) \
+                    or self.users.get(user) != hash_password(password):
+                raise ProtocolError("неверный логин или пароль")
+            connection["user"] = user
+            return {"user": user}
+        if command == "quit":
+            return {}
+        if connection["user"] is None:
+            raise ProtocolError("сначала нужен login")
+
+        if command == "new":
+            color = request.get("color", "WHITE")
+            if color not in ("WHITE", "RED"):
+                raise ProtocolError("color - WHITE или RED")
+            if len(self.games) >= self.max_games:
+                raise ProtocolError("сервер заполнен")
+            session = GameSession(self._next_id, connection["user"], color, self.rules)
+            self._next_id += 1
+            self.games[session.id] = session
+            connection["games"].add(session.id)
+            self.stats["games"] += 1
+            reply = await self._bot_turn(session)
+            return dict(session.describe(), reply=reply)
+
+        session = self.games.get(request_field(request, "game", int))
+        if session is None or session.id not in connection["games"]:
+            raise ProtocolError("нет такой партии")
+        if command == "move":
+            move_text = request_field(request, "move", str, "")
+            if session.result is not None:
+                raise ProtocolError("партия окончена")
+            if session.turn != session.player_color:
+                # Прошлый ответ бота не удался (ошибка пула) - пробуем ещё раз
+                await self._bot_turn(session)
+            if session.turn != session.player_color:
+                raise ProtocolError("сейчас ход бота")
+            move = parse_move(move_text)
+            if move is None or move not in session.legal_moves():
+                raise ProtocolError(f"недопустимый ход {move_text!r}")
+            played = session.play(move)
+            self.stats["moves"] += 1
+            reply = await self._bot_turn(session)
+            return dict(session.describe(), move=played, reply=reply)
+        if command == "resign":
+            if session.result is None:
+                session.result = RESULTS[session.bot_color]
+            return session.describe()
+        if command == "close":
+            self.games.pop(session.id, None)
+            connection["games"].discard(session.id)
+            return {"game": session.id}
+        raise ProtocolError(f"неизвестная команда {command!r}")
+
+    async def _bot_turn(self, session: GameSession) -> Optional[str]:
+        """Ход бота, если партия идёт и очередь его; возвращает запись хода"""
+        if session.result is not None or session.turn != session.bot_color:
+            return None
+        move = await self.bot_move(session)
+        if move is None or session.result is not None:
+            return None
+        self.stats["moves"] += 1
+        return session.play(move)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+async def _loadgen_client(connect, user: str, password: str, games: int, seed: int,
+                          latencies: List[float]) -> Tuple[int, int]:
+    """Один клиент: входит и играет games партий случайными ходами. Возвращает (партий, ходов)"""
+    rng = random.Random(seed)
+    reader, writer = await connect()
+
+    async def request(message: dict) -> dict:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        if not response.get("ok"):
+            raise ProtocolError(response.get("error"))
+        return response
+
+    played = moves = 0
+    try:
+        await request({"cmd": "login", "user": user, "password": password})
+        for i in range(games):
+            state = await request({"cmd": "new", "color": "WHITE" if (seed + i) % 2 == 0 else "RED"})
+            while state["result"] is None and state["legal"]:
+                started = time.perf_counter()
+                state = await request({"cmd": "move", "game": state["game"], "move": rng.choice(state["legal"])})
+                latencies.append(time.perf_counter() - started)
+                moves += 1 + (state["reply"] is not None)
+            await request({"cmd": "close", "game": state["game"]})
+            played += 1
+        await request({"cmd": "quit"})
+    finally:
+        writer.close()
+    return played, moves
+
+
+async def run_loadgen(clients: int, games: int, user: str, password: str, host: str = "127.0.0.1",
+                      port: int = SERVER_PORT, unix_path: Optional[str] = None, seed: int = 0) -> dict:
+    """clients одновременных клиентов по games партий; ходы/с и задержки ответа на ход"""
+    if unix_path:
+        connect = lambda: asyncio.open_unix_connection(unix_path, limit=SERVER_LINE_LIMIT)
+    else:
+        connect = lambda: asyncio.open_connection(host, port, limit=SERVER_LINE_LIMIT)
+    latencies = []
+    started = time.monotonic()
+    results = await asyncio.gather(*(_loadgen_client(connect, user, password, games, seed + i, latencies)
+                                     for i in range(clients)))
+    elapsed = time.monotonic() - started
+    moves = sum(m for _, m in results)
+    return {"games": sum(g for g, _ in results), "moves": moves, "seconds": elapsed,
+            "moves_per_second": moves / max(elapsed, 1e-9),
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Сервер партий против бота и нагрузочный клиент")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="запустить сервер")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=SERVER_PORT)
+    serve.add_argument("--unix", default=None, help="путь Unix-сокета вместо TCP")
+    serve.add_argument("--q-table", default="q_table.json")
+    serve.add_argument("--users", default=USERS_FILE)
+    serve.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve.add_argument("--epsilon", type=float, default=0.0)
+    serve.add_argument("--max-games", type=int, default=SERVER_MAX_GAMES)
+
+    loadgen = commands.add_parser("loadgen", help="нагрузочный клиент")
+    loadgen.add_argument("--host", default="127.0.0.1")
+    loadgen.add_argument("--port", type=int, default=SERVER_PORT)
+    loadgen.add_argument("--unix", default=None)
+    loadgen.add_argument("--clients", type=int, default=100)
+    loadgen.add_argument("--games", type=int, default=1, help="партий на клиента")
+    loadgen.add_argument("--user", required=True)
+    loadgen.add_argument("--password", required=True)
+    loadgen.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        server = GameServer(args.q_table, args.users, args.workers, args.epsilon, args.max_games)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            print(f"Соединений: {server.stats['connections']}, партий: {server.stats['games']}, "
+                  f"ходов: {server.stats['moves']}, пачек: {server.stats['batches']}")
+    elif args.command == "loadgen":
+        report = asyncio.run(run_loadgen(args.clients, args.games, args.user, args.password,
+                                         args.host, args.port, args.unix, args.seed))
+        print(f"{report['games']} партий, {report['moves']} ходов за {report['seconds']:.1f} с "
+              f"({report['moves_per_second']:.0f} ходов/с)")
+        print(f"Задержка ответа на ход: p50 {report['p50_ms']:.1f} мс, p99 {report['p99_ms']:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+from typing import List, Tuple, Optional
+import logging
+import math
+import random
+import time
+
+from BotClass import QLearningBot, Move, RED_PIECE_COLOR, WHITE_PIECE_COLOR
+
+logger = logging.getLogger(__name__)
+
+# Компактная доска: bytearray из 64 клеток
+EMPTY = 0
+WHITE_MAN = 1
+WHITE_KING = 2
+RED_MAN = 3
+RED_KING = 4
+
+WHITE = 0
+RED = 1
+
+# Направления: 0,1 - вверх (вперёд для белых), 2,3 - вниз (вперёд для красных)
+DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+MAN_DIRECTIONS = ((0, 1), (2, 3))  # индекс - сторона
+
+# RAYS[клетка][направление] - клетки вдоль диагонали до края доски
+RAYS = []
+for _square in range(64):
+    _row, _col = divmod(_square, 8)
+    _rays = []
+    for _dr, _dc in DIRECTIONS:
+        _ray = []
+        _r, _c = _row + _dr, _col + _dc
+        while 0 <= _r < 8 and 0 <= _c < 8:
+            _ray.append(_r * 8 + _c)
+            _r += _dr
+            _c += _dc
+        _rays.append(tuple(_ray))
+    RAYS.append(tuple(_rays))
+
+OWNER = (None, WHITE, WHITE, RED, RED)
+IS_KING = (False, False, True, False, True)
+
+MCTS_EXPLORATION = 1.4
+MCTS_MOVE_TIME = 1.0       # секунд на ход, если бюджет не задан
+MCTS_PLAYOUT_PLIES = 120   # длиннее - считаем ничьей
+MCTS_BATCH = 8             # симуляций из одного листа за проход по дереву
+
+
+def encode_board(board) -> bytearray:
+    """Переводит доску из get_board_state() в компактное представление"""
+    compact = bytearray(64)
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece:
+                if piece["color"] == WHITE_PIECE_COLOR:
+                    code = WHITE_KING if piece["is_king"] else WHITE_MAN
+                else:
+                    code = RED_KING if piece["is_king"] else RED_MAN
+                compact[row * 8 + col] = code
+    return compact
+
+
+# Ход - int: откуда | куда << 6 | снятые фигуры (клетка + 1) по 7 бит начиная с бита 12.
+# Цепочка взятий шашки хранит все снятые фигуры: промежуточные клетки восстанавливаются по ним
+CAPTURE_SHIFT = 12
+CAPTURE_BITS = 7
+CAPTURE_MASK = (1 << CAPTURE_BITS) - 1
+
+
+def encode_move(start: int, end: int, captured: int = -1) -> int:
+    return start | (end << 6) | ((captured + 1) << CAPTURE_SHIFT)
+
+
+def captured_squares(move: int) -> List[int]:
+    squares = []
+    captures = move >> CAPTURE_SHIFT
+    while captures:
+        squares.append((captures & CAPTURE_MASK) - 1)
+        captures >>= CAPTURE_BITS
+    return squares
+
+
+def decode_move(move: int) -> Move:
+    """Ход в формате QLearningBot: (откуда, куда) или (откуда, ..., куда) для цепочки"""
+    start, end = move & 63, (move >> 6) & 63
+    captured = captured_squares(move)
+    if len(captured) < 2:
+        return divmod(start, 8), divmod(end, 8)
+    # Шашка прыгает через соседнюю клетку: следующая клетка пути симметрична предыдущей
+    path = [start]
+    for square in captured:
+        path.append(2 * square - path[-1])
+    return tuple(divmod(square, 8) for square in path)
+
+
+# Фигуры стоят только на тёмных клетках
+DARK_SQUARES = tuple(sq for sq in range(64) if (sq // 8 + sq % 8) % 2 == 1)
+
+# Для простой шашки стороны side на клетке: MAN_STEPS - клетки тихого хода,
+# MAN_JUMPS - пары (через какую клетку, куда) для взятия
+MAN_STEPS = tuple(tuple(tuple(RAYS[sq][d][0] for d in MAN_DIRECTIONS[side] if RAYS[sq][d])
+                        for sq in range(64)) for side in (WHITE, RED))
+MAN_JUMPS = tuple(tuple(tuple((RAYS[sq][d][0], RAYS[sq][d][1]) for d in MAN_DIRECTIONS[side]
+                              if len(RAYS[sq][d]) > 1)
+                        for sq in range(64)) for side in (WHITE, RED))
+
+
+def generate_moves(board: bytearray, side: int, out: List[int], quiet: Optional[List[int]] = None,
+                   _owner=OWNER, _is_king=IS_KING, _rays=RAYS) -> None:
+    """Заполняет out ходами стороны side (взятия обязательны, взятие - по снятой фигуре).
+    quiet - рабочий список вызывающего для тихих ходов, чтобы не создавать его на каждый вызов"""
+    out.clear()
+    if quiet is None:
+        quiet = []
+    else:
+        quiet.clear()
+    man_steps = MAN_STEPS[side]
+    man_jumps = MAN_JUMPS[side]
+    for square in DARK_SQUARES:
+        piece = board[square]
+        if not piece or _owner[piece] != side:
+            continue
+        if _is_king[piece]:
+            for ray in _rays[square]:
+                for i, target in enumerate(ray):
+                    occupant = board[target]
+                    if not occupant:
+                        quiet.append(square | (target << 6))
+                        continue
+                    # Дамка бьёт первую встреченную фигуру соперника и встаёт сразу за ней
+                    if _owner[occupant] != side and i + 1 < len(ray) and not board[ray[i + 1]]:
+                        out.append(square | (ray[i + 1] << 6) | ((target + 1) << CAPTURE_SHIFT))
+                    break
+        else:
+            if not out:
+                for target in man_steps[square]:
+                    if not board[target]:
+                        quiet.append(square | (target << 6))
+            for over, land in man_jumps[square]:
+                occupant = board[over]
+                if occupant and _owner[occupant] != side and not board[land]:
+                    # Есть хотя бы одно взятие - собираем полные цепочки
+                    _add_man_chains(board, square, square, side, 0, CAPTURE_SHIFT, out)
+                    break
+    if not out:
+        out.extend(quiet)
+
+
+def _add_man_chains(board: bytearray, start: int, square: int, side: int, captured: int, shift: int,
+                    out: List[int], _owner=OWNER) -> None:
+    """Дописывает в out полные цепочки взятий шашки из start, дошедшей до square.
+    Шашка бьёт только вперёд, поэтому снятые фигуры не повторяются; превращение обрывает цепочку"""
+    if shift > CAPTURE_SHIFT and (square < 8 or square >= 56):
+        out.append(start | (square << 6) | captured)
+        return
+    extended = False
+    for over, land in MAN_JUMPS[side][square]:
+        occupant = board[over]
+        if occupant and _owner[occupant] != side and not board[land]:
+            _add_man_chains(board, start, land, side, captured | ((over + 1) << shift),
+                            shift + CAPTURE_BITS, out)
+            extended = True
+    if not extended and shift > CAPTURE_SHIFT:
+        out.append(start | (square << 6) | captured)
+
+
+def apply_move(board: bytearray, move: int) -> None:
+    """Выполняет ход на доске на месте"""
+    start, end, captures = move & 63, (move >> 6) & 63, move >> CAPTURE_SHIFT
+    piece = board[start]
+    board[start] = EMPTY
+    while captures:
+        board[(captures & CAPTURE_MASK) - 1] = EMPTY
+        captures >>= CAPTURE_BITS
+    if piece == WHITE_MAN and end < 8:
+        piece = WHITE_KING
+    elif piece == RED_MAN and end >= 56:
+        piece = RED_KING
+    board[end] = piece
+
+
+def playout(board: bytearray, side: int, moves: List[int], rng=random.random,
+            policy: str = "random", max_plies: int = MCTS_PLAYOUT_PLIES,
+            quiet: Optional[List[int]] = None) -> Optional[int]:
+    """Доигрывает партию на board (доска портится). Возвращает победившую сторону или None.
+    moves и quiet - рабочие списки вызывающего"""
+    if quiet is None:
+        quiet = []
+    for _ in range(max_plies):
+        generate_moves(board, side, moves, quiet)
+        if not moves:
+            return side ^ 1
+        move = moves[int(rng() * len(moves))]
+        if policy == "capture_first":
+            # Взятия и так обязательны - из тихих ходов предпочитаем превращение в дамку
+            for candidate in moves:
+                end = (candidate >> 6) & 63
+                piece = board[candidate & 63]
+                if (piece == WHITE_MAN and end < 8) or (piece == RED_MAN and end >= 56):
+                    move = candidate
+                    break
+        apply_move(board, move)
+        side ^= 1
+    return None
+
+
+class MCTSNode:
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins", "side")
+
+    def __init__(self, move: Optional[int], parent: Optional["MCTSNode"], side: int, untried: List[int]):
+        self.move = move        # ход, приведший в узел
+        self.parent = parent
+        self.children = []
+        self.untried = untried  # ещё не раскрытые ходы
+        self.visits = 0
+        self.wins = 0.0         # с точки зрения стороны, сделавшей self.move
+        self.side = side        # чей ход в узле
+
+    def select_child(self, exploration: float) -> "MCTSNode":
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda c: c.wins / c.visits + exploration * math.sqrt(log_visits / c.visits))
+
+
+class MCTSBot(QLearningBot):
+    """Бот на поиске Монте-Карло по дереву (UCT) с быстрыми случайными доигровками"""
+    def __init__(self, *args, move_time: float = MCTS_MOVE_TIME, exploration: float = MCTS_EXPLORATION,
+                 policy: str = "random", batch: int = MCTS_BATCH, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.move_time = move_time
+        self.exploration = exploration
+        self.policy = policy
+        self.batch = batch
+        self.simulations = 0
+        # Дерево сохраняется между ходами
+        self._root = None
+        self._root_board = None
+
+    def get_move(self, time_limit: Optional[float] = None) -> Optional[Move]:
+        """Выбирает ход поиском MCTS в пределах бюджета времени"""
+        if not self.game or (hasattr(self.game, 'game_ended') and self.game.game_ended):
+            return None
+
+        board = self.game.get_board_state()
+        side = RED if self.color == "RED" else WHITE
+        move = self.search(encode_board(board), side, time_limit or self.move_time)
+        if move is None:
+            return None
+
+        chosen_move = decode_move(move)
+        self.last_state = self.get_state_hash(board)
+        self.last_action = self.get_action_hash(*chosen_move)
+        logger.debug("[MCTS Bot] %d simulations, %d root visits", self.simulations, self._root.visits)
+        return chosen_move
+
+    def search(self, board: bytearray, side: int, time_limit: float) -> Optional[int]:
+        """Запускает UCT из позиции board до истечения time_limit секунд"""
+        root = self._reuse_tree(board, side)
+        if root is None:
+            moves = []
+            generate_moves(board, side, moves)
+            root = MCTSNode(None, None, side, moves)
+        self._root = root
+        self._root_board = bytearray(board)
+
+        if not root.untried and not root.children:
+            return None
+        if len(root.untried) + len(root.children) == 1:
+            return (root.untried or [c.move for c in root.children])[0]
+
+        deadline = time.monotonic() + time_limit
+        # Рабочие буферы - свои у каждого поиска: поиски в разных потоках не мешают друг другу
+        scratch = bytearray(64)
+        moves = []
+        quiet = []
+        rng = random.random
+        exploration = self.exploration
+        self.simulations = 0
+
+        while time.monotonic() < deadline and not self.stop_search:
+            node = root
+            scratch[:] = board
+
+            # Выбор
+            while not node.untried and node.children:
+                node = node.select_child(exploration)
+                apply_move(scratch, node.move)
+
+            # Раскрытие
+            if node.untried:
+                move = node.untried.pop(int(rng() * len(node.untried)))
+                apply_move(scratch, move)
+                child_moves = []
+                generate_moves(scratch, node.side ^ 1, child_moves, quiet)
+                child = MCTSNode(move, node, node.side ^ 1, child_moves)
+                node.children.append(child)
+                node = child
+
+            # Пачка доигровок из одного листа
+            leaf = bytes(scratch)
+            wins = {WHITE: 0.0, RED: 0.0}
+            for _ in range(self.batch):
+                scratch[:] = leaf
+                winner = playout(scratch, node.side, moves, rng, self.policy, quiet=quiet)
+                if winner is None:
+                    wins[WHITE] += 0.5
+                    wins[RED] += 0.5
+                else:
+                    wins[winner] += 1.0
+            self.simulations += self.batch
+
+            # Обратное распространение
+            while node is not None:
+                node.visits += self.batch
+                node.wins += wins[node.side ^ 1]
+                node = node.parent
+
+        if not root.children:
+            # Остановлен до первой симуляции
+            return root.untried[0]
+        best = max(root.children, key=lambda c: c.visits)
+        return best.move
+
+    def _reuse_tree(self, board: bytearray, side: int) -> Optional[MCTSNode]:
+        """Ищет текущую позицию среди внуков прошлого корня (наш ход + ответ соперника)"""
+        if self._root is None or self._root.side != side:
+            return None
+        if self._root_board == board:
+            return self._root
+        scratch = bytearray(64)
+        for child in self._root.children:
+            for grandchild in child.children:
+                scratch[:] = self._root_board
+                apply_move(scratch, child.move)
+                apply_move(scratch, grandchild.move)
+                if scratch == board:
+                    grandchild.parent = None
+                    return grandchild
+        return None
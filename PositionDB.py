@@ -0,0 +1,150 @@
+from typing import List, Tuple, Optional, Dict, Iterable
+import sqlite3
+import threading
+
+POSITION_DB_FILE = "positions.db"
+POSITION_DB_BATCH = 50  # партий в одной транзакции
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    state_hash   TEXT    NOT NULL,
+    side         TEXT    NOT NULL,
+    red_pieces   INTEGER NOT NULL,
+    white_pieces INTEGER NOT NULL,
+    red_kings    INTEGER NOT NULL,
+    white_kings  INTEGER NOT NULL,
+    visits       INTEGER NOT NULL DEFAULT 0,
+    red_wins     INTEGER NOT NULL DEFAULT 0,
+    white_wins   INTEGER NOT NULL DEFAULT 0,
+    draws        INTEGER NOT NULL DEFAULT 0,
+    best_move    TEXT,
+    PRIMARY KEY (state_hash, side)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_positions_counts
+    ON positions (red_pieces, white_pieces, red_kings, white_kings, side);
+CREATE INDEX IF NOT EXISTS idx_positions_kings
+    ON positions (red_kings, white_kings);
+"""
+
+UPSERT = """
+INSERT INTO positions (state_hash, side, red_pieces, white_pieces, red_kings, white_kings,
+                       visits, red_wins, white_wins, draws, best_move)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (state_hash, side) DO UPDATE SET
+    visits = visits + excluded.visits,
+    red_wins = red_wins + excluded.red_wins,
+    white_wins = white_wins + excluded.white_wins,
+    draws = draws + excluded.draws,
+    best_move = COALESCE(excluded.best_move, best_move)
+"""
+
+
+def piece_counts(state_hash: str) -> Tuple[int, int, int, int]:
+    """(красные фигуры, белые фигуры, красные дамки, белые дамки) по hash состояния"""
+    red_kings = state_hash.count('RK')
+    white_kings = state_hash.count('WK')
+    return (state_hash.count('RP') + red_kings, state_hash.count('WP') + white_kings,
+            red_kings, white_kings)
+
+
+class PositionDB:
+    """Индексированная база позиций из партий: посещения, исходы, лучший известный ход"""
+    def __init__(self, path: str = POSITION_DB_FILE, batch_games: int = POSITION_DB_BATCH):
+        self.path = path
+        self.batch_games = batch_games
+        self._conn = None
+        self._lock = threading.Lock()
+        # Накопленные, но ещё не записанные строки: (hash, сторона) -> [посещения, R, W, ничьи, ход]
+        self._pending: Dict[Tuple[str, str], list] = {}
+        self._pending_games = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Записи может выполнять фоновый поток BackgroundWriter
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def record_game(self, positions: Iterable[Tuple[str, str, Optional[str]]], winner: Optional[str]) -> None:
+        """Добавляет позиции партии: (hash состояния, чей ход, лучший известный ход или None).
+        winner - "RED", "WHITE" или None (ничья). Пишется пачками по batch_games партий"""
+        outcome = {"RED": 1, "WHITE": 2}.get(winner, 3)
+        with self._lock:
+            for state_hash, side, best_move in positions:
+                row = self._pending.get((state_hash, side))
+                if row is None:
+                    row = self._pending[(state_hash, side)] = [0, 0, 0, 0, None]
+                row[0] += 1
+                row[outcome] += 1
+                if best_move is not None:
+                    row[4] = best_move
+            self._pending_games += 1
+            if self._pending_games >= self.batch_games:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        rows = []
+        for (state_hash, side), (visits, red_wins, white_wins, draws, best_move) in self._pending.items():
+            rows.append((state_hash, side, *piece_counts(state_hash),
+                         visits, red_wins, white_wins, draws, best_move))
+        conn = self._connect()
+        with conn:  # одна транзакция на всю пачку
+            conn.executemany(UPSERT, rows)
+        self._pending.clear()
+        self._pending_games = 0
+
+    def find(self, red_pieces: Optional[int] = None, white_pieces: Optional[int] = None,
+             side: Optional[str] = None, with_kings: Optional[bool] = None,
+             max_pieces: Optional[int] = None, random_order: bool = False,
+             limit: int = 1000) -> List[sqlite3.Row]:
+        """Позиции по числу фигур, наличию дамок и стороне, например find(3, 2, with_kings=True)"""
+        self.flush()
+        conditions, params = [], []
+        if red_pieces is not None:
+            conditions.append("red_pieces = ?")
+            params.append(red_pieces)
+        if white_pieces is not None:
+            conditions.append("white_pieces = ?")
+            params.append(white_pieces)
+        if side is not None:
+            conditions.append("side = ?")
+            params.append(side)
+        if with_kings is True:
+            conditions.append("(red_kings > 0 OR white_kings > 0)")
+        elif with_kings is False:
+            conditions.append("red_kings = 0 AND white_kings = 0")
+        if max_pieces is not None:
+            conditions.append("red_pieces + white_pieces <= ?")
+            params.append(max_pieces)
+
+        query = "SELECT * FROM positions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if random_order:
+            query += " ORDER BY RANDOM()"
+        query += " LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            return self._connect().execute(query, params).fetchall()
+
+    def sample_corpus(self, max_pieces: int, limit: int = 10000) -> List[Dict[str, str]]:
+        """Стартовые позиции для самообучения в формате корпуса {"state", "turn"}"""
+        rows = self.find(max_pieces=max_pieces, random_order=True, limit=limit)
+        return [{"state": row["state_hash"], "turn": row["side"]} for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
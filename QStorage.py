@@ -0,0 +1,490 @@
+from typing import Any, Dict, Iterator, List, Mapping, MutableMapping, Optional, Tuple
+from array import array
+import gc
+import json
+import struct
+import threading
+import tracemalloc
+import numpy as np
+
+# Режимы хранения Q-таблицы: "dict" - обычные словари {код хода: float} (быстрее всего),
+# "float16"/"int16" - компактные квантованные строки для экономии памяти
+STORAGE_MODES = ("dict", "float16", "int16")
+INT16_SCALE = 256.0  # int16 с шагом 1/256: диапазон примерно ±128
+
+# Код хода: клетка отправления (32 тёмные клетки) x направление (4) x дальность (1..7)
+DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+MAX_DISTANCE = 7
+ACTION_SLOTS = 32 * len(DIRECTIONS) * MAX_DISTANCE
+
+# Цепочка взятий простой шашки (2..MAX_CHAIN_HOPS прыжков через клетку) - составной
+# ход: клетка отправления x направления прыжков, коды после ACTION_SLOTS
+MAX_CHAIN_HOPS = 3
+CHAIN_OFFSETS = {}  # число прыжков -> смещение внутри блока клетки
+_offset = 0
+for _hops in range(2, MAX_CHAIN_HOPS + 1):
+    CHAIN_OFFSETS[_hops] = _offset
+    _offset += len(DIRECTIONS) ** _hops
+CHAIN_SLOTS = _offset
+ACTION_COUNT = ACTION_SLOTS + 32 * CHAIN_SLOTS
+
+Position = Tuple[int, int]
+
+
+def _square(position: Position) -> int:
+    return position[0] * 4 + position[1] // 2
+
+
+def _position(square: int) -> Position:
+    row = square // 4
+    return row, square % 4 * 2 + (row + 1) % 2
+
+
+def _direction(start: Position, end: Position) -> int:
+    return (end[0] > start[0]) * 2 + (end[1] > start[1])
+
+
+def action_code(start: Position, *path: Position) -> int:
+    """Код хода start -> end по диагонали или цепочки взятий start -> ... -> end"""
+    if len(path) == 1:
+        end = path[0]
+        distance = abs(end[0] - start[0])
+        return (_square(start) * 4 + _direction(start, end)) * MAX_DISTANCE + distance - 1
+    if len(path) not in CHAIN_OFFSETS:
+        raise ValueError(f"Цепочка из {len(path)} прыжков не кодируется")
+    index = 0
+    for hop_start, hop_end in zip((start,) + path, path):
+        if abs(hop_end[0] - hop_start[0]) != 2:
+            raise ValueError("В составном ходе допускаются только прыжки через клетку")
+        index = index * len(DIRECTIONS) + _direction(hop_start, hop_end)
+    return ACTION_SLOTS + _square(start) * CHAIN_SLOTS + CHAIN_OFFSETS[len(path)] + index
+
+
+def action_move(code: int) -> Tuple[Position, ...]:
+    """Ход по коду: (начало, конец) или (начало, ..., конец) для цепочки взятий"""
+    if code < ACTION_SLOTS:
+        rest, distance = divmod(code, MAX_DISTANCE)
+        square, direction = divmod(rest, 4)
+        row, col = _position(square)
+        dr, dc = DIRECTIONS[direction]
+        distance += 1
+        return (row, col), (row + dr * distance, col + dc * distance)
+    square, offset = divmod(code - ACTION_SLOTS, CHAIN_SLOTS)
+    hops = max(h for h, start in CHAIN_OFFSETS.items() if start <= offset)
+    index = offset - CHAIN_OFFSETS[hops]
+    directions = []
+    for _ in range(hops):
+        index, direction = divmod(index, len(DIRECTIONS))
+        directions.append(DIRECTIONS[direction])
+    path = [_position(square)]
+    for dr, dc in reversed(directions):
+        row, col = path[-1]
+        path.append((row + 2 * dr, col + 2 * dc))
+    return tuple(path)
+
+
+# Текстовые имена ходов ("r,c->r,c", цепочка - "r,c->r,c->r,c") - формат файлов q_table.json
+ACTION_NAMES = ["->".join(f"{r},{c}" for r, c in action_move(code)) for code in range(ACTION_COUNT)]
+ACTION_CODES = {name: code for code, name in enumerate(ACTION_NAMES)}
+
+
+# Упакованное состояние: 32 тёмные клетки по 4 бита (ключ снимков и журналов траекторий)
+PIECE_TOKENS = ('0', 'WP', 'WK', 'RP', 'RK')
+PIECE_CODES = {token: code for code, token in enumerate(PIECE_TOKENS)}
+DARK_SQUARES = tuple(sq for sq in range(64) if (sq // 8 + sq % 8) % 2 == 1)
+
+
+def pack_state(state_hash: str) -> bytes:
+    """hash состояния -> 16 байт (по полбайта на тёмную клетку)"""
+    codes = []
+    i = 0
+    while i < len(state_hash):
+        if state_hash[i] == '0':
+            codes.append(0)
+            i += 1
+        else:
+            codes.append(PIECE_CODES[state_hash[i:i + 2]])
+            i += 2
+    dark = [codes[sq] for sq in DARK_SQUARES]
+    return bytes(dark[k] << 4 | dark[k + 1] for k in range(0, 32, 2))
+
+
+def unpack_state(packed: bytes) -> str:
+    """16 байт -> hash состояния в формате get_state_hash()"""
+    squares = ['0'] * 64
+    for k, byte in enumerate(packed):
+        squares[DARK_SQUARES[2 * k]] = PIECE_TOKENS[byte >> 4]
+        squares[DARK_SQUARES[2 * k + 1]] = PIECE_TOKENS[byte & 15]
+    return ''.join(squares)
+
+
+def encode_actions(actions: Mapping[str, float]) -> Dict[int, float]:
+    """{имя хода: значение} из файла -> {код хода: значение}"""
+    return {ACTION_CODES[name]: value for name, value in actions.items()}
+
+
+def decode_actions(actions: Mapping[int, float]) -> Dict[str, float]:
+    """{код хода: значение} -> {имя хода: значение} для записи в файл"""
+    return {ACTION_NAMES[code]: value for code, value in actions.items()}
+
+
+class QCodec:
+    """Перевод Q-значений в хранимый тип и обратно: массивами numpy (снимки SharedQTable)
+    и поштучно для array.array (CompactQTable; float16 лежит там битами в 'H')"""
+    def __init__(self, dtype, scale: float = 1.0, typecode: str = 'd'):
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.typecode = typecode
+        if np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            self._limits = (info.min, info.max)
+        else:
+            self._limits = None
+
+    def encode(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64) * self.scale
+        if self._limits:
+            values = np.clip(np.rint(values), *self._limits)
+        return values.astype(self.dtype)
+
+    def decode(self, stored) -> float:
+        return float(stored) / self.scale
+
+    def store(self, value: float):
+        """Одно значение -> элемент array.array с кодом typecode"""
+        if self._limits:
+            return min(max(round(value * self.scale), self._limits[0]), self._limits[1])
+        if self.typecode == 'H':
+            return _HALF_BITS.unpack(_HALF.pack(min(max(value, -FLOAT16_MAX), FLOAT16_MAX)))[0]
+        return float(value)
+
+    def load(self, stored) -> float:
+        """Элемент array.array -> Q-значение"""
+        if self.typecode == 'H':
+            return _HALF.unpack(_HALF_BITS.pack(stored))[0]
+        return stored / self.scale
+
+    def load_many(self, stored: array) -> List[float]:
+        """Элементы array.array -> список Q-значений"""
+        if self.typecode == 'H':
+            return list(struct.unpack(f"<{len(stored)}e", stored.tobytes()))
+        scale = self.scale
+        return [value / scale for value in stored]
+
+
+FLOAT16_MAX = 65504.0
+_HALF = struct.Struct("<e")
+_HALF_BITS = struct.Struct("<H")
+
+CODECS: Dict[str, QCodec] = {
+    "float64": QCodec(np.float64),
+    "float16": QCodec(np.float16, typecode='H'),
+    "int16": QCodec(np.int16, INT16_SCALE, typecode='h'),
+}
+
+
+def lookup_values(keys: np.ndarray, stored: np.ndarray, codec: QCodec, codes, default: float = 0.0) -> np.ndarray:
+    """Q для массива кодов по строке (коды keys, значения stored); кодов нет в строке - default"""
+    if not len(keys):
+        return np.full(len(codes), default)
+    match = keys[None, :] == np.asarray(codes, dtype=np.uint16)[:, None]
+    values = stored[match.argmax(axis=1)].astype(np.float64) / codec.scale
+    return np.where(match.any(axis=1), values, default)
+
+
+class CompactRow(MutableMapping):
+    """Строка CompactQTable {код хода: Q}: номер строки в общих массивах таблицы, своих данных нет"""
+    __slots__ = ("_table", "_id")
+
+    def __init__(self, table: "CompactQTable", row_id: int):
+        self._table = table
+        self._id = row_id
+
+    def __getitem__(self, code: int) -> float:
+        codes, stored = self._table._span(self._id)
+        try:
+            i = codes.index(code)
+        except ValueError:
+            raise KeyError(code) from None
+        return self._table.codec.load(stored[i])
+
+    def get(self, code: int, default=None):
+        try:
+            return self[code]
+        except KeyError:
+            return default
+
+    def __setitem__(self, code: int, value: float) -> None:
+        self._table._store(self._id, code, value)
+
+    def __delitem__(self, code: int) -> None:
+        self._table._remove(self._id, code)
+
+    def __contains__(self, code) -> bool:
+        return code in self._table._span(self._id)[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._table._span(self._id)[0].tolist())
+
+    def __len__(self) -> int:
+        return len(self._table._span(self._id)[0])
+
+    def items(self):
+        # Снимок пар под замком таблицы: безопасен для фоновой записи
+        codes, stored = self._table._span(self._id)
+        return list(zip(codes.tolist(), self._table.codec.load_many(stored)))
+
+    def values(self):
+        return self._table.codec.load_many(self._table._span(self._id)[1])
+
+    def max_value(self) -> float:
+        """Максимальное Q в строке (строка не пуста)"""
+        return self._table._best(self._id)[1]
+
+    def best_code(self) -> int:
+        """Код хода с максимальным Q (строка не пуста, при равенстве - первый)"""
+        return self._table._best(self._id)[0]
+
+    def lookup(self, codes: np.ndarray, default: float = 0.0) -> np.ndarray:
+        """Q для массива кодов одной операцией numpy; кодов нет в строке - default"""
+        keys, stored = self._table._span(self._id)
+        if not keys:
+            return np.full(len(codes), default)
+        codec = self._table.codec
+        return lookup_values(np.frombuffer(keys, dtype=np.uint16), np.frombuffer(stored, dtype=codec.dtype),
+                             codec, codes, default)
+
+
+class CompactQTable(MutableMapping):
+    """Q-таблица {hash состояния: CompactRow} в двух общих массивах на таблицу: коды ходов
+    в array('H') и значения (int16 или биты float16), как в снимках SharedQTable. У строки -
+    начало, длина и ёмкость своего участка. Строка, переросшая участок, переезжает в конец
+    массивов; когда брошенных участков больше половины, массивы уплотняются. Индекс
+    максимума строки запоминается и сбрасывается, только когда максимум уменьшили или
+    удалили: max_value и best_code обычно не проходят по строке.
+
+    Пишет один поток; чтение строк (в том числе items() фоновой записи) идёт под замком и
+    не видит строку посреди переезда"""
+    def __init__(self, storage: str, rows: Optional[Mapping] = None):
+        self.storage = storage
+        self.codec = CODECS[storage]
+        self._lock = threading.Lock()
+        self.clear()
+        if rows:
+            self.update(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows: Dict[str, int] = {}  # hash состояния -> номер строки
+            self._codes = array('H')
+            self._values = array(self.codec.typecode)
+            self._start = array('I')
+            self._length = array('H')
+            self._capacity = array('H')
+            self._best_index = array('h')  # индекс максимума в строке, -1 - пересчитать
+            self._garbage = 0  # элементов в брошенных участках
+
+    def _span(self, row_id: int) -> Tuple[array, array]:
+        """Копии кодов и значений строки"""
+        with self._lock:
+            start = self._start[row_id]
+            end = start + self._length[row_id]
+            return self._codes[start:end], self._values[start:end]
+
+    def _allocate(self, row_id: int, codes: array, stored: array, capacity: int, best: int = -1) -> None:
+        """Размещает строку в новом участке в конце массивов (best - индекс максимума или -1)"""
+        if (self._garbage + self._capacity[row_id]) * 2 > len(self._codes):
+            self._compact()
+        self._garbage += self._capacity[row_id]
+        start = len(self._codes)
+        spare = capacity - len(codes)
+        self._codes.extend(codes)
+        self._codes.frombytes(bytes(2 * spare))
+        self._values.extend(stored)
+        self._values.frombytes(bytes(self._values.itemsize * spare))
+        with self._lock:
+            self._start[row_id] = start
+            self._length[row_id] = len(codes)
+            self._capacity[row_id] = capacity
+            self._best_index[row_id] = best
+
+    def _compact(self) -> None:
+        """Переписывает живые строки подряд, без запаса ёмкости"""
+        codes, values = array('H'), array(self.codec.typecode)
+        with self._lock:
+            for row_id in self._rows.values():
+                start, length = self._start[row_id], self._length[row_id]
+                self._start[row_id] = len(codes)
+                self._capacity[row_id] = length
+                codes.extend(self._codes[start:start + length])
+                values.extend(self._values[start:start + length])
+            self._codes, self._values = codes, values
+            self._garbage = 0
+
+    def _best(self, row_id: int) -> Tuple[int, float]:
+        """Код и Q лучшего хода непустой строки (при равенстве - первый)"""
+        with self._lock:
+            start, best = self._start[row_id], self._best_index[row_id]
+            if best < 0:
+                values = self.codec.load_many(self._values[start:start + self._length[row_id]])
+                best = self._best_index[row_id] = values.index(max(values))
+            return self._codes[start + best], self.codec.load(self._values[start + best])
+
+    def _store(self, row_id: int, code: int, value: float) -> None:
+        stored = self.codec.store(value)
+        start, length = self._start[row_id], self._length[row_id]
+        try:
+            i = self._codes[start:start + length].index(code)
+        except ValueError:
+            i = length
+            if length == self._capacity[row_id]:
+                self._allocate(row_id, self._codes[start:start + length], self._values[start:start + length],
+                               max(2, 2 * length), self._best_index[row_id])
+                start = self._start[row_id]
+        with self._lock:
+            best = self._best_index[row_id]
+            if best >= 0:
+                new, top = self.codec.load(stored), self.codec.load(self._values[start + best])
+                if i == best:
+                    if new < top:
+                        self._best_index[row_id] = -1  # максимум уменьшился - пересчитаем при запросе
+                elif new > top or (new == top and i < best):
+                    self._best_index[row_id] = i
+            self._values[start + i] = stored
+            if i == length:
+                self._codes[start + i] = code
+                self._length[row_id] = length + 1
+
+    def _remove(self, row_id: int, code: int) -> None:
+        with self._lock:
+            start, length = self._start[row_id], self._length[row_id]
+            try:
+                i = start + self._codes[start:start + length].index(code)
+            except ValueError:
+                raise KeyError(code) from None
+            last = start + length - 1
+            self._codes[i], self._values[i] = self._codes[last], self._values[last]
+            self._length[row_id] = length - 1
+            self._best_index[row_id] = -1
+
+    def __getitem__(self, state_hash: str) -> CompactRow:
+        return CompactRow(self, self._rows[state_hash])
+
+    def get(self, state_hash, default=None):
+        row_id = self._rows.get(state_hash)
+        return default if row_id is None else CompactRow(self, row_id)
+
+    def __setitem__(self, state_hash: str, row) -> None:
+        pairs = list(row.items())
+        row_id = self._rows.get(state_hash)
+        if row_id is None:
+            row_id = len(self._start)
+            self._start.append(0)
+            self._length.append(0)
+            self._capacity.append(0)
+            self._best_index.append(-1)
+        store = self.codec.store
+        self._allocate(row_id, array('H', [code for code, _ in pairs]),
+                       array(self.codec.typecode, [store(value) for _, value in pairs]), len(pairs))
+        self._rows[state_hash] = row_id
+
+    def __delitem__(self, state_hash: str) -> None:
+        row_id = self._rows.pop(state_hash)
+        with self._lock:
+            self._garbage += self._capacity[row_id]
+            self._length[row_id] = self._capacity[row_id] = 0
+
+    def __contains__(self, state_hash) -> bool:
+        return state_hash in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def items(self):
+        return [(state_hash, CompactRow(self, row_id)) for state_hash, row_id in list(self._rows.items())]
+
+
+def make_q_table(storage: str = "dict"):
+    """Пустая Q-таблица в выбранном режиме хранения"""
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Неизвестный режим хранения: {storage}")
+    return {} if storage == "dict" else CompactQTable(storage)
+
+
+# Строка Q-таблицы - обычный dict или компактная строка (CompactRow, строки снимков
+# SharedQTable); функции ниже работают с любой. Для dict - простой проход по 5-10 значениям,
+# он быстрее вызовов numpy на таких размерах
+
+def row_max(row) -> float:
+    """Максимальное Q в непустой строке"""
+    return max(row.values()) if type(row) is dict else row.max_value()
+
+
+def row_best(row) -> int:
+    """Код хода с максимальным Q в непустой строке (при равенстве - первый)"""
+    return max(row, key=row.__getitem__) if type(row) is dict else row.best_code()
+
+
+def row_lookup(row, codes: np.ndarray, default: float = 0.0) -> np.ndarray:
+    """Q для массива кодов; кодов нет в строке - default"""
+    if type(row) is dict:
+        get = row.get
+        return np.fromiter((get(code, default) for code in codes.tolist()), dtype=np.float64, count=len(codes))
+    return row.lookup(codes, default)
+
+
+def traced_allocation(build) -> Tuple[Any, int]:
+    """(результат build(), байт памяти, которые он удерживает) по tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def load_q_table_text(text: str, storage: str = "dict"):
+    """Q-таблица из JSON в формате файла в режиме хранения storage"""
+    table = make_q_table(storage)
+    for state_hash, actions in json.loads(text).items():
+        table[state_hash] = encode_actions(actions)
+    return table
+
+
+def quantization_report(q_table: Mapping, storage: str) -> Dict[str, float]:
+    """Насколько меняется игра при хранении q_table (формат файла) в режиме storage
+    вместо float64: доля состояний, где жадный ход совпадает, и ошибка значений"""
+    # Память меряется на таблицах, загруженных из одного и того же JSON
+    text = json.dumps(q_table)
+    full, bytes_full = traced_allocation(lambda: load_q_table_text(text))
+    compact, bytes_compact = traced_allocation(lambda: load_q_table_text(text, storage))
+    states = agree = entries = 0
+    max_error = total_error = 0.0
+    for state_hash, row in full.items():
+        if not row:
+            continue
+        compact_row = compact[state_hash]
+        states += 1
+        best = max(row.values())
+        best_actions = {code for code, value in row.items() if value == best}
+        # Совпадение, если квантованная таблица выбирает один из лучших ходов
+        agree += compact_row.best_code() in best_actions
+        for code, value in row.items():
+            error = abs(compact_row[code] - value)
+            max_error = max(max_error, error)
+            total_error += error
+            entries += 1
+    return {
+        "states": states,
+        "greedy_agreement": agree / states if states else 1.0,
+        "max_abs_error": max_error,
+        "mean_abs_error": total_error / entries if entries else 0.0,
+        "bytes_full": bytes_full,
+        "bytes_compact": bytes_compact,
+    }
@@ -0,0 +1,423 @@
+"""Офлайн-инструменты для файлов Q-таблиц (q_table.json и q_table.visits.json).
+
+    python QTableTools.py merge merged.json a/q_table.json b/q_table.json --strategy weighted
+    python QTableTools.py compact q_table.json --min-visits 2 --decimals 4
+    python QTableTools.py quantize-report q_table.json --storage int16
+    python QTableTools.py publish q_table.json q_table.qsnap --storage float16
+    python QTableTools.py merge q_table.json q_table.json q_table.delta-4242.json q_table.delta-4243.json
+    python QTableTools.py bench --states 20000 --updates 200000
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+from BotClass import QLearningBot, QTableModel, visits_path, compact_state
+from QStorage import (ACTION_CODES, ACTION_NAMES, STORAGE_MODES, encode_actions, quantization_report,
+                      traced_allocation, unpack_state)
+from SharedQTable import SNAPSHOT_STORAGE, publish_snapshot
+
+MERGE_STRATEGIES = ("weighted", "max_confidence", "latest")
+MERGE_RUN_SIZE = 100_000  # состояний в одном отсортированном куске в памяти
+
+
+class JsonObjectReader:
+    """Потоково читает JSON-объект верхнего уровня, отдавая пары (ключ, значение) по одной"""
+    def __init__(self, path: str, chunk_size: int = 1 << 16):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        with open(self.path, 'r') as f:
+            self._file = f
+            self._buf = ''
+            self._pos = 0
+            self._eof = False
+            self._skip_ws()
+            if self._peek() != '{':
+                raise ValueError(f"{self.path}: ожидался JSON-объект")
+            self._pos += 1
+            while True:
+                self._skip_ws()
+                ch = self._peek()
+                if ch == '}':
+                    return
+                if ch == ',':
+                    self._pos += 1
+                    continue
+                key = self._decode()
+                self._skip_ws()
+                if self._peek() != ':':
+                    raise ValueError(f"{self.path}: ожидалось ':' после ключа {key!r}")
+                self._pos += 1
+                self._skip_ws()
+                yield key, self._decode()
+
+    def _fill(self) -> None:
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+
+    def _peek(self) -> str:
+        if self._pos >= len(self._buf):
+            raise ValueError(f"{self.path}: неожиданный конец файла")
+        return self._buf[self._pos]
+
+    def _skip_ws(self) -> None:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf) or self._eof:
+                return
+            self._fill()
+
+    def _decode(self) -> Any:
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except ValueError:
+                if self._eof:
+                    raise
+            # Значение обрезано границей куска - дочитываем
+            self._fill()
+
+
+class JsonObjectWriter:
+    """Потоково пишет JSON-объект в формате save_q_table и атомарно заменяет файл в конце"""
+    def __init__(self, path: str, indent: Optional[int] = 2):
+        self.path = path
+        self.indent = indent
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self._tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=directory)
+        self._file = os.fdopen(fd, 'w')
+        self._file.write('{')
+        self._first = True
+
+    def write(self, key: str, value: Any) -> None:
+        prefix = '' if self._first else ','
+        self._first = False
+        if self.indent is None:
+            self._file.write(f"{prefix}{json.dumps(key)}: {json.dumps(value)}")
+        else:
+            pad = ' ' * self.indent
+            body = json.dumps(value, indent=self.indent).replace('\n', '\n' + pad)
+            self._file.write(f"{prefix}\n{pad}{json.dumps(key)}: {body}")
+
+    def close(self) -> None:
+        self._file.write('\n}' if self.indent is not None and not self._first else '}')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+def _write_sorted_runs(path: str, source: int, kind: str, run_size: int, tmp_dir: str) -> List[str]:
+    """Режет таблицу на отсортированные по ключу куски не больше run_size состояний"""
+    runs = []
+    reader = iter(JsonObjectReader(path))
+    while True:
+        chunk = sorted(itertools.islice(reader, run_size))
+        if not chunk:
+            return runs
+        fd, run_path = tempfile.mkstemp(prefix="run_", suffix=".jsonl", dir=tmp_dir)
+        with os.fdopen(fd, 'w') as f:
+            for key, value in chunk:
+                f.write(json.dumps([key, source, kind, value]) + '\n')
+        runs.append(run_path)
+
+
+def _read_run(run_path: str) -> Iterator[list]:
+    with open(run_path, 'r') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _merge_actions(q_values: Dict[int, Dict[str, float]], visits: Dict[int, Dict[str, int]],
+                   strategy: str) -> Tuple[Dict[str, float], Dict[str, int]]:
+    """Сливает строки одного состояния из нескольких таблиц (ключ словарей - номер таблицы)"""
+    actions = sorted(set(itertools.chain.from_iterable(q_values.values())))
+    merged_q, merged_n = {}, {}
+    for action in actions:
+        sources = [(source, row[action], visits.get(source, {}).get(action, 0))
+                   for source, row in sorted(q_values.items()) if action in row]
+        total_visits = sum(n for _, _, n in sources)
+
+        if strategy == "weighted":
+            if total_visits:
+                value = sum(q * n for _, q, n in sources) / total_visits
+            else:
+                value = sum(q for _, q, _ in sources) / len(sources)
+        elif strategy == "max_confidence":
+            # Больше всего обновлений; при равенстве - более поздняя таблица
+            value = max(sources, key=lambda s: (s[2], s[0]))[1]
+        else:  # latest
+            value = sources[-1][1]
+
+        merged_q[action] = value
+        if total_visits:
+            merged_n[action] = total_visits
+    return merged_q, merged_n
+
+
+def _iter_merged_states(inputs: List[str], run_size: int, work_dir: str
+                        ) -> Iterator[Tuple[str, Dict[int, dict], Dict[int, dict]]]:
+    """Отдаёт состояния всех таблиц по порядку ключей: (hash, {таблица: Q}, {таблица: N})"""
+    runs = []
+    for source, path in enumerate(inputs):
+        runs += _write_sorted_runs(path, source, "q", run_size, work_dir)
+        if os.path.exists(visits_path(path)):
+            runs += _write_sorted_runs(visits_path(path), source, "n", run_size, work_dir)
+
+    merged = heapq.merge(*(_read_run(run) for run in runs), key=lambda record: record[0])
+    for state_hash, records in itertools.groupby(merged, key=lambda record: record[0]):
+        q_values, visits = {}, {}
+        for _, source, kind, row in records:
+            (q_values if kind == "q" else visits)[source] = row
+        if q_values:
+            yield state_hash, q_values, visits
+
+
+def _rewrite_tables(inputs: List[str], output: str, transform, run_size: int,
+                    tmp_dir: Optional[str]) -> Dict[str, int]:
+    """Общий конвейер merge/compact: transform(q_values, visits) -> (Q, N) или None"""
+    stats = {"states": 0, "entries": 0}
+    with tempfile.TemporaryDirectory(dir=tmp_dir or os.path.dirname(os.path.abspath(output))) as work_dir:
+        states = _iter_merged_states(inputs, run_size, work_dir)
+        q_writer = JsonObjectWriter(output)
+        n_writer = JsonObjectWriter(visits_path(output), indent=None)
+        try:
+            for state_hash, q_values, visits in states:
+                result = transform(q_values, visits)
+                if not result:
+                    continue
+                merged_q, merged_n = result
+                q_writer.write(state_hash, merged_q)
+                if merged_n:
+                    n_writer.write(state_hash, merged_n)
+                stats["states"] += 1
+                stats["entries"] += len(merged_q)
+        except BaseException:
+            q_writer.abort()
+            n_writer.abort()
+            raise
+        q_writer.close()
+        n_writer.close()
+    return stats
+
+
+def merge_q_tables(inputs: List[str], output: str, strategy: str = "weighted",
+                   run_size: int = MERGE_RUN_SIZE, tmp_dir: Optional[str] = None) -> Dict[str, int]:
+    """Сливает Q-таблицы в одну, используя память только на run_size состояний.
+
+    Таблицы режутся на отсортированные куски во временных файлах и сливаются
+    heapq.merge по ключу состояния, поэтому объём таблиц может превышать память.
+    strategy: "weighted" - среднее, взвешенное по N(s,a); "max_confidence" - значение
+    из таблицы с наибольшим N(s,a); "latest" - значение из последней таблицы в списке.
+    """
+    if strategy not in MERGE_STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия: {strategy}")
+    return _rewrite_tables(inputs, output, lambda q, n: _merge_actions(q, n, strategy), run_size, tmp_dir)
+
+
+def compact_q_table_file(path: str, output: Optional[str] = None, min_visits: int = 0,
+                         drop_zeros: bool = True, decimals: Optional[int] = None,
+                         quantum: Optional[float] = None, run_size: int = MERGE_RUN_SIZE,
+                         tmp_dir: Optional[str] = None) -> Dict[str, int]:
+    """Потоково сжимает файл Q-таблицы (см. QTableModel.compact), возвращает отчёт о размерах"""
+    output = output or path
+    report = {"bytes_before": os.path.getsize(path), "states_before": 0, "entries_before": 0}
+
+    def transform(q_values, visits):
+        actions, counts = q_values[0], visits.get(0, {})
+        report["states_before"] += 1
+        report["entries_before"] += len(actions)
+        if min_visits and sum(counts.values()) < min_visits:
+            return None
+        compacted = compact_state(actions, counts, drop_zeros, decimals, quantum)
+        if not compacted:
+            return None
+        return compacted, {action: n for action, n in counts.items() if action in compacted}
+
+    stats = _rewrite_tables([path], output, transform, run_size, tmp_dir)
+    report["states_after"] = stats["states"]
+    report["entries_after"] = stats["entries"]
+    report["bytes_after"] = os.path.getsize(output)
+    return report
+
+
+class ReferenceQLearning:
+    """Исходное обновление Q-learning: словари с текстовыми именами ходов, без счётчиков
+    посещений. Эталон, с которым bench сравнивает режимы хранения"""
+    def __init__(self, q_table: dict, alpha: float = 0.1, gamma: float = 0.9):
+        self.q_table = q_table
+        self.alpha = alpha
+        self.gamma = gamma
+
+    @classmethod
+    def load(cls, text: str) -> "ReferenceQLearning":
+        q_table = {}
+        for state_hash, actions in json.loads(text).items():
+            q_table[state_hash] = {}
+            for action_hash, q_value in actions.items():
+                q_table[state_hash][action_hash] = q_value
+        return cls(q_table)
+
+    def get_q_value(self, state_hash: str, action_hash: str) -> float:
+        if state_hash not in self.q_table:
+            self.q_table[state_hash] = {}
+        if action_hash not in self.q_table[state_hash]:
+            self.q_table[state_hash][action_hash] = 0.0
+        return self.q_table[state_hash][action_hash]
+
+    def set_q_value(self, state_hash: str, action_hash: str, value: float):
+        if state_hash not in self.q_table:
+            self.q_table[state_hash] = {}
+        self.q_table[state_hash][action_hash] = value
+
+    def update_q_value(self, state_hash: str, action_hash: str, reward: float, next_state_hash: str):
+        current_q = self.get_q_value(state_hash, action_hash)
+        max_next_q = 0.0
+        if next_state_hash in self.q_table and self.q_table[next_state_hash]:
+            max_next_q = max(self.q_table[next_state_hash].values())
+        new_q = current_q + self.alpha * (reward + self.gamma * max_next_q - current_q)
+        self.set_q_value(state_hash, action_hash, new_q)
+
+
+def synthetic_q_table(states: int, entries: int, rng: random.Random) -> Dict[str, Dict[str, float]]:
+    """Случайная Q-таблица в формате файла: states состояний по entries ходов"""
+    table = {}
+    while len(table) < states:
+        packed = bytes(rng.randrange(5) << 4 | rng.randrange(5) for _ in range(16))
+        table[unpack_state(packed)] = {name: rng.uniform(-1.0, 1.0)
+                                       for name in rng.sample(ACTION_NAMES, entries)}
+    return table
+
+
+def _restored_model(text: str, storage: str) -> QTableModel:
+    model = QTableModel(storage=storage)
+    model.restore(json.loads(text), {})
+    return model
+
+
+def benchmark_storage(states: int = 20000, entries: int = 6, updates: int = 200_000,
+                      repeats: int = 5, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Время update_q_value и память таблицы для каждого режима хранения и для исходной
+    реализации ("reference"). Замеры чередуются, берётся лучшее время из repeats"""
+    rng = random.Random(seed)
+    table = synthetic_q_table(states, entries, rng)
+    text = json.dumps(table)
+    hashes = list(table)
+    steps = []
+    for _ in range(updates):
+        state_hash = rng.choice(hashes)
+        name = rng.choice(list(table[state_hash]))
+        steps.append((state_hash, name, rng.uniform(-1.0, 1.0), rng.choice(hashes)))
+    del table
+
+    contestants = {}
+    reference, size = traced_allocation(lambda: ReferenceQLearning.load(text))
+    contestants["reference"] = (reference.update_q_value, steps, size)
+    coded = [(state_hash, ACTION_CODES[name], reward, next_hash) for state_hash, name, reward, next_hash in steps]
+    for storage in STORAGE_MODES:
+        model, size = traced_allocation(lambda: _restored_model(text, storage))
+        contestants[storage] = (QLearningBot(model=model).update_q_value, coded, size)
+
+    best = dict.fromkeys(contestants, float("inf"))
+    # Первый проход - прогрев, в зачёт не идёт
+    for repeat in range(repeats + 1):
+        for name, (update, calls, _) in contestants.items():
+            start = time.perf_counter()
+            for call in calls:
+                update(*call)
+            if repeat:
+                best[name] = min(best[name], time.perf_counter() - start)
+    values = states * entries
+    return {name: {"seconds": best[name], "us_per_update": best[name] / updates * 1e6,
+                   "bytes": size, "bytes_per_value": size / values}
+            for name, (_, _, size) in contestants.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Инструменты для Q-таблиц")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge = commands.add_parser("merge", help="слить несколько Q-таблиц в одну")
+    merge.add_argument("output")
+    merge.add_argument("inputs", nargs="+")
+    merge.add_argument("--strategy", choices=MERGE_STRATEGIES, default="weighted")
+    merge.add_argument("--run-size", type=int, default=MERGE_RUN_SIZE,
+                       help="состояний в памяти при внешней сортировке")
+    merge.add_argument("--tmp-dir", default=None)
+
+    compact = commands.add_parser("compact", help="убрать нетронутые нули, редкие состояния, округлить")
+    compact.add_argument("path")
+    compact.add_argument("-o", "--output", default=None, help="по умолчанию - на месте")
+    compact.add_argument("--min-visits", type=int, default=0)
+    compact.add_argument("--keep-zeros", action="store_true")
+    compact.add_argument("--decimals", type=int, default=None)
+    compact.add_argument("--quantum", type=float, default=None)
+    compact.add_argument("--run-size", type=int, default=MERGE_RUN_SIZE)
+    compact.add_argument("--tmp-dir", default=None)
+
+    publish = commands.add_parser("publish", help="записать снимок .qsnap для общего доступа процессов")
+    publish.add_argument("path")
+    publish.add_argument("output")
+    publish.add_argument("--storage", choices=SNAPSHOT_STORAGE, default="float64")
+
+    report = commands.add_parser("quantize-report", help="как квантование меняет жадную игру")
+    report.add_argument("path")
+    report.add_argument("--storage", choices=STORAGE_MODES[1:], default="int16")
+
+    bench = commands.add_parser("bench", help="скорость обновления и память режимов хранения")
+    bench.add_argument("--states", type=int, default=20000)
+    bench.add_argument("--entries", type=int, default=6, help="ходов в состоянии")
+    bench.add_argument("--updates", type=int, default=200_000)
+    bench.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == "merge":
+        stats = merge_q_tables(args.inputs, args.output, args.strategy, args.run_size, args.tmp_dir)
+        print(f"Слито {len(args.inputs)} таблиц: {stats['states']} состояний, "
+              f"{stats['entries']} значений -> {args.output}")
+    elif args.command == "compact":
+        report = compact_q_table_file(args.path, args.output, args.min_visits, not args.keep_zeros,
+                                      args.decimals, args.quantum, args.run_size, args.tmp_dir)
+        print(f"Состояний: {report['states_before']} -> {report['states_after']}")
+        print(f"Значений:  {report['entries_before']} -> {report['entries_after']}")
+        print(f"Размер:    {report['bytes_before']} -> {report['bytes_after']} байт")
+    elif args.command == "publish":
+        rows = ((state_hash, encode_actions(actions)) for state_hash, actions in JsonObjectReader(args.path))
+        stats = publish_snapshot(rows, args.output, args.storage)
+        print(f"Снимок {args.output}: {stats['states']} состояний, "
+              f"{stats['entries']} значений, {stats['bytes']} байт")
+    elif args.command == "quantize-report":
+        with open(args.path, 'r') as f:
+            report = quantization_report(json.load(f), args.storage)
+        print(f"Режим {args.storage}, состояний: {report['states']}")
+        print(f"Совпадение жадного хода: {report['greedy_agreement']:.2%}")
+        print(f"Ошибка Q: макс. {report['max_abs_error']:.5f}, средн. {report['mean_abs_error']:.5f}")
+        print(f"Память: {report['bytes_full']} -> {report['bytes_compact']} байт")
+    elif args.command == "bench":
+        results = benchmark_storage(args.states, args.entries, args.updates, args.repeats)
+        print(f"{'режим':<10} {'мкс/обновление':>15} {'память, байт':>14} {'байт/значение':>14}")
+        for name, row in results.items():
+            print(f"{name:<10} {row['us_per_update']:>15.2f} {row['bytes']:>14} {row['bytes_per_value']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+# Конечные значения по умолчанию для убывающих графиков
+EPSILON_END = 0.01
+ALPHA_END = 0.01
+
+
+class Schedule:
+    """Постоянное значение параметра; подклассы меняют его по номеру игры тренера"""
+    kind = "constant"
+    per_visit = False  # значение зависит от N(s,a), а не от номера игры
+
+    def __init__(self, start: float, end: Optional[float] = None, games: int = 1):
+        self.start = start
+        self.end = start if end is None else end
+        self.games = max(games, 1)
+
+    def _fraction(self, game: int) -> float:
+        return min(max(game, 0) / self.games, 1.0)
+
+    def value(self, game: int) -> float:
+        return self.start
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"kind": self.kind, "start": self.start, "end": self.end, "games": self.games}
+
+
+class LinearSchedule(Schedule):
+    """Линейно от start до end за games игр"""
+    kind = "linear"
+
+    def value(self, game: int) -> float:
+        return self.start + (self.end - self.start) * self._fraction(game)
+
+
+class ExponentialSchedule(Schedule):
+    """Экспоненциально от start до end за games игр (оба значения > 0)"""
+    kind = "exponential"
+
+    def __init__(self, start: float, end: Optional[float] = None, games: int = 1):
+        super().__init__(start, end, games)
+        if self.start <= 0 or self.end <= 0:
+            raise ValueError("Экспоненциальный график требует значений больше нуля")
+
+    def value(self, game: int) -> float:
+        return self.start * (self.end / self.start) ** self._fraction(game)
+
+
+class VisitSchedule(Schedule):
+    """Скорость обучения start/N(s,a), но не меньше end - своя для каждой пары"""
+    kind = "visits"
+    per_visit = True
+
+    def for_visits(self, visits: int) -> float:
+        return max(self.start / max(visits, 1), self.end)
+
+
+SCHEDULES = {cls.kind: cls for cls in (Schedule, LinearSchedule, ExponentialSchedule, VisitSchedule)}
+
+
+def make_schedule(spec: Optional[dict]) -> Optional[Schedule]:
+    """График из словаря to_dict() (например, из контрольной точки); None - без графика"""
+    if not spec:
+        return None
+    return SCHEDULES[spec["kind"]](spec["start"], spec.get("end"), spec.get("games", 1))
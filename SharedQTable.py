@@ -0,0 +1,281 @@
+"""Замороженный снимок Q-таблицы в отображаемом в память файле и локальная дельта поверх него.
+
+Снимок публикуется один раз (QTableTools.py publish). Процессы открывают его
+через np.memmap только для чтения: страницы файла общие в кэше ОС, поэтому
+N процессов держат в памяти одну копию таблицы, а не N словарей. Обновления
+каждого процесса ложатся в небольшую дельту (OverlayQTable) и сохраняются в
+свой файл q_table.delta-<pid>.json, который сливается с исходной таблицей
+обычным QTableTools.py merge.
+
+Формат файла (.qsnap):
+    заголовок   "MKQS", версия, режим хранения, число состояний, число значений
+    ключи       упакованные состояния (pack_state), по 16 байт, по возрастанию
+    смещения    uint32 на состояние + 1: строка i - значения [off[i], off[i+1])
+    коды ходов  uint16
+    значения    float64 / float16 / int16 (как в QStorage.CODECS), выровнены на 8 байт
+
+    python QTableTools.py publish q_table.json q_table.qsnap --storage float16
+    python Arena.py new=q_learning:q_table.qsnap old=q_learning:old.json --workers 8
+"""
+from typing import Dict, Iterable, Iterator, Mapping, MutableMapping, Optional, Tuple
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from QStorage import CODECS, QCodec, lookup_values, pack_state, row_lookup, unpack_state
+
+SNAPSHOT_SUFFIX = ".qsnap"
+SNAPSHOT_MAGIC = b"MKQS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHII")
+KEY_SIZE = 16
+SNAPSHOT_STORAGE = tuple(CODECS)  # режим значений снимка; номер режима пишется в заголовок
+
+
+def delta_path(snapshot_path: str, pid: Optional[int] = None) -> str:
+    """Файл дельты процесса рядом со снимком: q_table.qsnap -> q_table.delta-<pid>.json"""
+    root, _ = os.path.splitext(snapshot_path)
+    return f"{root}.delta-{os.getpid() if pid is None else pid}.json"
+
+
+def _layout(states: int, entries: int, itemsize: int) -> Tuple[int, int, int, int, int]:
+    """Смещения разделов файла: ключи, смещения строк, коды, значения, конец"""
+    keys = SNAPSHOT_HEADER.size
+    offsets = keys + states * KEY_SIZE
+    codes = offsets + (states + 1) * 4
+    values = (codes + entries * 2 + 7) // 8 * 8
+    return keys, offsets, codes, values, values + entries * itemsize
+
+
+def publish_snapshot(rows: Iterable[Tuple[str, Mapping[int, float]]], path: str,
+                     storage: str = "float64") -> Dict[str, int]:
+    """Записывает снимок из пар (hash состояния, {код хода: Q}); файл подменяется атомарно,
+    уже открытые снимки продолжают читать старую версию"""
+    codec = CODECS[storage]
+    keys, codes, values, lengths = [], [], [], []
+    for state_hash, actions in rows:
+        if not actions:
+            continue
+        keys.append(pack_state(state_hash))
+        lengths.append(len(actions))
+        for code, value in actions.items():
+            codes.append(code)
+            values.append(value)
+
+    key_array = np.array(keys, dtype=f"S{KEY_SIZE}")
+    order = np.argsort(key_array, kind="stable")
+    lengths = np.array(lengths, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)))[:-1]
+    sorted_lengths = lengths[order]
+    offsets = np.concatenate(([0], np.cumsum(sorted_lengths))).astype(np.uint32)
+    # Индексы значений в порядке отсортированных строк
+    index = np.repeat(starts[order] - offsets[:-1], sorted_lengths) + np.arange(len(codes))
+    code_array = np.array(codes, dtype=np.uint16)[index]
+    value_array = codec.encode(values)[index]
+
+    layout = _layout(len(keys), len(codes), codec.dtype.itemsize)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SNAPSHOT_STORAGE.index(storage),
+                                         len(keys), len(codes)))
+            # Ключи пишутся побайтно: элементы S16 теряют нули в конце
+            f.write(b''.join(keys[i] for i in order))
+            f.write(offsets.tobytes())
+            f.write(code_array.tobytes())
+            f.write(b'\0' * (layout[3] - layout[2] - code_array.nbytes))
+            f.write(value_array.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"states": len(keys), "entries": len(codes), "bytes": layout[4]}
+
+
+class FrozenRow(Mapping):
+    """Строка снимка {код хода: Q}: срезы отображённых массивов, без копирования"""
+    __slots__ = ("_codes", "_values", "_codec")
+
+    def __init__(self, codes: np.ndarray, values: np.ndarray, codec: QCodec):
+        self._codes = codes
+        self._values = values
+        self._codec = codec
+
+    def _index(self, code: int) -> int:
+        hits = np.flatnonzero(self._codes == code)
+        return int(hits[0]) if len(hits) else -1
+
+    def __getitem__(self, code: int) -> float:
+        i = self._index(code)
+        if i < 0:
+            raise KeyError(code)
+        return self._codec.decode(self._values[i])
+
+    def __contains__(self, code) -> bool:
+        return self._index(code) >= 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._codes.tolist())
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def items(self):
+        scale = self._codec.scale
+        return list(zip(self._codes.tolist(), (v / scale for v in self._values.tolist())))
+
+    def max_value(self) -> float:
+        return self._codec.decode(self._values.max())
+
+    def best_code(self) -> int:
+        return int(self._codes[self._values.argmax()])
+
+    def lookup(self, codes: np.ndarray, default: float = 0.0) -> np.ndarray:
+        return lookup_values(self._codes, self._values, self._codec, codes, default)
+
+
+class FrozenQTable(Mapping):
+    """Снимок {hash состояния: FrozenRow} только для чтения; поиск - двоичный по ключам"""
+    def __init__(self, path: str):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, storage, states, entries = SNAPSHOT_HEADER.unpack(
+            self._map[:SNAPSHOT_HEADER.size].tobytes())
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: не снимок Q-таблицы версии {SNAPSHOT_VERSION}")
+        self.storage = SNAPSHOT_STORAGE[storage]
+        self.codec = CODECS[self.storage]
+        keys, offsets, codes, values, end = _layout(states, entries, self.codec.dtype.itemsize)
+        if len(self._map) < end:
+            raise ValueError(f"{path}: файл снимка обрезан")
+        self._keys = self._map[keys:offsets].view(f"S{KEY_SIZE}")
+        self._offsets = self._map[offsets:codes].view(np.uint32)
+        self._codes = self._map[codes:codes + entries * 2].view(np.uint16)
+        self._values = self._map[values:end].view(self.codec.dtype)
+
+    def _find(self, state_hash: str) -> int:
+        key = pack_state(state_hash)
+        i = int(np.searchsorted(self._keys, key))
+        # Элементы S16 возвращаются без нулей в конце
+        if i < len(self._keys) and self._keys[i] == key.rstrip(b'\0'):
+            return i
+        return -1
+
+    def _row(self, i: int) -> FrozenRow:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return FrozenRow(self._codes[start:end], self._values[start:end], self.codec)
+
+    def __getitem__(self, state_hash: str) -> FrozenRow:
+        i = self._find(state_hash)
+        if i < 0:
+            raise KeyError(state_hash)
+        return self._row(i)
+
+    def get(self, state_hash: str, default=None):
+        i = self._find(state_hash)
+        return self._row(i) if i >= 0 else default
+
+    def __contains__(self, state_hash) -> bool:
+        return self._find(state_hash) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._keys:
+            yield unpack_state(key.ljust(KEY_SIZE, b'\0'))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class OverlayRow(MutableMapping):
+    """Строка снимка с локальными изменениями: чтение - сначала дельта, запись - только в дельту"""
+    __slots__ = ("_table", "_state", "_frozen", "_delta")
+
+    def __init__(self, table: "OverlayQTable", state_hash: str, frozen: FrozenRow, delta):
+        self._table = table
+        self._state = state_hash
+        self._frozen = frozen
+        self._delta = delta
+
+    def __getitem__(self, code: int) -> float:
+        if self._delta is not None and code in self._delta:
+            return self._delta[code]
+        return self._frozen[code]
+
+    def __setitem__(self, code: int, value: float) -> None:
+        if self._delta is None:
+            self._table.delta[self._state] = {}
+            self._delta = self._table.delta[self._state]
+        self._delta[code] = value
+
+    def __delitem__(self, code: int) -> None:
+        raise TypeError("Снимок Q-таблицы только для чтения")
+
+    def __contains__(self, code) -> bool:
+        return (self._delta is not None and code in self._delta) or code in self._frozen
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(dict(self.items()))
+
+    def __len__(self) -> int:
+        return len(dict(self.items()))
+
+    def items(self):
+        merged = dict(self._frozen.items())
+        if self._delta is not None:
+            merged.update(self._delta.items())
+        return list(merged.items())
+
+    def max_value(self) -> float:
+        return max(value for _, value in self.items())
+
+    def best_code(self) -> int:
+        return max(self.items(), key=lambda item: item[1])[0]
+
+    def lookup(self, codes: np.ndarray, default: float = 0.0) -> np.ndarray:
+        values = self._frozen.lookup(codes, default)
+        if self._delta is not None:
+            changed = row_lookup(self._delta, codes, np.nan)
+            values = np.where(np.isnan(changed), values, changed)
+        return values
+
+
+class OverlayQTable(MutableMapping):
+    """Q-таблица поверх снимка: строки снимка плюс локальная дельта (make_q_table).
+    Удалить строку снимка нельзя; clear() сбрасывает только дельту"""
+    def __init__(self, frozen: FrozenQTable, delta: MutableMapping):
+        self.frozen = frozen
+        self.delta = delta
+
+    def __getitem__(self, state_hash: str):
+        delta = self.delta.get(state_hash)
+        frozen = self.frozen.get(state_hash)
+        if frozen is None:
+            if delta is None:
+                raise KeyError(state_hash)
+            return delta
+        return OverlayRow(self, state_hash, frozen, delta)
+
+    def __setitem__(self, state_hash: str, row) -> None:
+        self.delta[state_hash] = row
+
+    def __delitem__(self, state_hash: str) -> None:
+        if state_hash in self.frozen:
+            raise TypeError("Снимок Q-таблицы только для чтения")
+        del self.delta[state_hash]
+
+    def clear(self) -> None:
+        self.delta.clear()
+
+    def __contains__(self, state_hash) -> bool:
+        return state_hash in self.delta or state_hash in self.frozen
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.frozen
+        for state_hash in self.delta:
+            if state_hash not in self.frozen:
+                yield state_hash
+
+    def __len__(self) -> int:
+        return len(self.frozen) + sum(1 for state_hash in self.delta if state_hash not in self.frozen)
@@ -3,9 +3,18 @@ from tkinter import messagebox
 from typing import List, Dict, Optional, Tuple, Set, Any, TypeAlias, TypedDict, Literal
 import hashlib
 import json
+import logging
 import os
 import copy
-from BotClass import BotPlayer
+import random
+from BotClass import (BotPlayer, BackgroundWriter, DrawTracker, Adjudicator, CHECKPOINT_FILE, initial_board,
+                      atomic_write_json, board_from_state_hash)
+from BotRegistry import BOT_ENGINES
+from QStorage import ACTION_NAMES
+from PositionDB import PositionDB
+from Trajectory import TrajectoryWriter
+from GameRecord import PDNWriter, game_tags
+from Schedules import SCHEDULES, EPSILON_END, ALPHA_END, make_schedule
 
 CELL_SIZE: int = 80
 BOARD_SIZE: int = 8
@@ -15,6 +24,26 @@ WHITE_PIECE_COLOR: str = "#FFFFFF"
 RED_PIECE_COLOR: str = "#FF0000"
 HIGHLIGHT_COLOR: str = "#00FF00"
 CROWN_COLOR: str = "#FFD700"
+STATS_FILE: str = "game_stats.json"
+BOT_MOVE_TIMEOUT_MS: int = 5_000
+BOT_THINK_TIME: float = 4.0  # бюджет анализа хода, меньше таймаута
+START_CORPUS_FILE: str = "start_positions.json"
+START_MODES: Dict[str, str] = {
+    "opening": "Начальная позиция",
+    "corpus": "Позиции из корпуса",
+    "random": "Случайная середина партии",
+}
+SCHEDULE_LABELS: Dict[str, str] = {
+    "constant": "Постоянный",
+    "linear": "Линейный",
+    "exponential": "Экспоненциальный",
+    "visits": "1/N(s,a)",
+}
+DRAW_REASONS: Dict[str, str] = {
+    "repetition": "троекратное повторение",
+    "no_progress": "нет взятий",
+    "move_limit": "лимит ходов",
+}
 
 Position: TypeAlias = Tuple[int, int]
 PieceColor: TypeAlias = Literal["WHITE", "RED"]
@@ -36,7 +65,17 @@ class MakYek:
         
         self.game_mode = "vs_bot"
         self.player_color = "WHITE"  # Игрок всегда белые
-        self.bot = BotPlayer(game_instance=self)
+        self.writer = BackgroundWriter()  # Запись на диск вне потока Tk
+        self.stats = self._load_stats()
+        self.position_db = PositionDB()
+        self.game_positions: List[Tuple[str, str]] = []
+        self._games_recorded = 0
+        # Ходы партии для записи PDN: (сторона, откуда, куда, взятие)
+        self.game_moves: List[Tuple[str, Position, Position, bool]] = []
+        self.game_log = PDNWriter()
+        # Q-таблица грузится в фоне: доска доступна сразу, бот ждёт загрузки
+        self.bot = BotPlayer(game_instance=self, lazy=True)
+        self.bot.writer = self.writer
         self.bot_thinking = False
 
         bg_color = "#E0E0E0"
@@ -91,6 +130,7 @@ class MakYek:
         
         self.moved_this_turn = False
         self._init_game()
+        self._poll_model_loading()
 
     def _init_game(self) -> None:
         self.board: List[List[Optional[PieceData]]] = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
@@ -107,6 +147,8 @@ class MakYek:
         self.moved_this_turn = False
         self._init_board()
         self._place_pieces()
+        self.draw_tracker = DrawTracker()
+        self._record_position()
         
         self._create_labels()
         
@@ -152,6 +194,23 @@ class MakYek:
         )
         self.score_label.pack(side=tk.TOP)
 
+        self.model_label = tk.Label(
+            self.labels_frame,
+            text="",
+            font=("Arial", 11),
+            fg="#606060",
+            bg="#E0E0E0"
+        )
+        self.model_label.pack(side=tk.TOP)
+
+    def _poll_model_loading(self) -> None:
+        """Показывает прогресс фоновой загрузки Q-таблицы"""
+        if self.bot.model.ready:
+            self.model_label.config(text="")
+            return
+        self.model_label.config(text=f"Загрузка модели бота: {self.bot.model.progress:.0%}")
+        self.root.after(100, self._poll_model_loading)
+
     def _init_board(self) -> None:
         for row in range(BOARD_SIZE):
             for col in range(BOARD_SIZE):
@@ -346,6 +405,7 @@ class MakYek:
         
         self.moves_text.insert(tk.END, move_text)
         self.moves_text.see(tk.END)
+        self.game_moves.append((self.current_turn, start_pos, end_pos, is_capture))
 
     def _on_drop(self, event: tk.Event) -> None:
         if self.game_over:
@@ -356,21 +416,16 @@ class MakYek:
             row: int = event.y // CELL_SIZE
             if (row, col) in self.valid_moves:
                 old_row, old_col = self.start_pos
-                is_capture: bool = False
 
                 # Проверяем было ли взятие
-                if abs(row - old_row) >= 2 or abs(col - old_col) >= 2:
-                    is_capture = True
-                    dr = 1 if row > old_row else -1
-                    dc = 1 if col > old_col else -1
-                    curr_row, curr_col = old_row, old_col
-                    
-                    while curr_row != row or curr_col != col:
-                        curr_row += dr
-                        curr_col += dc
-                        if self.board[curr_row][curr_col]:
-                            self._remove_piece(curr_row, curr_col)
-                            break
+                captured = self.bot._captured_square(self.board, (old_row, old_col), (row, col))
+                is_capture: bool = captured is not None
+
+                # Прыжок пишем в журнал до снятия фигуры: снятие последней
+                # шашки заканчивает партию и сразу сохраняет её запись
+                self._add_move_to_log((old_row, old_col), (row, col), is_capture)
+                if captured:
+                    self._remove_piece(*captured)
 
                 # Перемещаем шашку
                 self.board[row][col] = self.board[old_row][old_col]
@@ -382,7 +437,6 @@ class MakYek:
                    ((row == 0 and self.selected_piece["color"] == WHITE_PIECE_COLOR) or \
                     (row == BOARD_SIZE - 1 and self.selected_piece["color"] == RED_PIECE_COLOR)):
                     self._make_king(row, col)
-                    self._add_move_to_log((old_row, old_col), (row, col), is_capture)
                     self._change_turn()
                     self._clear_highlights()
                     self.selected_piece = None
@@ -391,7 +445,6 @@ class MakYek:
                     return
 
                 if self.selected_piece["is_king"]:
-                    self._add_move_to_log((old_row, old_col), (row, col), is_capture)
                     self.moved_this_turn = True
                     self._change_turn()
                     self._clear_highlights()
@@ -402,10 +455,8 @@ class MakYek:
 
                 # Для шашки
                 if not is_capture:
-                    self._add_move_to_log((old_row, old_col), (row, col), is_capture)
                     self._change_turn()
                 else:
-                    self._add_move_to_log((old_row, old_col), (row, col), is_capture)
                     if self._check_captures(row, col, [], set()):
                         self.selected_piece = self.board[row][col]
                         self.start_pos = (row, col)
@@ -434,14 +485,18 @@ class MakYek:
             self.bot_thinking = False
             return
         
+        if not self.bot.model.ready:
+            # Модель ещё грузится - повторим попытку позже
+            self.root.after(200, self._make_bot_move)
+            return
+        
         try:
-            timeout_id = self.root.after(5_000, self._bot_timeout)
-            move = self.bot.get_move()
+            timeout_id = self.root.after(BOT_MOVE_TIMEOUT_MS, self._bot_timeout)
+            move = self.bot.get_move(time_limit=BOT_THINK_TIME)
             self.root.after_cancel(timeout_id)
 
             if move:
-                start_pos, end_pos = move
-                self._execute_bot_move(start_pos, end_pos)
+                self._execute_bot_move(move)
             else:
                 self._check_winner()
         finally:
@@ -453,34 +508,28 @@ class MakYek:
         self._bind_events()
         messagebox.showwarning("Внимание", "Бот завис, ход переходит к вам")
 
-    def _execute_bot_move(self, start_pos: Position, end_pos: Position) -> None:
-        old_row, old_col = start_pos
-        new_row, new_col = end_pos
-        
-        # Проверяем было ли взятие
-        is_capture = abs(new_row - old_row) >= 2 or abs(new_col - old_col) >= 2
+    def _execute_bot_move(self, move: Tuple[Position, ...]) -> None:
+        """Выполняет ход бота целиком: для цепочки взятий - все прыжки подряд"""
+        is_capture = self.bot._is_capture_move(self.get_board_state(), move)
         
         if hasattr(self, 'bot') and hasattr(self.bot, 'learn_from_move'):
             before_state_hash = self.bot.get_state_hash(self.get_board_state())
-            action_hash = self.bot.get_action_hash(start_pos, end_pos)
-
-        # Удаляем срубленную фигуру если нужно
-        if is_capture:
-            dr = 1 if new_row > old_row else -1
-            dc = 1 if new_col > old_col else -1
-            curr_row, curr_col = old_row + dr, old_col + dc
+            action_hash = self.bot.get_action_hash(*move)
+
+        for start_pos, end_pos in zip(move, move[1:]):
+            # Удаляем срубленную фигуру если нужно
+            captured = self.bot._captured_square(self.board, start_pos, end_pos)
+            # Логируем прыжок до снятия фигуры, иначе последний ход выигранной
+            # партии не попадёт в запись (в PDN цепочка склеивается в один ход)
+            self._add_move_to_log(start_pos, end_pos, captured is not None)
+            if captured:
+                self._remove_piece(*captured)
             
-            while curr_row != new_row or curr_col != new_col:
-                if self.board[curr_row][curr_col]:
-                    self._remove_piece(curr_row, curr_col)
-                    break
-                curr_row += dr
-                curr_col += dc
-        
-        # Перемещаем фигуру
-        piece = self.board[old_row][old_col]
-        self.board[new_row][new_col] = piece
-        self.board[old_row][old_col] = None
+            # Перемещаем фигуру
+            piece = self.board[start_pos[0]][start_pos[1]]
+            self.board[end_pos[0]][end_pos[1]] = piece
+            self.board[start_pos[0]][start_pos[1]] = None
+        new_row, new_col = move[-1]
         
         # Обновляем позицию на canvas
         x, y = new_col * CELL_SIZE, new_row * CELL_SIZE
@@ -506,7 +555,7 @@ class MakYek:
                 became_king = True
         
         if hasattr(self, 'bot') and hasattr(self.bot, 'learn_from_move'):
-            if before_state_hash and action_hash:
+            if before_state_hash and action_hash is not None:
                 reward = self.bot.get_reward(
                     self.get_board_state(), 
                     True,           # move_made
@@ -521,9 +570,6 @@ class MakYek:
                     reward
                 )
         
-        # Логируем ход
-        self._add_move_to_log(start_pos, end_pos, is_capture)
-        
         # Меняем ход
         self._change_turn()
 
@@ -607,29 +653,92 @@ class MakYek:
             winner = "белые" if self.current_turn == "RED" else "красные"
             self._show_winner(f"{winner} (пат)")
 
-    def _show_winner(self, winner: str) -> None:
+    def _record_position(self, state_hash: Optional[str] = None) -> Optional[str]:
+        """Запоминает текущую позицию, возвращает причину ничьей или None"""
+        if state_hash is None:
+            state_hash = self.bot.get_state_hash(self.get_board_state())
+        self.game_positions.append((state_hash, self.current_turn))
+        return self.draw_tracker.record(state_hash, self.current_turn)
+
+    def _game_positions_with_moves(self) -> List[Tuple[str, str, Optional[str]]]:
+        positions = []
+        for state_hash, side in self.game_positions:
+            best = self.bot.best_action(state_hash)
+            positions.append((state_hash, side, None if best is None else ACTION_NAMES[best]))
+        return positions
+
+    def _store_game_positions(self, winner_color: Optional[str]) -> None:
+        """Отправляет позиции партии в базу позиций через фоновую запись"""
+        positions = self._game_positions_with_moves()
+        self._games_recorded += 1
+        self.writer.submit(f"positions:{self._games_recorded}",
+                           lambda: self.position_db.record_game(positions, winner_color))
+
+    def _game_record_tags(self, event: str) -> Dict[str, str]:
+        """Теги PDN текущей партии (с FEN, если она началась не с начальной позиции)"""
+        if self.game_mode == "vs_bot":
+            names = {self.player_color: "Игрок"}
+            names.setdefault("WHITE", "Бот")
+            names.setdefault("RED", "Бот")
+        else:
+            names = {"WHITE": "Бот", "RED": "Бот"}
+        start = self.game_positions[0] if self.game_positions else None
+        if start == (self.bot.get_state_hash(initial_board()), "WHITE"):
+            start = None
+        return game_tags(event, names["WHITE"], names["RED"], start)
+
+    def _store_game_record(self, winner_color: Optional[str]) -> None:
+        """Дописывает партию в GAMES_FILE через фоновую запись"""
+        tags = self._game_record_tags("MakYek")
+        moves = list(self.game_moves)
+        self.writer.submit(f"pdn:{self._games_recorded}",
+                           lambda: self.game_log.write_game(tags, moves, winner_color))
+
+    def _save_stats(self) -> None:
+        stats_snapshot = dict(self.stats)
+        self.writer.submit(STATS_FILE, lambda: atomic_write_json(STATS_FILE, stats_snapshot))
+
+    def _show_draw(self, reason: str) -> None:
         if hasattr(self, '_winner_shown') and self._winner_shown:
             return
         
         self._winner_shown = True
+        self.game_over = True
 
-        stats_file = "game_stats.json"
-        try:
-            with open(stats_file, 'r') as f:
-                stats = json.load(f)
-        except FileNotFoundError:
-            stats = {"white_wins": 0, "red_wins": 0}
+        self.stats["draws"] = self.stats.get("draws", 0) + 1
+        self._save_stats()
+
+        self._store_game_positions(None)
+        self._store_game_record(None)
+        self._show_result_window("Ничья", f"Ничья ({DRAW_REASONS.get(reason, reason)})")
+
+        if hasattr(self, 'bot') and hasattr(self.bot, 'learn_from_outcome'):
+            self.bot.learn_from_outcome(self.get_board_state(), None)
+
+    def _show_winner(self, winner: str) -> None:
+        if hasattr(self, '_winner_shown') and self._winner_shown:
+            return
         
+        self._winner_shown = True
+
         if "белые" in winner:
-            stats["white_wins"] += 1
+            self.stats["white_wins"] += 1
         elif "красные" in winner:
-            stats["red_wins"] += 1
+            self.stats["red_wins"] += 1
         
-        with open(stats_file, 'w') as f:
-            json.dump(stats, f)
+        self._save_stats()
+
+        winner_color = "RED" if "красные" in winner else "WHITE"
+        self._store_game_positions(winner_color)
+        self._store_game_record(winner_color)
+        self._show_result_window("Победа!", f"Победили {winner}!")
+
+        if hasattr(self, 'bot') and hasattr(self.bot, 'learn_from_outcome'):
+            self.bot.learn_from_outcome(self.get_board_state(), winner_color)
 
+    def _show_result_window(self, title: str, message: str) -> None:
         winner_window = tk.Toplevel(self.root)
-        winner_window.title("Победа!")
+        winner_window.title(title)
         winner_window.transient(self.root)
         winner_window.grab_set()
 
@@ -650,7 +759,7 @@ class MakYek:
 
         label = tk.Label(
             frame, 
-            text=f"Победили {winner}!", 
+            text=message, 
             font=("Arial", 16, "bold")
         )
         label.pack(pady=10)
@@ -664,10 +773,6 @@ class MakYek:
         )
         button.pack(pady=10)
 
-        if hasattr(self, 'bot') and hasattr(self.bot, 'learn_from_outcome'):
-            winner_color = "RED" if "красные" in winner else "WHITE"
-            self.bot.learn_from_outcome(self.get_board_state(), winner_color)
-
     def _make_king(self, row: int, col: int) -> None:
         piece = self.board[row][col]
         if not piece["is_king"]:
@@ -691,6 +796,11 @@ class MakYek:
         self.moved_this_turn = False
         self.turn_label.config(text=f"Ходят {self.current_player_text}")
         
+        # Проверяем ничью по повторению позиции и по отсутствию прогресса
+        draw_reason = self._record_position()
+        if draw_reason and not self.game_over:
+            self._show_draw(draw_reason)
+        
         # Проверяем пат после смены хода
         if not self.game_over:
             self._check_winner()
@@ -726,6 +836,32 @@ class MakYek:
 
         menubar.add_command(label="Обучить бота", command=self._show_train_dialog)
 
+        self.engine_var = tk.StringVar(value="q_learning")
+        engine_menu = tk.Menu(menubar, tearoff=0)
+        engine_menu.add_radiobutton(label="Q-обучение", variable=self.engine_var,
+                                    value="q_learning", command=self._change_engine)
+        engine_menu.add_radiobutton(label="Поиск Монте-Карло (MCTS)", variable=self.engine_var,
+                                    value="mcts", command=self._change_engine)
+        menubar.add_cascade(label="Движок", menu=engine_menu)
+
+    def _change_engine(self) -> None:
+        """Заменяет бота на выбранный движок, сохраняя общую Q-таблицу"""
+        engine_class = BOT_ENGINES[self.engine_var.get()]
+        if type(self.bot) is engine_class:
+            return
+        old_bot = self.bot
+        # lazy: если таблица ещё грузится, окно не ждёт её в потоке Tk
+        self.bot = engine_class(game_instance=self, model=old_bot.model, lazy=True,
+                                epsilon=old_bot.epsilon, alpha=old_bot.alpha, gamma=old_bot.gamma,
+                                trace_lambda=old_bot.trace_lambda, trace_cutoff=old_bot.trace_cutoff,
+                                double_q=old_bot.double_q)
+        self.bot.epsilon_schedule = old_bot.epsilon_schedule
+        self.bot.alpha_schedule = old_bot.alpha_schedule
+        self.bot.color = old_bot.color
+        self.bot.writer = self.writer
+        old_bot.close_pool()
+        old_bot.release()
+
     def _restart_game(self) -> None:
         if messagebox.askyesno("Новая игра", "Вы уверены, что хотите начать новую игру?"):
             self.game_over = False
@@ -744,13 +880,28 @@ class MakYek:
             self._create_labels()
             self._init_board()
             self._place_pieces()
+            self.draw_tracker.reset()
+            self.game_positions = []
+            self.game_moves = []
+            self._record_position()
+            self.bot.reset_episode()
             self._bind_events()
 
     def _on_closing(self) -> None:
         if messagebox.askyesno("Выход", "Вы уверены, что хотите выйти?"):
+            self.writer.close()  # Дописываем статистику и Q-таблицу
+            self.position_db.close()
+            self.bot.close_pool()
             self.root.quit()
             self.root.destroy()
 
+    def _load_stats(self) -> Dict[str, int]:
+        try:
+            with open(STATS_FILE, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"white_wins": 0, "red_wins": 0}
+
     def _show_rules(self) -> None:
         rules_window = tk.Toplevel(self.root)
         rules_window.title("Правила игры")
@@ -809,12 +960,7 @@ class MakYek:
         button.pack(pady=10)
 
     def _show_statistics(self) -> None:
-        stats_file = "game_stats.json"
-        try:
-            with open(stats_file, 'r') as f:
-                stats = json.load(f)
-        except FileNotFoundError:
-            stats = {"white_wins": 0, "red_wins": 0}
+        stats = self.stats
         
         stats_window = tk.Toplevel(self.root)
         stats_window.title("Статистика игр")
@@ -822,7 +968,7 @@ class MakYek:
         stats_window.grab_set()
         
         window_width = 300
-        window_height = 200
+        window_height = 240
         
         screen_width = stats_window.winfo_screenwidth()
         screen_height = stats_window.winfo_screenheight()
@@ -854,6 +1000,12 @@ class MakYek:
             font=("Arial", 12)
         ).pack(pady=5)
         
+        tk.Label(
+            frame,
+            text=f"Ничьи: {stats.get('draws', 0)}",
+            font=("Arial", 12)
+        ).pack(pady=5)
+        
         button = tk.Button(
             frame,
             text="Закрыть",
@@ -864,13 +1016,21 @@ class MakYek:
 
 #========================================================================================================================================================================================================
 #========================================================================================================================================================================================================
-    def self_train_bot(self, games: int = 1000, save_interval: int = 100):
+    def self_train_bot(self, games: int = 1000, save_interval: int = 100, resume: bool = False,
+                       adjudicator: Optional[Adjudicator] = None, start_mode: str = "opening",
+                       target_pieces: int = 10, trajectory_file: Optional[str] = None):
         """
         Запускает самообучение бота (бот играет сам с собой)
         
         Args:
             games: количество игр для обучения
-            save_interval: сохранять Q-таблицу каждые N игр
+            save_interval: сохранять контрольную точку каждые N игр
+            resume: продолжить прерванное обучение с контрольной точки
+            adjudicator: правила досрочного присуждения победы (по умолчанию Adjudicator())
+            start_mode: откуда начинать партии - "opening", "corpus" (START_CORPUS_FILE)
+                        или "random" (случайная игра до target_pieces фигур)
+            target_pieces: число фигур на доске для start_mode="random"
+            trajectory_file: дописывать партии в этот файл траекторий (Trajectory.py)
         """
         from tkinter import messagebox
         
@@ -882,25 +1042,64 @@ class MakYek:
         self.game_mode = "self_train"
         self.bot_thinking = False  # Отключаем проверки на "думает"
         
-        # Создаём второго бота (для игры против)
-        second_bot = BotPlayer(game_instance=self)
+        # Создаём второго бота (для игры против) на той же Q-таблице
+        self.bot.model.load()
+        second_bot = BotPlayer(game_instance=self, model=self.bot.model,
+                               trace_lambda=self.bot.trace_lambda, trace_cutoff=self.bot.trace_cutoff,
+                               double_q=self.bot.double_q)
+        second_bot.epsilon_schedule = self.bot.epsilon_schedule
+        second_bot.alpha_schedule = self.bot.alpha_schedule
         second_bot.color = "WHITE"
-        
-        # Можно загрузить ту же Q-таблицу для ускорения
-        if hasattr(second_bot, 'q_table'):
-            second_bot.q_table = self.bot.q_table
+        second_bot.writer = self.writer
         
         # Параметры для статистики
         red_wins = 0
         white_wins = 0
-        stalemates = 0
+        draws = 0
+        adjudicated = 0
+        total_moves = 0
+        first_game = 1
+        
+        if adjudicator is None:
+            adjudicator = Adjudicator()
+        trajectory = TrajectoryWriter(trajectory_file) if trajectory_file else None
+        
+        if resume:
+            cursor = self.bot.load_checkpoint()
+            if cursor:
+                games = cursor["games_total"]
+                first_game = cursor["games_played"] + 1
+                red_wins = cursor["red_wins"]
+                white_wins = cursor["white_wins"]
+                draws = cursor["draws"]
+                adjudicated = cursor.get("adjudicated", 0)
+                total_moves = cursor.get("total_moves", 0)
+                self.bot.epsilon = second_bot.epsilon = cursor["epsilon"]
+                self.bot.alpha = second_bot.alpha = cursor["alpha"]
+                self.bot.trace_lambda = second_bot.trace_lambda = cursor.get("trace_lambda", 0.0)
+                self.bot.double_q = second_bot.double_q = cursor.get("double_q", False)
+                self.bot.epsilon_schedule = second_bot.epsilon_schedule = make_schedule(cursor.get("epsilon_schedule"))
+                self.bot.alpha_schedule = second_bot.alpha_schedule = make_schedule(cursor.get("alpha_schedule"))
+                version, internal_state, gauss_next = cursor["rng_state"]
+                random.setstate((version, tuple(internal_state), gauss_next))
+                print(f"Продолжаем обучение с игры {first_game}/{games}")
+        
+        corpus = self._load_start_corpus(target_pieces) if start_mode == "corpus" else []
+        if start_mode == "corpus" and not corpus:
+            print(f"Корпус стартовых позиций пуст - случайные стартовые позиции")
+            start_mode = "random"
         
         print(f"Начинаем самообучение на {games} игр...")
-        print(f"Параметры: epsilon={self.bot.epsilon}, alpha={self.bot.alpha}, gamma={self.bot.gamma}")
+        print(f"Параметры: epsilon={self.bot.epsilon}, alpha={self.bot.alpha}, gamma={self.bot.gamma}, "
+              f"lambda={self.bot.trace_lambda}, double_q={self.bot.double_q}")
         
-        for game_num in range(1, games + 1):
+        for game_num in range(first_game, games + 1):
             # Перезапускаем игру
             self._restart_game_quiet()  # Тихий перезапуск без вопросов
+            if start_mode != "opening":
+                start = self._sample_start_position(start_mode, corpus, target_pieces)
+                if start:
+                    self._set_position_quiet(*start)
             
             # Устанавливаем цвет ботов
             red_bot = self.bot  # RED
@@ -909,14 +1108,18 @@ class MakYek:
             white_bot.color = "WHITE"
             
             # Обнуляем трекинг обучения
-            red_bot.last_state = None
-            red_bot.last_action = None
-            white_bot.last_state = None
-            white_bot.last_action = None
+            red_bot.reset_episode()
+            white_bot.reset_episode()
+            red_bot.apply_schedules(game_num - 1)
+            white_bot.apply_schedules(game_num - 1)
             
             # Играем партию
             move_count = 0
             max_moves = 200  # Защита от бесконечных игр
+            draw_reason = None
+            adjudicated_winner = None
+            adjudicator.reset()
+            steps = []
             
             while move_count < max_moves:
                 current_bot = red_bot if self.current_turn == "RED" else white_bot
@@ -933,15 +1136,15 @@ class MakYek:
                     break
                 
                 # Сохраняем действие
-                action_hash = current_bot.get_action_hash(move[0], move[1])
+                action_hash = current_bot.get_action_hash(*move)
                 
-                # Выполняем ход
-                start_pos, end_pos = move
-                is_capture = abs(end_pos[0] - start_pos[0]) == 2 and abs(end_pos[1] - start_pos[1]) == 2
+                # Выполняем ход (цепочку взятий - целиком)
+                end_pos = move[-1]
+                is_capture = current_bot._is_capture_move(self.get_board_state(), move)
                 
                 # Симулируем результат (без отрисовки)
                 old_board = copy.deepcopy(self.get_board_state())
-                self._execute_bot_move_fast(start_pos, end_pos, is_capture)
+                self._execute_bot_move_fast(move)
                 
                 # Вычисляем награду
                 new_board = self.get_board_state()
@@ -955,11 +1158,32 @@ class MakYek:
                 
                 # Обучаем бота
                 current_bot.learn_from_move(before_state, action_hash, new_board, reward)
+                self.game_moves.extend((current_bot.color, start_pos, hop_end, is_capture)
+                                       for start_pos, hop_end in zip(move, move[1:]))
+                steps.append((before_state, current_bot.color, action_hash, reward, current_bot.explored))
                 
                 move_count += 1
+                
+                # Повторение позиции или долгая игра без прогресса - ничья
+                draw_reason = self._record_position(current_bot.get_state_hash(new_board))
+                if draw_reason:
+                    break
+                
+                # Исход ясен задолго до последнего взятия - присуждаем победу
+                adjudicated_winner = adjudicator.check(new_board)
+                if adjudicated_winner:
+                    adjudicated += 1
+                    break
+            
+            total_moves += move_count
             
             # Игра закончилась - финальное обучение
-            winner = self._determine_winner()
+            if adjudicated_winner:
+                winner = adjudicated_winner
+            elif draw_reason or move_count >= max_moves:
+                winner = None
+            else:
+                winner = self._determine_winner()
             
             if winner == "RED":
                 red_wins += 1
@@ -970,17 +1194,53 @@ class MakYek:
                 red_bot.learn_from_outcome(self.get_board_state(), "WHITE")
                 white_bot.learn_from_outcome(self.get_board_state(), "WHITE")
             else:
-                stalemates += 1
+                draws += 1
+                red_bot.learn_from_outcome(self.get_board_state(), None)
+                white_bot.learn_from_outcome(self.get_board_state(), None)
+            
+            self.game_log.write_game(self._game_record_tags("Самообучение"), self.game_moves, winner)
+            if trajectory:
+                trajectory.write_game(steps, red_bot.get_state_hash(self.get_board_state()), winner)
+            
+            # Позиции партии - в базу (пишется пачками транзакций)
+            self.position_db.record_game(self._game_positions_with_moves(), winner)
             
             # Сохраняем прогресс
             if game_num % save_interval == 0:
+                red_bot.save_checkpoint({
+                    "games_total": games,
+                    "games_played": game_num,
+                    "red_wins": red_wins,
+                    "white_wins": white_wins,
+                    "draws": draws,
+                    "adjudicated": adjudicated,
+                    "total_moves": total_moves,
+                    "epsilon": red_bot.epsilon,
+                    "alpha": red_bot.alpha,
+                    "trace_lambda": red_bot.trace_lambda,
+                    "double_q": red_bot.double_q,
+                    "epsilon_schedule": red_bot.epsilon_schedule and red_bot.epsilon_schedule.to_dict(),
+                    "alpha_schedule": red_bot.alpha_schedule and red_bot.alpha_schedule.to_dict(),
+                    "rng_state": random.getstate(),
+                })
                 red_bot.save_q_table()
+                self.position_db.flush()
                 win_rate = (red_wins + white_wins) / game_num * 100
-                print(f"Игра {game_num}/{games} | Красные: {red_wins} | Белые: {white_wins} | Паты: {stalemates} | WinRate: {win_rate:.1f}%")
+                print(f"Игра {game_num}/{games} | Красные: {red_wins} | Белые: {white_wins} | Ничьи: {draws} | WinRate: {win_rate:.1f}%")
+                print(f"Досрочно: {adjudicated} | Средняя длина партии: {total_moves / game_num:.1f} полуходов")
                 print(f"Q-таблица: {len(red_bot.q_table)} состояний")
         
-        # Финальное сохранение
+        # Финальное сохранение; контрольную точку удаляем, только когда таблица уже на диске
         self.bot.save_q_table()
+        if self.bot.writer:
+            self.bot.writer.flush()
+        self.position_db.flush()
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+        
+        second_bot.release()
+        if trajectory:
+            trajectory.close()
         
         # Восстанавливаем режим
         self.game_mode = original_mode
@@ -990,7 +1250,8 @@ class MakYek:
         print(f"Итоговая статистика за {games} игр:")
         print(f"Красные (бот): {red_wins} побед ({red_wins/games*100:.1f}%)")
         print(f"Белые (бот): {white_wins} побед ({white_wins/games*100:.1f}%)")
-        print(f"Паты: {stalemates} ({stalemates/games*100:.1f}%)")
+        print(f"Ничьи: {draws} ({draws/games*100:.1f}%)")
+        print(f"Присуждено досрочно: {adjudicated} ({adjudicated/games*100:.1f}%)")
         print(f"Q-таблица сохранена в {self.bot.q_table_file}")
         print(f"Всего изучено состояний: {len(self.bot.q_table)}")
         
@@ -1018,32 +1279,70 @@ class MakYek:
         self.moved_this_turn = False
         self._init_board()
         self._place_pieces()
+        self.draw_tracker.reset()
+        self.game_positions = []
+        self.game_moves = []
+        self._record_position()
+        
+    def _set_position_quiet(self, board, turn: PieceColor) -> None:
+        """Ставит позицию (формат get_board_state()) без отрисовки - для самообучения"""
+        self.board = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        self.red_pieces = 0
+        self.white_pieces = 0
+        for row in range(BOARD_SIZE):
+            for col in range(BOARD_SIZE):
+                piece = board[row][col]
+                if piece:
+                    self.board[row][col] = {
+                        "color": piece["color"],
+                        "piece": None,
+                        "is_king": piece["is_king"],
+                        "crown": None
+                    }
+                    if piece["color"] == RED_PIECE_COLOR:
+                        self.red_pieces += 1
+                    else:
+                        self.white_pieces += 1
+        self.current_turn = turn
+        self.current_player_text = "белые" if turn == "WHITE" else "красные"
+        self.draw_tracker.reset()
+        self.game_positions = []
+        self.game_moves = []
+        self._record_position()
+
+    def _load_start_corpus(self, max_pieces: int) -> List[Dict[str, str]]:
+        """Корпус стартовых позиций: список {"state": hash состояния, "turn": "WHITE"/"RED"}.
+        Без файла START_CORPUS_FILE берутся позиции из базы позиций"""
+        try:
+            with open(START_CORPUS_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self.position_db.sample_corpus(max_pieces)
+
+    def _sample_start_position(self, start_mode: str, corpus: List[Dict[str, str]], target_pieces: int):
+        if start_mode == "corpus" and corpus:
+            entry = random.choice(corpus)
+            return board_from_state_hash(entry["state"]), entry["turn"]
+        if start_mode == "random":
+            return self.bot.random_position(target_pieces)
+        return None
         
-    def _execute_bot_move_fast(self, start_pos: Position, end_pos: Position, is_capture: bool):
-        """Быстрое выполнение хода бота без анимации для самообучения"""
+    def _execute_bot_move_fast(self, move: Tuple[Position, ...]):
+        """Быстрое выполнение хода бота без анимации для самообучения (цепочка - целиком)"""
         if self.game_over:
             return
 
-        old_row, old_col = start_pos
-        new_row, new_col = end_pos
-        
-        # Удаляем срубленную фигуру
-        if is_capture:
-            dr = 1 if new_row > old_row else -1
-            dc = 1 if new_col > old_col else -1
-            curr_row, curr_col = old_row + dr, old_col + dc
+        for start_pos, end_pos in zip(move, move[1:]):
+            # Удаляем срубленную фигуру
+            captured = self.bot._captured_square(self.board, start_pos, end_pos)
+            if captured:
+                self._remove_piece_fast(*captured)
             
-            while curr_row != new_row or curr_col != new_col:
-                if self.board[curr_row][curr_col]:
-                    self._remove_piece_fast(curr_row, curr_col)
-                    break
-                curr_row += dr
-                curr_col += dc
-        
-        # Перемещаем фигуру
-        piece = self.board[old_row][old_col]
-        self.board[new_row][new_col] = piece
-        self.board[old_row][old_col] = None
+            # Перемещаем фигуру
+            piece = self.board[start_pos[0]][start_pos[1]]
+            self.board[end_pos[0]][end_pos[1]] = piece
+            self.board[start_pos[0]][start_pos[1]] = None
+        new_row, new_col = move[-1]
         
         # Проверяем превращение в дамку
         if piece and not piece["is_king"]:
@@ -1150,7 +1449,7 @@ class MakYek:
         dialog.grab_set()
         
         # Центрируем окно
-        window_width, window_height = 500, 450
+        window_width, window_height = 500, 640
         screen_width = dialog.winfo_screenwidth()
         screen_height = dialog.winfo_screenheight()
         center_x = int(screen_width/2 - window_width/2)
@@ -1182,6 +1481,35 @@ class MakYek:
         alpha_entry = tk.Entry(params_frame, textvariable=alpha_var, width=8)
         alpha_entry.grid(row=1, column=1, pady=2)
         
+        tk.Label(params_frame, text="λ (следы):", width=12, anchor='w').grid(row=2, column=0, pady=2)
+        lambda_var = tk.StringVar(value=str(self.bot.trace_lambda))
+        lambda_entry = tk.Entry(params_frame, textvariable=lambda_var, width=8)
+        lambda_entry.grid(row=2, column=1, pady=2)
+        
+        tk.Label(params_frame, text="Старт партий:", width=12, anchor='w').grid(row=3, column=0, pady=2)
+        start_mode_var = tk.StringVar(value=START_MODES["opening"])
+        tk.OptionMenu(params_frame, start_mode_var, *START_MODES.values()).grid(row=3, column=1, pady=2)
+        
+        # Графики: ε и α убывают от введённых значений к EPSILON_END / ALPHA_END за всё обучение
+        tk.Label(params_frame, text="График ε:", width=12, anchor='w').grid(row=4, column=0, pady=2)
+        epsilon_schedule_var = tk.StringVar(value=SCHEDULE_LABELS["constant"])
+        tk.OptionMenu(params_frame, epsilon_schedule_var,
+                      *[label for kind, label in SCHEDULE_LABELS.items() if kind != "visits"]
+                      ).grid(row=4, column=1, pady=2)
+        
+        tk.Label(params_frame, text="График α:", width=12, anchor='w').grid(row=5, column=0, pady=2)
+        alpha_schedule_var = tk.StringVar(value=SCHEDULE_LABELS["constant"])
+        tk.OptionMenu(params_frame, alpha_schedule_var, *SCHEDULE_LABELS.values()).grid(row=5, column=1, pady=2)
+        
+        double_q_var = tk.BooleanVar(value=self.bot.double_q)
+        tk.Checkbutton(frame, text="Double Q-learning (две таблицы)", variable=double_q_var).pack(pady=(10, 0))
+        
+        resume_var = tk.BooleanVar(value=os.path.exists(CHECKPOINT_FILE))
+        resume_check = tk.Checkbutton(frame, text="Продолжить с контрольной точки", variable=resume_var)
+        if not os.path.exists(CHECKPOINT_FILE):
+            resume_check.config(state='disabled')
+        resume_check.pack(pady=(10, 0))
+        
         tk.Label(frame, text="Внимание! Обучение может занять\nнесколько часов!", 
                 font=("Arial", 10), fg="red").pack(pady=20)
         
@@ -1193,6 +1521,14 @@ class MakYek:
                 games = int(games_var.get())
                 epsilon = float(epsilon_var.get())
                 alpha = float(alpha_var.get())
+                trace_lambda = float(lambda_var.get())
+                resume = resume_var.get()
+                start_mode = next(mode for mode, label in START_MODES.items()
+                                  if label == start_mode_var.get())
+                epsilon_kind = next(kind for kind, label in SCHEDULE_LABELS.items()
+                                    if label == epsilon_schedule_var.get())
+                alpha_kind = next(kind for kind, label in SCHEDULE_LABELS.items()
+                                  if label == alpha_schedule_var.get())
                 
                 # Временно меняем параметры
                 old_epsilon = self.bot.epsilon
@@ -1200,12 +1536,18 @@ class MakYek:
                 
                 self.bot.epsilon = epsilon
                 self.bot.alpha = alpha
+                self.bot.trace_lambda = trace_lambda
+                self.bot.double_q = double_q_var.get()
+                self.bot.epsilon_schedule = None if epsilon_kind == "constant" else \
+                    SCHEDULES[epsilon_kind](epsilon, EPSILON_END, games)
+                self.bot.alpha_schedule = None if alpha_kind == "constant" else \
+                    SCHEDULES[alpha_kind](alpha, ALPHA_END, games)
                 
                 dialog.destroy()
                 
                 # Запускаем обучение в отдельном потоке? Нет, tkinter не любит потоки
                 # Просто запускаем с возможностью прерывания
-                self.root.after(100, lambda: self.self_train_bot(games))
+                self.root.after(100, lambda: self.self_train_bot(games, resume=resume, start_mode=start_mode))
                 
             except ValueError:
                 messagebox.showerror("Ошибка", "Введите корректные числа!")
@@ -1459,5 +1801,7 @@ class LoginForm:
 
 
 if __name__ == "__main__":
+    # Ход за ходом в консоль, как раньше; воркеры и сервер логирование не включают
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     login_form = LoginForm()
     login_form.run()
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""Журнал траекторий самоигры и офлайн-обучение по нему.
+
+Каждый ход - запись фиксированного размера: упакованная позиция, код хода,
+награда и флаги. Партия заканчивается финальной записью с исходом. Файлы
+только дополняются, поэтому генерацию можно вести во многих процессах, а
+обучение - запускать отдельно и сколько угодно раз с новыми параметрами.
+
+    python Trajectory.py generate trajectories --games 2000 --workers 4
+    python Trajectory.py train trajectories/*.traj --passes 3 --lambda 0.8
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import multiprocessing
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from BotClass import QLearningBot, QTableModel, DrawTracker, initial_board
+from QStorage import pack_state, unpack_state
+
+# Позиция (32 тёмные клетки по 4 бита) | код хода | награда | флаги
+RECORD = struct.Struct("<16sHfBx")
+NO_ACTION = 0xFFFF  # в финальной записи партии
+
+FLAG_RED = 1        # ход красных
+FLAG_EXPLORED = 2   # ход выбран исследованием (для Q(λ) Уоткинса)
+FLAG_TERMINAL = 4   # финальная запись: позиция в конце партии и исход
+OUTCOME_SHIFT = 3   # исход в финальной записи: 0 - ничья, 1 - красные, 2 - белые
+OUTCOMES = (None, "RED", "WHITE")
+
+TRAJECTORY_BATCH = 4096  # записей за одно чтение
+SELFPLAY_MAX_PLIES = 200
+
+# Шаг партии: (hash состояния, сторона, код хода, награда, ход исследования)
+Step = Tuple[str, str, int, float, bool]
+
+
+class TrajectoryWriter:
+    """Дописывает партии в конец файла траекторий, по одной записи write() на партию"""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'ab')
+
+    def write_game(self, steps: List[Step], final_state: str, winner: Optional[str]) -> None:
+        chunks = []
+        for state_hash, side, action, reward, explored in steps:
+            flags = (FLAG_RED if side == "RED" else 0) | (FLAG_EXPLORED if explored else 0)
+            chunks.append(RECORD.pack(pack_state(state_hash), action, reward, flags))
+        outcome = OUTCOMES.index(winner) << OUTCOME_SHIFT
+        chunks.append(RECORD.pack(pack_state(final_state), NO_ACTION, 0.0, FLAG_TERMINAL | outcome))
+        self._file.write(b''.join(chunks))
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_games(path: str, batch: int = TRAJECTORY_BATCH) -> Iterator[Tuple[List[Step], str, Optional[str]]]:
+    """Потоково отдаёт партии файла: (шаги, финальная позиция, победитель).
+    Недописанная партия в конце файла (оборванная запись) пропускается"""
+    steps = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(RECORD.size * batch)
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for packed, action, reward, flags in RECORD.iter_unpack(chunk[:usable]):
+                state_hash = unpack_state(packed)
+                if flags & FLAG_TERMINAL:
+                    yield steps, state_hash, OUTCOMES[flags >> OUTCOME_SHIFT]
+                    steps = []
+                else:
+                    side = "RED" if flags & FLAG_RED else "WHITE"
+                    steps.append((state_hash, side, action, reward, bool(flags & FLAG_EXPLORED)))
+            if len(chunk) < RECORD.size * batch:
+                break
+
+
+class HeadlessGame:
+    """Партия без Tk для процессов самоигры: правила и награды - из QLearningBot"""
+    def __init__(self, board=None, turn: str = "WHITE"):
+        self.board = board or initial_board()
+        self.current_turn = turn
+        self.game_ended = False
+
+    def get_board_state(self):
+        return self.board
+
+    def play(self, red_bot: QLearningBot, white_bot: QLearningBot,
+             max_plies: int = SELFPLAY_MAX_PLIES) -> Tuple[List[Step], Optional[str]]:
+        """Доигрывает партию; возвращает (шаги, победитель или None при ничьей)"""
+        bots = {"RED": red_bot, "WHITE": white_bot}
+        for color, bot in bots.items():
+            bot.game = self
+            bot.color = color
+            bot.reset_episode()
+        draw_tracker = DrawTracker()
+        draw_tracker.record(red_bot.get_state_hash(self.board), self.current_turn)
+        steps = []
+        winner = None
+        for _ in range(max_plies):
+            bot = bots[self.current_turn]
+            opponent = "WHITE" if self.current_turn == "RED" else "RED"
+            move = bot.get_move()
+            if move is None:
+                winner = opponent
+                break
+            start, end = move[0], move[-1]
+            is_capture = bot._is_capture_move(self.board, move)
+            new_board = bot._simulate_move_on_board(self.board, *move)
+            became_king = not self.board[start[0]][start[1]]["is_king"] and new_board[end[0]][end[1]]["is_king"]
+            reward = bot.get_reward(new_board, True, is_capture, is_capture, became_king)
+            steps.append((bot.get_state_hash(self.board), self.current_turn,
+                          bot.get_action_hash(*move), reward, bot.explored))
+            self.board = new_board
+            self.current_turn = opponent
+            if draw_tracker.record(bot.get_state_hash(new_board), self.current_turn):
+                break
+        self.game_ended = True
+        return steps, winner
+
+
+def _selfplay_worker(path: str, games: int, seed: int, q_table_file: str, epsilon: float) -> int:
+    """Процесс самоигры: играет games партий текущей политикой и дописывает их в path"""
+    random.seed(seed)
+    model = QTableModel(q_table_file)
+    model.load()
+    red_bot = QLearningBot(model=model, epsilon=epsilon)
+    white_bot = QLearningBot(model=model, epsilon=epsilon)
+    writer = TrajectoryWriter(path)
+    try:
+        for _ in range(games):
+            game = HeadlessGame()
+            steps, winner = game.play(red_bot, white_bot)
+            writer.write_game(steps, red_bot.get_state_hash(game.board), winner)
+    finally:
+        writer.close()
+    return games
+
+
+def generate_trajectories(out_dir: str, games: int, workers: int = 1, epsilon: float = 0.1,
+                          q_table_file: str = "q_table.json", seed: Optional[int] = None) -> List[str]:
+    """Самоигра в workers процессах, у каждого свой файл траекторий в out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
+    seed = int(time.time()) if seed is None else seed
+    paths = [os.path.join(out_dir, f"selfplay-{seed}-{i}.traj") for i in range(workers)]
+    shares = [games // workers + (i < games % workers) for i in range(workers)]
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        played = sum(pool.map(_selfplay_worker, paths, shares, [seed + i for i in range(workers)],
+                              [q_table_file] * workers, [epsilon] * workers))
+    elapsed = time.monotonic() - started
+    print(f"Сыграно {played} партий за {elapsed:.1f} с ({played / max(elapsed, 1e-9):.1f} партий/с)")
+    return paths
+
+
+def replay_game(bots: Dict[str, QLearningBot], steps: List[Step], final_state: str,
+                winner: Optional[str]) -> None:
+    """Прогоняет записанную партию через обновления Q-learning, как при самообучении"""
+    for bot in bots.values():
+        bot.reset_episode()
+    for i, (state_hash, side, action, reward, explored) in enumerate(steps):
+        bot = bots[side]
+        bot.explored = explored
+        next_state = steps[i + 1][0] if i + 1 < len(steps) else final_state
+        bot.update_q_value(state_hash, action, reward, next_state)
+        bot.last_state, bot.last_action = state_hash, action
+    for bot in bots.values():
+        if bot.last_state and bot.last_action is not None:
+            bot.update_outcome(winner)
+
+
+def train_offline(paths: List[str], bot: QLearningBot, passes: int = 1) -> Dict[str, float]:
+    """passes проходов по файлам траекторий с параметрами обучения bot; сохраняет таблицу"""
+    # Второй бот на той же модели - у каждой стороны свои следы, как в self_train_bot
+    white_bot = QLearningBot(model=bot.model, epsilon=bot.epsilon, alpha=bot.alpha, gamma=bot.gamma,
+                             trace_lambda=bot.trace_lambda, trace_cutoff=bot.trace_cutoff,
+                             double_q=bot.double_q)
+    white_bot.alpha_schedule = bot.alpha_schedule
+    bots = {"RED": bot, "WHITE": white_bot}
+    bot.color, white_bot.color = "RED", "WHITE"
+    games = moves = 0
+    started = time.monotonic()
+    try:
+        for _ in range(passes):
+            for path in paths:
+                for steps, final_state, winner in read_games(path):
+                    replay_game(bots, steps, final_state, winner)
+                    games += 1
+                    moves += len(steps)
+    finally:
+        white_bot.release()
+    bot.save_q_table()
+    elapsed = time.monotonic() - started
+    return {"games": games, "moves": moves, "seconds": elapsed,
+            "moves_per_second": moves / max(elapsed, 1e-9)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Траектории самоигры и офлайн-обучение")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="самоигра в несколько процессов")
+    generate.add_argument("out_dir")
+    generate.add_argument("--games", type=int, default=1000)
+    generate.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    generate.add_argument("--epsilon", type=float, default=0.1)
+    generate.add_argument("--q-table", default="q_table.json")
+    generate.add_argument("--seed", type=int, default=None)
+
+    train = commands.add_parser("train", help="обучение по файлам траекторий")
+    train.add_argument("paths", nargs="+")
+    train.add_argument("--q-table", default="q_table.json")
+    train.add_argument("--passes", type=int, default=1)
+    train.add_argument("--alpha", type=float, default=0.1)
+    train.add_argument("--gamma", type=float, default=0.9)
+    train.add_argument("--lambda", dest="trace_lambda", type=float, default=0.0)
+    train.add_argument("--double-q", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        paths = generate_trajectories(args.out_dir, args.games, args.workers, args.epsilon,
+                                      args.q_table, args.seed)
+        print("Файлы: " + ", ".join(paths))
+    elif args.command == "train":
+        model = QTableModel(args.q_table)
+        model.load()
+        bot = QLearningBot(model=model, alpha=args.alpha, gamma=args.gamma,
+                           trace_lambda=args.trace_lambda, double_q=args.double_q)
+        stats = train_offline(args.paths, bot, args.passes)
+        print(f"Обучено: {stats['games']} партий, {stats['moves']} ходов за {stats['seconds']:.1f} с "
+              f"({stats['moves_per_second']:.0f} ходов/с)")
+        print(f"Q-таблица: {len(bot.q_table)} состояний -> {bot.q_table_file}")
+
+
+if __name__ == "__main__":
+    main()
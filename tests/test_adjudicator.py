@@ -0,0 +1,42 @@
+from BotClass import RED_PIECE_COLOR, WHITE_PIECE_COLOR, Adjudicator, initial_board
+
+
+def mirrored(board):
+    """Доска, повёрнутая на 180 градусов, со сменой цветов"""
+    swap = {RED_PIECE_COLOR: WHITE_PIECE_COLOR, WHITE_PIECE_COLOR: RED_PIECE_COLOR}
+    return [[dict(piece, color=swap[piece["color"]]) if piece else None for piece in reversed(row)]
+            for row in reversed(board)]
+
+
+def red_ahead_board():
+    board = initial_board()
+    # У белых не хватает четырёх простых шашек
+    removed = 0
+    for row in board:
+        for col, piece in enumerate(row):
+            if piece and piece["color"] == WHITE_PIECE_COLOR and removed < 4:
+                row[col] = None
+                removed += 1
+    return board
+
+
+def test_start_position_is_not_adjudicated():
+    adjudicator = Adjudicator(hold_plies=1)
+    assert adjudicator.check(initial_board()) is None
+
+
+def test_margin_must_hold_for_consecutive_plies():
+    adjudicator = Adjudicator(margin=4, hold_plies=3, simple_wins=False)
+    board = red_ahead_board()
+    assert adjudicator.check(board) is None
+    assert adjudicator.check(board) is None
+    assert adjudicator.check(initial_board()) is None  # перевес пропал - отсчёт заново
+    assert adjudicator.check(board) is None
+    assert adjudicator.check(board) is None
+    assert adjudicator.check(board) == "RED"
+
+
+def test_verdict_is_side_symmetric():
+    board = red_ahead_board()
+    assert Adjudicator(hold_plies=1).check(board) == "RED"
+    assert Adjudicator(hold_plies=1).check(mirrored(board)) == "WHITE"
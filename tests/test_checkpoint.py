@@ -0,0 +1,53 @@
+import random
+
+from BotClass import QLearningBot, QTableModel
+from Trajectory import HeadlessGame, replay_game
+
+
+def make_bots(model: QTableModel):
+    red = QLearningBot(model=model, epsilon=0.3)
+    white = QLearningBot(model=model, epsilon=0.3)
+    return {"RED": red, "WHITE": white}
+
+
+def train(bots, games: int) -> None:
+    for _ in range(games):
+        game = HeadlessGame()
+        steps, winner = game.play(bots["RED"], bots["WHITE"], max_plies=60)
+        replay_game(bots, steps, bots["RED"].get_state_hash(game.board), winner)
+
+
+def test_q_table_json_round_trip(tmp_path):
+    path = str(tmp_path / "q_table.json")
+    bot = QLearningBot(model=QTableModel(path), double_q=True)
+    bot.set_q_value("state-a", bot.get_action_hash((5, 0), (4, 1)), 1.25)
+    bot.set_q_value("state-a", bot.get_action_hash((2, 1), (4, 3), (6, 5)), -3.5)
+    bot.set_q_value("state-b", bot.get_action_hash((7, 0), (0, 7)), 0.1)
+    bot.set_q_value("state-b", bot.get_action_hash((6, 1), (5, 2)), 2.0, bot.q_table_b)
+    bot.count_visit("state-a", bot.get_action_hash((5, 0), (4, 1)))
+    bot.save_q_table()
+
+    loaded = QTableModel(path)
+    loaded.load()
+    assert loaded.snapshot() == bot.model.snapshot()
+
+
+def test_checkpoint_resume_matches_uninterrupted_run(tmp_path):
+    random.seed(7)
+    full = make_bots(QTableModel())
+    train(full, 6)
+    expected = full["RED"].model.snapshot()
+
+    random.seed(7)
+    first = make_bots(QTableModel())
+    train(first, 3)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    first["RED"].save_checkpoint({"games_played": 3, "rng_state": random.getstate()}, checkpoint)
+    random.seed(12345)  # прерванный процесс: состояние генератора потеряно
+
+    resumed = make_bots(QTableModel())
+    cursor = resumed["RED"].load_checkpoint(checkpoint)
+    version, internal_state, gauss_next = cursor["rng_state"]
+    random.setstate((version, tuple(internal_state), gauss_next))
+    train(resumed, 6 - cursor["games_played"])
+    assert resumed["RED"].model.snapshot() == expected
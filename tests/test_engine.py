@@ -0,0 +1,50 @@
+import io
+import os
+import subprocess
+import sys
+
+from Arena import parse_config
+from BotClass import QLearningBot, QTableModel
+from BotRegistry import BOT_ENGINES
+from Engine import Engine
+
+
+def run_engine(commands):
+    out = io.StringIO()
+    Engine(QLearningBot(model=QTableModel(), epsilon=0.0), out, movetime=50).run(io.StringIO(commands))
+    return out.getvalue().splitlines()
+
+
+def test_malformed_commands_get_info_and_engine_keeps_running():
+    lines = run_engine("\n".join([
+        "position fen garbage",
+        "position fen W:Wx:B1",
+        "position fen W:W99:B1",
+        "position fen",
+        "position startpos moves 99-1",
+        "go movetime abc",
+        "setoption name epsilon value nan?",
+        "bogus",
+        "isready",
+        "quit",
+    ]) + "\n")
+    assert lines[-1] == "readyok"
+    assert len(lines) == 9
+    assert all(line.startswith("info string") for line in lines[:-1])
+
+
+def test_engine_plays_after_bad_position():
+    lines = run_engine("position fen W:Wx:B1\nposition startpos moves 22-18\ngo movetime 50\nquit\n")
+    assert lines[0].startswith("info string")
+    assert lines[-1].startswith("bestmove ") and lines[-1] != "bestmove none"
+
+
+def test_engines_share_one_registry():
+    assert set(BOT_ENGINES) == {"q_learning", "mcts"}
+    assert parse_config("a=mcts")["engine"] == "mcts"
+
+
+def test_engine_does_not_load_tk():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, Engine; assert 'tkinter' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
@@ -0,0 +1,66 @@
+import random
+
+from BotClass import QLearningBot, QTableModel, initial_board
+from GameRecord import PDNWriter, board_from_fen, fen_from_state, game_steps, game_tags, read_games
+
+
+def random_game(bot, rng, board, turn, max_plies=120):
+    """Случайная партия: (ходы бота, записи для PDN, победитель, финальный hash)"""
+    moves, logged, winner = [], [], None
+    for _ in range(max_plies):
+        legal = bot._get_all_moves_for_board(board, turn)
+        if not legal:
+            winner = "RED" if turn == "WHITE" else "WHITE"
+            break
+        move = rng.choice(legal)
+        is_capture = bot._is_capture_move(board, move)
+        # Цепочка взятий пишется в журнал по прыжкам, как в окне игры
+        for start, end in zip(move, move[1:]):
+            logged.append((turn, start, end, is_capture))
+        moves.append(list(move))
+        board = bot._simulate_move_on_board(board, *move)
+        turn = "RED" if turn == "WHITE" else "WHITE"
+    return moves, logged, winner, bot.get_state_hash(board)
+
+
+def test_pdn_round_trip(tmp_path):
+    rng = random.Random(9)
+    bot = QLearningBot(model=QTableModel())
+    path = str(tmp_path / "games.pdn")
+    writer = PDNWriter(path)
+    expected = []
+    for i in range(20):
+        board, turn, start = initial_board(), "WHITE", None
+        if i % 4 == 3:
+            # Партия с середины: стартовая позиция уходит в тег FEN
+            _, _, _, state_hash = random_game(bot, rng, board, turn, max_plies=10)
+            turn = "RED" if i % 8 == 3 else "WHITE"
+            start = (state_hash, turn)
+            board, turn = board_from_fen(fen_from_state(state_hash, turn))
+        moves, logged, winner, final_state = random_game(bot, rng, board, turn)
+        finished = i % 5 != 4
+        writer.write_game(game_tags(f"game {i}", "a", "b", start), logged, winner, finished)
+        expected.append((moves, winner, finished, final_state))
+
+    # Среди партий есть цепочки взятий
+    assert any(len(move) > 2 for moves, *_ in expected for move in moves)
+
+    records = list(read_games(path))
+    assert len(records) == len(expected)
+    for record, (moves, winner, finished, final_state) in zip(records, expected):
+        assert record.moves == moves
+        assert record.finished == finished
+        if finished:
+            assert record.winner == winner
+        steps, replayed_state = game_steps(record, bot)
+        assert len(steps) == len(moves)
+        assert replayed_state == final_state
+
+
+def test_fen_round_trip():
+    bot = QLearningBot(model=QTableModel())
+    state_hash = bot.get_state_hash(initial_board())
+    for turn in ("WHITE", "RED"):
+        board, parsed_turn = board_from_fen(fen_from_state(state_hash, turn))
+        assert bot.get_state_hash(board) == state_hash
+        assert parsed_turn == turn
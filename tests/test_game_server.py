@@ -0,0 +1,75 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from GameServer import GameServer, hash_password
+
+
+def make_server(tmp_path) -> GameServer:
+    users = tmp_path / "users.json"
+    users.write_text(json.dumps({"admin": hash_password("secret")}))
+    return GameServer(str(tmp_path / "q_table.json"), str(users), workers=1)
+
+
+async def exchange(server: GameServer, lines):
+    """Отправляет строки по одному соединению, возвращает ответы"""
+    server._ready = asyncio.Event()
+    dispatcher = asyncio.create_task(server._dispatch_batches())
+    listener = await asyncio.start_server(server._handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    try:
+        for line in lines:
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await asyncio.wait_for(reader.readline(), 30)))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        await asyncio.sleep(0.01)  # сервер видит конец соединения и закрывает его
+        dispatcher.cancel()
+        listener.close()
+    return responses
+
+
+def test_malformed_requests_get_error_and_keep_connection(tmp_path):
+    server = make_server(tmp_path)
+    try:
+        responses = asyncio.run(exchange(server, [
+            'not json',
+            '[1, 2]',
+            '{"cmd": 5}',
+            '{"cmd": "login", "user": "admin", "password": "secret"}',
+            '{"cmd": "new", "color": "WHITE"}',
+            '{"cmd": "move", "game": [1]}',
+            '{"cmd": "move", "game": true}',
+            '{"cmd": "move", "game": 1, "move": 22}',
+            '{"cmd": "move", "game": 1, "move": "99-1"}',
+            '{"cmd": "new", "color": {"a": 1}}',
+            '{"cmd": "resign", "game": 1, "id": 7}',
+        ]))
+    finally:
+        server.close()
+    assert [r["ok"] for r in responses] == [False, False, False, True, True,
+                                            False, False, False, False, False, True]
+    assert all(r["error"] for r in responses if not r["ok"])
+    assert responses[-1]["id"] == 7
+
+
+def test_bot_failure_is_reported_per_request(tmp_path):
+    server = make_server(tmp_path)
+    server.pool.shutdown()
+    # Пул без инициализации: ход бота падает в _bot_moves
+    server.pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        responses = asyncio.run(exchange(server, [
+            '{"cmd": "login", "user": "admin", "password": "secret"}',
+            '{"cmd": "new", "color": "RED"}',
+            '{"cmd": "quit"}',
+        ]))
+    finally:
+        server.close()
+    assert responses[1]["ok"] is False
+    assert "внутренняя ошибка" in responses[1]["error"]
+    assert responses[2]["ok"] is True
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+from BotClass import DrawTracker, QLearningBot, QTableModel
+from BotRegistry import BOT_ENGINES
+from GameRecord import PDNWriter, read_games
+from Schedules import make_schedule
+from ThaiCheckers import CELL_SIZE, RED_PIECE_COLOR, WHITE_PIECE_COLOR, MakYek
+
+
+class Widget:
+    """Заглушка виджета Tk: принимает любые вызовы"""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class SyncWriter:
+    """BackgroundWriter, выполняющий запись сразу"""
+    def submit(self, key, write):
+        write()
+
+
+class Positions:
+    def __init__(self):
+        self.games = []
+
+    def record_game(self, positions, winner_color):
+        self.games.append((positions, winner_color))
+
+
+def piece(color):
+    return {"color": color, "is_king": False, "piece": 0, "crown": None}
+
+
+def window_game(tmp_path, pieces, turn):
+    """Окно игры без Tk: правила и запись партии - настоящие, виджеты - заглушки"""
+    game = MakYek.__new__(MakYek)
+    game.root = game.canvas = game.moves_text = Widget()
+    game.turn_label = game.score_label = Widget()
+    game.writer = SyncWriter()
+    game.stats = {"white_wins": 0, "red_wins": 0, "draws": 0}
+    game._save_stats = lambda: None
+    game._show_result_window = lambda title, message: None
+    game.position_db = Positions()
+    game.game_log = PDNWriter(str(tmp_path / "games.pdn"))
+    game.game_mode = "vs_bot"
+    game.player_color = "WHITE"
+    game.game_over = False
+    game.game_moves = []
+    game._games_recorded = 0
+    game.bot = QLearningBot(game_instance=game, model=QTableModel(str(tmp_path / "q_table.json")))
+    game.board = [[None] * 8 for _ in range(8)]
+    for (row, col), color in pieces.items():
+        game.board[row][col] = piece(color)
+    game.red_pieces = sum(color == RED_PIECE_COLOR for color in pieces.values())
+    game.white_pieces = len(pieces) - game.red_pieces
+    game.current_turn = turn
+    game.current_player_text = "белые" if turn == "WHITE" else "красные"
+    game.moved_this_turn = False
+    game.bot_thinking = False
+    game.draw_tracker = DrawTracker()
+    game.game_positions = [(game.bot.get_state_hash(game.board), turn)]
+    return game
+
+
+def test_bot_capture_ending_game_is_recorded(tmp_path):
+    game = window_game(tmp_path, {(2, 3): RED_PIECE_COLOR, (3, 4): WHITE_PIECE_COLOR}, "RED")
+    game._execute_bot_move(((2, 3), (4, 5)))
+
+    [record] = read_games(str(tmp_path / "games.pdn"))
+    assert record.winner == "RED"
+    assert record.moves == [[(2, 3), (4, 5)]]
+    assert game.position_db.games[0][1] == "RED"
+
+
+def test_player_capture_ending_game_is_recorded(tmp_path):
+    game = window_game(tmp_path, {(5, 2): WHITE_PIECE_COLOR, (4, 3): RED_PIECE_COLOR}, "WHITE")
+    game.selected_piece = game.board[5][2]
+    game.start_pos = (5, 2)
+    game.valid_moves = {(3, 4)}
+    game._clear_highlights = lambda: None
+    game._on_drop(SimpleNamespace(x=4 * CELL_SIZE + 1, y=3 * CELL_SIZE + 1))
+
+    [record] = read_games(str(tmp_path / "games.pdn"))
+    assert record.winner == "WHITE"
+    assert record.moves == [[(5, 2), (3, 4)]]
+
+
+def test_engine_change_keeps_bot_settings(tmp_path):
+    game = window_game(tmp_path, {(2, 3): RED_PIECE_COLOR, (3, 4): WHITE_PIECE_COLOR}, "RED")
+    game.bot.trace_lambda, game.bot.double_q = 0.7, True
+    schedule = game.bot.epsilon_schedule = make_schedule({"kind": "linear", "start": 0.3, "end": 0.05})
+    game.engine_var = SimpleNamespace(get=lambda: "mcts")
+    game._change_engine()
+
+    assert isinstance(game.bot, BOT_ENGINES["mcts"])
+    assert (game.bot.trace_lambda, game.bot.double_q) == (0.7, True)
+    assert game.bot.epsilon_schedule is schedule
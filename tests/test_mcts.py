@@ -0,0 +1,20 @@
+import random
+
+from BotClass import QLearningBot, QTableModel, initial_board
+from MCTSBot import RED, WHITE, decode_move, encode_board, generate_moves
+
+
+def test_fast_generator_matches_bot_moves():
+    rng = random.Random(11)
+    bot = QLearningBot(model=QTableModel())
+    moves, quiet = [], []
+    for _ in range(60):
+        board, color = initial_board(), "WHITE"
+        for _ in range(80):
+            expected = bot._get_all_moves_for_board(board, color)
+            generate_moves(encode_board(board), RED if color == "RED" else WHITE, moves, quiet)
+            assert sorted(decode_move(move) for move in moves) == sorted(expected)
+            if not expected:
+                break
+            board = bot._simulate_move_on_board(board, *rng.choice(expected))
+            color = "RED" if color == "WHITE" else "WHITE"
@@ -0,0 +1,80 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from BotClass import QTableModel
+from QStorage import ACTION_COUNT, make_q_table, row_lookup, row_max
+
+
+def test_unknown_action_name_leaves_empty_table(tmp_path, capsys):
+    path = str(tmp_path / "q_table.json")
+    with open(path, 'w') as f:
+        json.dump({"0" * 64: {"9,9->1,1": 1.0}}, f)
+    model = QTableModel(path)
+    model.load()
+    assert model.ready
+    assert len(model.q_table) == 0
+    assert "Не удалось загрузить" in capsys.readouterr().out
+
+
+def random_writes(table, rng, steps=5000):
+    """Случайные записи и удаления в table и в обычный словарь; возвращает словарь"""
+    expected = {}
+    for _ in range(steps):
+        state_hash = str(rng.randrange(200))
+        code = rng.randrange(ACTION_COUNT)
+        value = rng.randrange(-2048, 2048) / 256  # точно представимо в float16 и int16
+        if state_hash not in table:
+            table[state_hash] = {}
+            expected[state_hash] = {}
+        if rng.random() < 0.05 and expected[state_hash]:
+            removed = next(iter(expected[state_hash]))
+            del table[state_hash][removed]
+            del expected[state_hash][removed]
+        elif rng.random() < 0.02:
+            del table[state_hash]
+            del expected[state_hash]
+        else:
+            table[state_hash][code] = value
+            expected[state_hash][code] = value
+    return expected
+
+
+@pytest.mark.parametrize("storage", ["float16", "int16"])
+def test_compact_rows_match_dict(storage):
+    table = make_q_table(storage)
+    expected = random_writes(table, random.Random(5))
+    assert sorted(table) == sorted(expected)
+    for state_hash, actions in expected.items():
+        row = table[state_hash]
+        assert dict(row.items()) == actions
+        assert len(row) == len(actions)
+        if actions:
+            assert row.max_value() == row_max(actions)
+            assert row[row.best_code()] == row_max(actions)
+            codes = np.array(list(actions) + [ACTION_COUNT - 1], dtype=np.uint16)
+            assert row_lookup(row, codes, -1.0).tolist() == row_lookup(actions, codes, -1.0).tolist()
+
+
+@pytest.mark.parametrize("storage", ["float16", "int16"])
+def test_cached_best_follows_lowered_max(storage):
+    table = make_q_table(storage)
+    table["s"] = {1: 0.5, 2: 2.0, 3: 1.0}
+    row = table["s"]
+    assert (row.best_code(), row.max_value()) == (2, 2.0)
+    row[2] = -1.0  # максимум уменьшился - лучшим стал другой ход
+    assert (row.best_code(), row.max_value()) == (3, 1.0)
+    row[1] = 1.0  # при равенстве лучший - первый в строке
+    assert (row.best_code(), row.max_value()) == (1, 1.0)
+    del row[1]
+    assert (row.best_code(), row.max_value()) == (3, 1.0)
+
+    # После каждой записи максимум совпадает с проходом по строке
+    rng = random.Random(3)
+    for _ in range(2000):
+        row[rng.randrange(8)] = rng.randrange(-2048, 2048) / 256
+        values = dict(row.items())
+        assert row.max_value() == row_max(values)
+        assert values[row.best_code()] == row_max(values)
@@ -0,0 +1,76 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from BotClass import QLearningBot, QTableModel, initial_board
+from QStorage import ACTION_COUNT, row_best, row_lookup, row_max
+from SharedQTable import FrozenQTable, publish_snapshot
+
+
+def random_rows(rng, states=50):
+    board_hash = QLearningBot(model=QTableModel()).get_state_hash(initial_board())
+    rows = {}
+    for i in range(states):
+        # Разные допустимые состояния: меняем клетки начальной позиции
+        state_hash = board_hash.replace("RP", "0", i % 12).replace("WP", "0", i // 12)
+        rows[state_hash] = {code: rng.randrange(-2048, 2048) / 256
+                            for code in rng.sample(range(ACTION_COUNT), rng.randrange(1, 9))}
+    return rows
+
+
+@pytest.mark.parametrize("storage", ["float64", "float16", "int16"])
+def test_snapshot_reads_back_same_values(tmp_path, storage):
+    rows = random_rows(random.Random(3))
+    path = str(tmp_path / "q_table.qsnap")
+    stats = publish_snapshot(rows.items(), path, storage)
+    assert stats["states"] == len(rows)
+
+    frozen = FrozenQTable(path)
+    assert frozen.storage == storage
+    assert sorted(frozen) == sorted(rows)
+    for state_hash, actions in rows.items():
+        row = frozen[state_hash]
+        # Значения выбраны точно представимыми во всех режимах
+        assert dict(row.items()) == actions
+        assert {code: row[code] for code in row} == actions
+        assert row.max_value() == row_max(actions)
+        assert actions[row.best_code()] == actions[row_best(actions)]
+        codes = np.array(list(actions) + [ACTION_COUNT - 1], dtype=np.uint16)
+        assert row_lookup(row, codes).tolist() == row_lookup(actions, codes).tolist()
+
+
+def test_reads_do_not_grow_overlay_delta(tmp_path):
+    rows = random_rows(random.Random(4), states=5)
+    path = str(tmp_path / "q_table.qsnap")
+    publish_snapshot(rows.items(), path)
+    model = QTableModel(path)
+    model.load()
+    bot = QLearningBot(model=model)
+    state_hash, actions = next(iter(rows.items()))
+    known = next(iter(actions))
+    unknown = next(code for code in range(ACTION_COUNT) if code not in actions)
+
+    assert bot.get_q_value(state_hash, known) == actions[known]
+    assert bot.get_q_value(state_hash, unknown) == 0.0
+    assert bot.get_q_value("0" * 64, unknown) == 0.0
+    assert len(model.q_table.delta) == 0
+
+    bot.update_q_value(state_hash, unknown, 1.0, "0" * 64)
+    assert dict(model.q_table.delta) == {state_hash: {unknown: bot.alpha * 1.0}}
+    assert bot.get_q_value(state_hash, known) == actions[known]
+
+
+def test_save_before_load_waits_for_overlay(tmp_path):
+    rows = random_rows(random.Random(5), states=5)
+    path = str(tmp_path / "q_table.qsnap")
+    publish_snapshot(rows.items(), path)
+    model = QTableModel(path)
+    assert not model.ready
+
+    bot = QLearningBot(model=model, lazy=True)
+    bot.save_q_table()
+    assert model.ready
+    with open(model.save_path) as f:
+        assert json.load(f) == {}